@@ -1,22 +1,36 @@
+import asyncio
+import concurrent.futures
+import contextvars
 import os
 import re
 import logging
-import requests
-import wikipedia
+import queue
+import threading
+import time
 import json
-from typing import Dict, List, Any, Optional
+from contextlib import contextmanager
+from typing import Dict, List, Any, AsyncIterator, Iterator, Optional, Tuple
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
 
-import langchain
-from langchain.agents import AgentType, initialize_agent, Tool
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
-from langchain.tools import BaseTool
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.tools import BaseTool, Tool
 from pydantic import BaseModel, Field
 
+from batching import BATCH_CONCURRENCY, find_duplicates
+from chunking import CHUNK_CONCURRENCY, merge_validation_results, parse_chunk_response
+from claim_cache import CLAIM_CACHE_ENABLED, ClaimPlan, cached_validation_results, complete_claim_validation, get_claim_store, normalize_claim, plan_claim_validation, verdict_scope
+from llm_backend import create_llm
+from llm_scheduler import LLMOverloadedError, get_llm_scheduler
+from metrics import COMPLETION_TOKENS, LLM_SECONDS, PARSE_SECONDS, PROMPT_TOKENS, SEARCH_SOURCE_SECONDS, TRUNCATED_PAGES
+from output_parser import IncrementalResultParser, parse_validation_response
+from prompt_builder import build_synthesis_prompt, count_tokens
+from singleflight import SingleFlight
+from state_store import get_lease_table
+from reference_index import WIKIPEDIA_LIVE_FALLBACK, get_reference_index
+from resilience import CircuitOpenError, default_retryable, get_dependency
+from tracing import span, traced
+from validation_cache import get_validation_cache, make_cache_key
+
 # Configuration and Logging Setup
 load_dotenv()
 logging.basicConfig(
@@ -28,6 +42,66 @@ logger = logging.getLogger(__name__)
 # Set USER_AGENT to resolve the warning
 os.environ['USER_AGENT'] = 'MediCheck-Agent/1.0'
 
+DEFAULT_MODEL = "gemini-2.0-flash"
+DEFAULT_TEMPERATURE = 0.2
+DEFAULT_CUSTOM_INSTRUCTIONS = "Synthesize information from various reliable sources."
+
+# Number of pre-initialised agents kept warm in the shared pool
+AGENT_POOL_SIZE = int(os.getenv("MEDICHECK_AGENT_POOL_SIZE", "4"))
+
+# Deadlines (seconds) for a single source and for the whole comprehensive search
+SOURCE_TIMEOUT = float(os.getenv("MEDICHECK_SOURCE_TIMEOUT", "8"))
+SEARCH_TIMEOUT = float(os.getenv("MEDICHECK_SEARCH_TIMEOUT", "10"))
+
+# Deadlines (seconds) for one attempt at a live Wikipedia lookup, which is retried within SOURCE_TIMEOUT
+WIKIPEDIA_ATTEMPT_TIMEOUT = float(os.getenv("MEDICHECK_WIKIPEDIA_TIMEOUT", "3"))
+# Deadlines (seconds) for one model call attempt and for the call including retries
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("MEDICHECK_LLM_TIMEOUT", "30"))
+LLM_DEADLINE = float(os.getenv("MEDICHECK_LLM_DEADLINE", "60"))
+
+def _wikipedia_retryable(error: BaseException) -> bool:
+    # Missing and ambiguous pages are answers, not outages; only timeouts and transport errors are retried
+    if type(error).__module__.startswith("wikipedia") and type(error).__name__ != "HTTPTimeoutError":
+        return False
+    return default_retryable(error)
+
+# Retries, hedging and circuit breakers for the external calls made by every agent
+wikipedia_dependency = get_dependency("wikipedia", deadline=SOURCE_TIMEOUT, attempt_timeout=WIKIPEDIA_ATTEMPT_TIMEOUT, retryable=_wikipedia_retryable)
+llm_dependency = get_dependency("llm", deadline=LLM_DEADLINE, attempt_timeout=LLM_ATTEMPT_TIMEOUT)
+
+# Shared worker threads for the synchronous search fan-out. Not used as a context
+# manager on purpose: a timed-out lookup must not hold up the request that gave up on it.
+_search_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv("MEDICHECK_SEARCH_WORKERS", "16")),
+    thread_name_prefix="medicheck-search"
+)
+
+def _timed_call(func, *args) -> Tuple[Any, float]:
+    """Call func and return its result with the elapsed wall time."""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def _traced_search(source_name: str, func, query: str) -> Tuple[Any, float]:
+    """Run one source lookup inside its own trace span."""
+    with span(f"search.{source_name}"):
+        return _timed_call(func, query)
+
+# LLM clients are shared across agents so their HTTP connections are reused
+_llm_clients: Dict[Tuple[str, float], Any] = {}
+_llm_clients_lock = threading.Lock()
+
+def get_llm_client(model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE) -> Any:
+    """Return the process-wide LLM client (from the configured backend) for a model/temperature pair, creating it on first use."""
+    key = (model, temperature)
+    with _llm_clients_lock:
+        client = _llm_clients.get(key)
+        if client is None:
+            logger.info(f"Initializing shared LLM client for {model} (temperature={temperature})")
+            client = create_llm(model, temperature)
+            _llm_clients[key] = client
+        return client
+
 class EnhancedBaseTool(BaseTool):
     name: str = Field(default="base_tool", description="Base tool name")
     description: str = Field(default="A base tool for medical information retrieval", description="Tool description")
@@ -39,6 +113,10 @@ class EnhancedBaseTool(BaseTool):
         except Exception as e:
             logger.error(f"Error in {self.name}: {str(e)}")
             return f"Error in {self.name}: {str(e)}"
+    
+    async def _arun(self, query: str) -> str:
+        """Run the tool off the event loop; the underlying libraries are sync-only."""
+        return await asyncio.to_thread(self._run, query)
 
 class WHONewsroomTool(EnhancedBaseTool):
     name: str = Field(default="who_newsroom_tool", description="WHO Newsroom search tool")
@@ -68,20 +146,43 @@ class WikipediaMedicalTool(EnhancedBaseTool):
     
     def _run(self, query: str) -> str:
         def _fetch_wikipedia_info():
-            try:
+            # Serve from the local reference index when possible; the live API is the fallback
+            index = get_reference_index()
+            article = index.lookup(query)
+            if article is not None:
+                return self._format_article(article["title"], article["summary"], article["url"])
+            
+            if not WIKIPEDIA_LIVE_FALLBACK:
+                return f"No Wikipedia articles found for '{query}'"
+            
+            def _fetch_live() -> Optional[Tuple[str, Any]]:
+                # Imported on first live lookup; deployments served from the index never load it
+                import wikipedia
+                
                 search_results = wikipedia.search(f"medical {query}")
                 if not search_results:
-                    return f"No Wikipedia articles found for '{query}'"
-                
-                page_title = search_results[0]
-                page = wikipedia.page(page_title, auto_suggest=False)
-                summary = page.summary[:500] + "..." if len(page.summary) > 500 else page.summary
-                
-                return f"Wikipedia Medical Information for '{page_title}':\n\n{summary}\n\nFull Article: {page.url}"
+                    return None
+                return search_results[0], wikipedia.page(search_results[0], auto_suggest=False)
+            
+            try:
+                found = wikipedia_dependency.call(_fetch_live)
+            except CircuitOpenError:
+                return "Wikipedia is temporarily unavailable; ignore this source."
             except Exception as e:
                 return f"Error fetching Wikipedia information: {str(e)}"
+            if found is None:
+                return f"No Wikipedia articles found for '{query}'"
+            
+            page_title, page = found
+            index.add(page_title, page.summary, page.url, query=query)
+            return self._format_article(page_title, page.summary, page.url)
         
         return self._safe_run(_fetch_wikipedia_info)
+    
+    @staticmethod
+    def _format_article(title: str, summary: str, url: str) -> str:
+        summary = summary[:500] + "..." if len(summary) > 500 else summary
+        return f"Wikipedia Medical Information for '{title}':\n\n{summary}\n\nFull Article: {url}"
 
 class MedicalWebSearchTool(EnhancedBaseTool):
     name: str = Field(default="medical_web_search_tool", description="Medical Web Search tool")
@@ -106,7 +207,7 @@ class PubMedSearchTool(EnhancedBaseTool):
         return self._safe_run(_search_pubmed)
 
 class EnhancedMedicalAgentSystem:
-    def __init__(self, model: str = "gemini-2.0-flash", temperature: float = 0.2, custom_instructions: str = None):
+    def __init__(self, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE, custom_instructions: str = None, llm: Optional[Any] = None, source_timeout: float = SOURCE_TIMEOUT, search_timeout: float = SEARCH_TIMEOUT, use_claim_cache: bool = CLAIM_CACHE_ENABLED):
         # Initialize specific tools
         self.who_newsroom_tool = WHONewsroomTool()
         self.who_data_tool = WHODataTool()
@@ -129,152 +230,259 @@ class EnhancedMedicalAgentSystem:
             ]
         ]
         
-        self.llm = ChatGoogleGenerativeAI(
-            model=model, 
-            temperature=temperature, 
-            convert_system_message_to_human=True
-        )
+        self.model = model
+        self.llm = llm or get_llm_client(model, temperature)
         
-        self.memory = ConversationBufferMemory(memory_key="chat_history")
+        # Default custom instructions; per-request instructions are passed to run() instead
+        self.custom_instructions = custom_instructions or DEFAULT_CUSTOM_INSTRUCTIONS
         
-        # Store custom instructions
-        self.custom_instructions = custom_instructions or "Synthesize information from various reliable sources."
+        # Per-source and overall search deadlines in seconds
+        self.source_timeout = source_timeout
+        self.search_timeout = search_timeout
         
-        # Attribute to store comprehensive search results
+        # Attributes to store comprehensive search results, per-source status ("ok", "timeout", "error") and timings
         self.search_results: Dict[str, str] = {}
+        self.search_status: Dict[str, str] = {}
+        self.search_timings: Dict[str, float] = {}
+        
+        # Set when the last run produced an error response; such responses are never cached
+        self.last_error: Optional[str] = None
+        
+        # Token count of the last synthesis prompt, for routing and caching decisions
+        self.last_prompt_tokens = 0
+        self.last_prompt_trimmed = False
+        
+        # Claim-level verdict store; only claims it has not seen are sent to the LLM
+        self.claim_store = get_claim_store() if use_claim_cache else None
+
+    def _search_sources(self) -> List[Tuple[str, EnhancedBaseTool]]:
+        """Sources queried by comprehensive_search, in reporting order."""
+        return [
+            ("WHO Newsroom", self.who_newsroom_tool),
+            ("WHO Data", self.who_data_tool),
+            ("Wikipedia", self.wikipedia_tool),
+            ("Web Search", self.web_search_tool),
+            ("PubMed", self.pubmed_tool)
+        ]
 
+    @traced("comprehensive_search")
     def comprehensive_search(self, query: str) -> Dict[str, str]:
         """
         Perform a comprehensive search across multiple sources.
         
+        Sources are queried concurrently. A source that misses its own deadline, or is
+        still running when the overall search deadline passes, is marked as timed out in
+        the results so synthesis can go ahead without it.
+        
         Args:
             query (str): The medical query to search
         
         Returns:
             Dict[str, str]: Dictionary of search results from different sources
         """
-        # Reset previous search results
-        self.search_results = {}
+        started = time.perf_counter()
+        search_deadline = started + self.search_timeout
         
-        # Perform searches across different tools
-        search_methods = [
-            ("WHO Newsroom", self.who_newsroom_tool._run),
-            ("WHO Data", self.who_data_tool._run),
-            ("Wikipedia", self.wikipedia_tool._run),
-            ("Web Search", self.web_search_tool._run),
-            ("PubMed", self.pubmed_tool._run)
-        ]
+        # Each lookup runs in a copy of this context so its span nests under this search
+        futures = {
+            source_name: _search_executor.submit(contextvars.copy_context().run, _traced_search, source_name, tool._run, query)
+            for source_name, tool in self._search_sources()
+        }
         
-        for source_name, search_method in search_methods:
+        outcomes: Dict[str, Tuple[str, Any, float]] = {}
+        for source_name, future in futures.items():
+            # All sources start together, so each one's deadline is measured from the same start
+            deadline = min(started + self.source_timeout, search_deadline)
             try:
-                result = search_method(query)
-                self.search_results[source_name] = result
-                logger.info(f"Retrieved information from {source_name}")
+                result, elapsed = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+                outcomes[source_name] = ("ok", result, elapsed)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                outcomes[source_name] = ("timeout", None, time.perf_counter() - started)
             except Exception as e:
-                self.search_results[source_name] = f"Error searching {source_name}: {str(e)}"
-                logger.error(f"Error in {source_name}: {str(e)}")
+                outcomes[source_name] = ("error", e, time.perf_counter() - started)
         
-        return self.search_results
+        return self._record_search_outcomes(outcomes, time.perf_counter() - started)
 
-    def synthesize_with_llm(self, query: str, search_results: Dict[str, str]) -> str:
+    @traced("comprehensive_search")
+    async def acomprehensive_search(self, query: str) -> Dict[str, str]:
         """
-        Use the LLM to synthesize information from all tool responses.
+        Async variant of comprehensive_search that keeps blocking tool I/O off the event loop.
         
         Args:
-            query (str): The user's query
-            search_results (Dict[str, str]): Results from all tools
-            
+            query (str): The medical query to search
+        
         Returns:
-            str: Synthesized response from LLM in JSON format
+            Dict[str, str]: Dictionary of search results from different sources
         """
-        # Create a comprehensive prompt with all tool responses
-        prompt = f"""
-        USER QUERY: {query}
+        started = time.perf_counter()
         
-        CUSTOM INSTRUCTIONS: {self.custom_instructions}
+        async def _search(source_name: str, tool: EnhancedBaseTool) -> Tuple[str, float]:
+            with span(f"search.{source_name}"):
+                tool_started = time.perf_counter()
+                result = await asyncio.wait_for(tool._arun(query), timeout=self.source_timeout)
+                return result, time.perf_counter() - tool_started
         
-        SEARCH RESULTS FROM DIFFERENT SOURCES:
+        tasks = {
+            source_name: asyncio.ensure_future(_search(source_name, tool))
+            for source_name, tool in self._search_sources()
+        }
+        await asyncio.wait(tasks.values(), timeout=self.search_timeout)
         
-        """
+        outcomes: Dict[str, Tuple[str, Any, float]] = {}
+        for source_name, task in tasks.items():
+            if not task.done():
+                task.cancel()
+                outcomes[source_name] = ("timeout", None, time.perf_counter() - started)
+            elif isinstance(task.exception(), asyncio.TimeoutError):
+                outcomes[source_name] = ("timeout", None, time.perf_counter() - started)
+            elif task.exception() is not None:
+                outcomes[source_name] = ("error", task.exception(), time.perf_counter() - started)
+            else:
+                result, elapsed = task.result()
+                outcomes[source_name] = ("ok", result, elapsed)
         
-        # Add all tool responses to the prompt
-        for source, result in search_results.items():
-            prompt += f"--- {source} ---\n{result}\n\n"
-        
-        # Add final instruction for synthesis in JSON format
-        prompt += """
-        Based on the user query and all the search results provided above, please:
-        1. Analyze the accuracy of any claims in the query
-        2. Provide accurate medical information based on reliable sources
-        3. Cite specific sources when possible
-        4. Present a well-structured, comprehensive response that directly addresses the query
-        5. Follow the custom instructions provided above
-        
-        IMPORTANT: Your response must be in valid JSON format with this exact structure:
-        {
-          "summary": "<summary_of_correct_info>",
-          "validation_results": [
-            {
-              "incorrect_text": "<highlighted_incorrect_text>",
-              "correct_text": "<corrected_or_verified_text>"
-            },
-            ...
-          ]
-        }
+        return self._record_search_outcomes(outcomes, time.perf_counter() - started)
 
-        Where:
-        - "summary" is a concise summary of the content with factually correct information
-        - "validation_results" is an array of objects, each containing:
-          - "incorrect_text": the specific claim or statement from the query that is incorrect
-          - "correct_text": the factually correct information that should replace it
+    def _record_search_outcomes(self, outcomes: Dict[str, Tuple[str, Any, float]], total: float) -> Dict[str, str]:
+        """Turn per-source (status, value, seconds) outcomes into search_results and timings."""
+        self.search_results = {}
+        self.search_status = {}
+        self.search_timings = {}
         
-        Only include statements in "validation_results" if they are actually incorrect. If a statement is correct, don't include it in the array.
-        Make sure your JSON is properly formatted with no syntax errors.
+        for source_name, (status, value, elapsed) in outcomes.items():
+            SEARCH_SOURCE_SECONDS.observe(elapsed, source=source_name, status=status)
+            self.search_status[source_name] = status
+            self.search_timings[source_name] = round(elapsed, 3)
+            if status == "ok":
+                self.search_results[source_name] = value
+                logger.info(f"Retrieved information from {source_name} in {elapsed:.2f}s")
+            elif status == "timeout":
+                self.search_results[source_name] = f"[TIMED OUT] No results from {source_name} within {elapsed:.1f}s; ignore this source."
+                logger.warning(f"Timed out searching {source_name} after {elapsed:.2f}s")
+            else:
+                self.search_results[source_name] = f"Error searching {source_name}: {str(value)}"
+                logger.error(f"Error in {source_name}: {str(value)}")
         
-        IMPORTANT: Don't wrap the JSON in a code block or use ```json markers. Just return the raw JSON object.
+        logger.info(f"Comprehensive search finished in {total:.2f}s - per-source timings: {self.search_timings}")
+        return self.search_results
+
+    @traced("build_prompt")
+    def _build_synthesis_prompt(self, query: str, search_results: Dict[str, str], custom_instructions: str) -> str:
+        """Build the synthesis prompt within the configured token budgets and record its size."""
+        prompt = build_synthesis_prompt(query, search_results, custom_instructions)
+        self.last_prompt_tokens = prompt.tokens
+        # Claims cut from the prompt were never judged, so their silence is not a "correct" verdict
+        self.last_prompt_trimmed = bool(prompt.trimmed_tokens["content"])
+        PROMPT_TOKENS.inc(prompt.tokens, operation="validation")
+        if prompt.trimmed_tokens["content"]:
+            TRUNCATED_PAGES.inc(reason="prompt_budget")
+        logger.info(f"Synthesis prompt: {prompt.tokens} tokens - per section: {prompt.section_tokens}")
+        return prompt.text
+
+    @traced("synthesize_with_llm")
+    def synthesize_with_llm(self, query: str, search_results: Dict[str, str], custom_instructions: str = None) -> str:
+        """
+        Use the LLM to synthesize information from all tool responses.
         
-        JSON RESPONSE:
+        Args:
+            query (str): The user's query
+            search_results (Dict[str, str]): Results from all tools
+            custom_instructions (str, optional): Instructions for this call; defaults to the agent's own
+            
+        Returns:
+            str: Synthesized response from LLM in JSON format
         """
+        prompt = self._build_synthesis_prompt(query, search_results, custom_instructions or self.custom_instructions)
         
         try:
-            response = self.llm.invoke(prompt)
-            content = response.content
-            
-            # Clean the response in case model still included Markdown formatting
-            content = self._clean_json_response(content)
-            
-            return content
+            with get_llm_scheduler().slot(), LLM_SECONDS.time(operation="validation"), span("llm"):
+                response = llm_dependency.call(self.llm.invoke, prompt)
+            COMPLETION_TOKENS.inc(count_tokens(str(response.content)), operation="validation")
+            # Pull the JSON result out of the output, repairing it if the model got the format wrong
+            return self._clean_json_response(response.content)
+        except LLMOverloadedError:
+            # Overload is not a validation result; it travels up to the API as a 429
+            raise
+        except CircuitOpenError as e:
+            return self._unavailable_response(e)
         except Exception as e:
             logger.error(f"Error in LLM synthesis: {str(e)}")
+            self.last_error = str(e)
             error_json = json.dumps({
                 "summary": f"Error synthesizing information: {str(e)}",
                 "validation_results": []
             })
             return error_json
+
+    @traced("synthesize_with_llm")
+    async def asynthesize_with_llm(self, query: str, search_results: Dict[str, str], custom_instructions: str = None) -> str:
+        """
+        Async variant of synthesize_with_llm using the LLM's native ainvoke.
+        
+        Args:
+            query (str): The user's query
+            search_results (Dict[str, str]): Results from all tools
+            custom_instructions (str, optional): Instructions for this call; defaults to the agent's own
+            
+        Returns:
+            str: Synthesized response from LLM in JSON format
+        """
+        prompt = self._build_synthesis_prompt(query, search_results, custom_instructions or self.custom_instructions)
+        
+        try:
+            async with get_llm_scheduler().aslot():
+                with LLM_SECONDS.time(operation="validation"), span("llm"):
+                    response = await llm_dependency.acall(lambda: self.llm.ainvoke(prompt))
+            COMPLETION_TOKENS.inc(count_tokens(str(response.content)), operation="validation")
+            return self._clean_json_response(response.content)
+        except LLMOverloadedError:
+            raise
+        except CircuitOpenError as e:
+            return self._unavailable_response(e)
+        except Exception as e:
+            logger.error(f"Error in LLM synthesis: {str(e)}")
+            self.last_error = str(e)
+            return json.dumps({
+                "summary": f"Error synthesizing information: {str(e)}",
+                "validation_results": []
+            })
             
+    def _unavailable_response(self, error: CircuitOpenError) -> str:
+        """Degraded result returned straight away while the model's circuit breaker is open; never cached."""
+        logger.warning(f"Skipping LLM synthesis: {str(error)}")
+        self.last_error = str(error)
+        return json.dumps({
+            "summary": "Medical validation is temporarily unavailable. Please try again shortly.",
+            "validation_results": []
+        })
+
+    @traced("parse_response")
     def _clean_json_response(self, response: str) -> str:
-        """Clean any Markdown formatting from the JSON response.
+        """Extract, repair and validate the JSON result in the model's output.
         
         Args:
             response (str): The response from the LLM
             
         Returns:
-            str: Cleaned JSON string
+            str: JSON string in the summary/validation_results schema; an error result (with
+            last_error set) when the output holds no recoverable result. last_error is also
+            set for a partial result, so it is not cached
         """
-        # Remove markdown code block formatting if present
-        response = response.strip()
-        
-        # Remove ```json at the beginning
-        if response.startswith("```json"):
-            response = response[7:].strip()
-        elif response.startswith("```"):
-            response = response[3:].strip()
-            
-        # Remove trailing ``` if present
-        if response.endswith("```"):
-            response = response[:-3].strip()
-            
-        return response
+        with PARSE_SECONDS.time():
+            parsed = parse_validation_response(response if isinstance(response, str) else None)
+        if parsed is None:
+            logger.error("LLM response did not contain a usable validation result")
+            self.last_error = "Unparseable LLM response"
+            return json.dumps({
+                "summary": "Error parsing validation result",
+                "validation_results": []
+            })
+        if parsed.partial:
+            # Still shown to the user, but never cached or turned into claim verdicts
+            logger.warning("LLM response was cut off or malformed; returning a partial result")
+            self.last_error = "Partial LLM response"
+        return json.dumps(parsed.model_dump())
 
     def run(self, query: str, custom_instructions: str = None) -> str:
         """
@@ -287,43 +495,537 @@ class EnhancedMedicalAgentSystem:
         Returns:
             str: Synthesized medical information with source references in JSON format
         """
+        self.last_error = None
         try:
-            # Update custom instructions if provided
-            if custom_instructions:
-                self.custom_instructions = custom_instructions
+            # Per-call instructions never overwrite the agent's defaults, so pooled agents stay reusable
+            custom_instructions = custom_instructions or self.custom_instructions
                 
             logger.info(f"Processing query: '{query}'")
-            logger.info(f"Using custom instructions: {self.custom_instructions}")
+            logger.info(f"Using custom instructions: {custom_instructions}")
+            
+            # Split the page into claims and skip the ones with a known verdict
+            plan = plan_claim_validation(query, self.claim_store, verdict_scope(self.model, custom_instructions)) if self.claim_store else None
+            if plan is not None and not plan.missing:
+                return complete_claim_validation(plan, None, self.claim_store)
+            llm_query = plan.llm_query if plan is not None else query
             
             # First, perform comprehensive search to collect all tool responses
-            search_results = self.comprehensive_search(query)
+            search_results = self.comprehensive_search(llm_query)
             
             # Generate synthesized response using the LLM with all tool outputs
-            json_response = self.synthesize_with_llm(query, search_results)
+            json_response = self.synthesize_with_llm(llm_query, search_results, custom_instructions)
+            
+            if plan is not None:
+                json_response = complete_claim_validation(plan, json_response, self.claim_store, store_verdicts=self.last_error is None, store_correct=not self.last_prompt_trimmed)
             
             return json_response
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             error_msg = f"An error occurred: {e}. Please try rephrasing your query."
             logger.error(f"Query processing error: {e}")
+            self.last_error = str(e)
             error_json = json.dumps({
                 "summary": error_msg,
                 "validation_results": []
             })
             return error_json
 
-def get_medical_validation(query: str, custom_instructions: str = None): # This function returns the validated response with important source links if any
-    # Create the medical agent with optional custom instructions
-    agent = EnhancedMedicalAgentSystem(custom_instructions=custom_instructions)
+    async def _aplan_claims(self, query: str, custom_instructions: str) -> Optional[ClaimPlan]:
+        """plan_claim_validation for async callers; a persistent store is read in a thread."""
+        if not self.claim_store:
+            return None
+        scope = verdict_scope(self.model, custom_instructions)
+        if self.claim_store.persistent:
+            return await asyncio.to_thread(plan_claim_validation, query, self.claim_store, scope)
+        return plan_claim_validation(query, self.claim_store, scope)
+
+    async def _acomplete_claims(self, plan: ClaimPlan, json_response: Optional[str]) -> str:
+        """complete_claim_validation for async callers; a persistent store is written in a thread."""
+        kwargs = {} if json_response is None else {"store_verdicts": self.last_error is None, "store_correct": not self.last_prompt_trimmed}
+        if self.claim_store.persistent:
+            return await asyncio.to_thread(complete_claim_validation, plan, json_response, self.claim_store, **kwargs)
+        return complete_claim_validation(plan, json_response, self.claim_store, **kwargs)
+
+    async def arun(self, query: str, custom_instructions: str = None) -> str:
+        """
+        Async variant of run; safe to await from a request handler without blocking other requests.
+        
+        Args:
+            query (str): The medical query to process
+            custom_instructions (str, optional): Custom instructions for the LLM synthesis
+        
+        Returns:
+            str: Synthesized medical information with source references in JSON format
+        """
+        self.last_error = None
+        try:
+            custom_instructions = custom_instructions or self.custom_instructions
+            logger.info(f"Processing query: '{query}'")
+            
+            plan = await self._aplan_claims(query, custom_instructions)
+            if plan is not None and not plan.missing:
+                return await self._acomplete_claims(plan, None)
+            llm_query = plan.llm_query if plan is not None else query
+            
+            search_results = await self.acomprehensive_search(llm_query)
+            json_response = await self.asynthesize_with_llm(llm_query, search_results, custom_instructions)
+            
+            if plan is not None:
+                json_response = await self._acomplete_claims(plan, json_response)
+            return json_response
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Query processing error: {e}")
+            self.last_error = str(e)
+            return json.dumps({
+                "summary": f"An error occurred: {e}. Please try rephrasing your query.",
+                "validation_results": []
+            })
+
+    async def astream_run(self, query: str, custom_instructions: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of arun that yields progress events as soon as they are available.
+        
+        Events are dicts with an "event" key: "search_complete" (per-source status and timings),
+        "validation_result" (one item, emitted as soon as it is parsed from the model output),
+        "summary", and finally "done" carrying the complete result.
+        
+        Args:
+            query (str): The medical query to process
+            custom_instructions (str, optional): Custom instructions for the LLM synthesis
+        
+        Yields:
+            Dict[str, Any]: Progress events
+        """
+        self.last_error = None
+        emitted = set()
+        
+        def _is_new(item: Dict[str, Any]) -> bool:
+            key = normalize_claim(item.get("incorrect_text", ""))
+            if not key or key in emitted:
+                return False
+            emitted.add(key)
+            return True
+        
+        try:
+            custom_instructions = custom_instructions or self.custom_instructions
+            logger.info(f"Streaming query: '{query}'")
+            
+            # Claims with a known verdict can be highlighted before any search or LLM work
+            plan = await self._aplan_claims(query, custom_instructions)
+            if plan is not None:
+                for item in cached_validation_results(plan):
+                    if _is_new(item):
+                        yield {"event": "validation_result", "item": item}
+            
+            if plan is not None and not plan.missing:
+                json_response = await self._acomplete_claims(plan, None)
+            else:
+                llm_query = plan.llm_query if plan is not None else query
+                
+                search_results = await self.acomprehensive_search(llm_query)
+                yield {"event": "search_complete", "sources": dict(self.search_status), "timings": dict(self.search_timings)}
+                
+                prompt = self._build_synthesis_prompt(llm_query, search_results, custom_instructions)
+                parser = IncrementalResultParser()
+                try:
+                    # The slot is held for the whole stream; overload here ends the stream with an error result.
+                    # A stream cannot be retried or hedged, but it still feeds and respects the model's breaker
+                    async with get_llm_scheduler().aslot():
+                        with llm_dependency.guard():
+                            llm_started = time.perf_counter()
+                            async for chunk in self.llm.astream(prompt):
+                                for item in parser.feed(chunk.content if isinstance(chunk.content, str) else ""):
+                                    if _is_new(item):
+                                        yield {"event": "validation_result", "item": item}
+                            LLM_SECONDS.observe(time.perf_counter() - llm_started, operation="validation_stream")
+                    COMPLETION_TOKENS.inc(count_tokens(parser.buffer), operation="validation_stream")
+                    json_response = self._clean_json_response(parser.buffer)
+                except CircuitOpenError as e:
+                    json_response = self._unavailable_response(e)
+                except Exception as e:
+                    logger.error(f"Error in LLM synthesis: {str(e)}")
+                    self.last_error = str(e)
+                    json_response = json.dumps({
+                        "summary": f"Error synthesizing information: {str(e)}",
+                        "validation_results": []
+                    })
+                
+                if plan is not None:
+                    json_response = await self._acomplete_claims(plan, json_response)
+        except Exception as e:
+            logger.error(f"Query processing error: {e}")
+            self.last_error = str(e)
+            json_response = json.dumps({
+                "summary": f"An error occurred: {e}. Please try rephrasing your query.",
+                "validation_results": []
+            })
+        
+        result = parse_chunk_response(json_response)
+        for item in result.get("validation_results", []):
+            if isinstance(item, dict) and _is_new(item):
+                yield {"event": "validation_result", "item": item}
+        yield {"event": "summary", "summary": result.get("summary", "")}
+        yield {"event": "done", "result": result}
+
+class AgentPool:
+    """Process-wide pool of pre-initialised agents sharing one LLM client.
+    
+    Agents are handed out exclusively via lease(). Leasing never blocks: when every
+    pooled agent is busy a temporary agent is built around the shared LLM client and
+    discarded on return, so the pool is safe to use from threads and the event loop alike.
+    """
+    
+    def __init__(self, size: int = AGENT_POOL_SIZE, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE):
+        self.size = max(1, size)
+        self.model = model
+        self.temperature = temperature
+        self._agents: "queue.Queue[EnhancedMedicalAgentSystem]" = queue.Queue(maxsize=self.size)
+        for _ in range(self.size):
+            self._agents.put_nowait(self._create_agent())
+        logger.info(f"Agent pool ready with {self.size} agents for {model}")
+    
+    def _create_agent(self) -> EnhancedMedicalAgentSystem:
+        return EnhancedMedicalAgentSystem(
+            model=self.model,
+            temperature=self.temperature,
+            llm=get_llm_client(self.model, self.temperature)
+        )
+    
+    @contextmanager
+    def lease(self) -> Iterator[EnhancedMedicalAgentSystem]:
+        """Borrow an agent for the duration of a with-block."""
+        try:
+            agent = self._agents.get_nowait()
+        except queue.Empty:
+            logger.info("Agent pool exhausted, creating an overflow agent")
+            agent = self._create_agent()
+        try:
+            yield agent
+        finally:
+            try:
+                self._agents.put_nowait(agent)
+            except queue.Full:
+                pass
+
+# Coalesces concurrent validations of identical content
+validation_flights = SingleFlight("validation")
+
+_agent_pool: Optional[AgentPool] = None
+_agent_pool_lock = threading.Lock()
+
+def get_agent_pool() -> AgentPool:
+    """Return the shared agent pool, building it on first use."""
+    global _agent_pool
+    with _agent_pool_lock:
+        if _agent_pool is None:
+            _agent_pool = AgentPool()
+        return _agent_pool
+
+def _validation_cache_key(query: str, custom_instructions: Optional[str]) -> str:
+    # The pool serves DEFAULT_MODEL; reading the setting keeps cache lookups from building the pool and its LLM clients
+    return make_cache_key(query, custom_instructions or DEFAULT_CUSTOM_INSTRUCTIONS, DEFAULT_MODEL)
+
+def has_cached_validation(query: str, custom_instructions: Optional[str] = None) -> bool:
+    """True when query has a cached result, i.e. its last validation finished without error."""
+    return get_validation_cache().peek(_validation_cache_key(query, custom_instructions)) is not None
 
+async def ahas_cached_validation(query: str, custom_instructions: Optional[str] = None) -> bool:
+    """Async has_cached_validation; the persistent cache tier is read in a thread."""
+    return await get_validation_cache().apeek(_validation_cache_key(query, custom_instructions)) is not None
+
+def get_medical_validation(query: str, custom_instructions: str = None): # This function returns the validated response with important source links if any
     try:    
-        # Run the comprehensive search and get the response
-        response = agent.run(query)
+        with span("get_medical_validation") as current:
+            cache = get_validation_cache()
+            cache_key = _validation_cache_key(query, custom_instructions)
+            response = cache.get(cache_key)
+            if current is not None:
+                current.attributes["cache"] = "hit" if response is not None else "miss"
+            if response is not None:
+                logger.info(f"Validation cache hit for {cache_key[:12]}")
+                return response
+            
+            def _run() -> str:
+                # Borrow a warm agent from the shared pool and run the comprehensive search
+                with get_agent_pool().lease() as agent:
+                    result = agent.run(query, custom_instructions=custom_instructions)
+                    if agent.last_error is None:
+                        cache.set(cache_key, result)
+                return result
+            
+            def _validate() -> str:
+                leases = get_lease_table()
+                if leases is None:
+                    return _run()
+                # With shared state, a validation already running in another worker is waited for, not repeated
+                with leases.flight(cache_key, lambda: cache.peek(cache_key)) as shared:
+                    return shared if shared is not None else _run()
+            
+            # Concurrent callers with the same content share one run
+            response = validation_flights.do_sync(cache_key, _validate)
         print("\nAssistant:", response)
         return response
         
     except KeyboardInterrupt:
         print("\nOperation cancelled. Type 'exit' to quit.")
 
+async def aget_medical_validation(query: str, custom_instructions: str = None) -> str:
+    """Async counterpart of get_medical_validation used by the API server."""
+    with span("get_medical_validation") as current:
+        cache = get_validation_cache()
+        cache_key = _validation_cache_key(query, custom_instructions)
+        response = await cache.aget(cache_key)
+        if current is not None:
+            current.attributes["cache"] = "hit" if response is not None else "miss"
+        if response is not None:
+            logger.info(f"Validation cache hit for {cache_key[:12]}")
+            return response
+        
+        async def _run() -> str:
+            with get_agent_pool().lease() as agent:
+                result = await agent.arun(query, custom_instructions=custom_instructions)
+                if agent.last_error is None:
+                    await cache.aset(cache_key, result)
+            return result
+        
+        async def _validate() -> str:
+            leases = get_lease_table()
+            if leases is None:
+                return await _run()
+            # With shared state, a validation already running in another worker is waited for, not repeated
+            async with leases.aflight(cache_key, lambda: cache.peek(cache_key)) as shared:
+                return shared if shared is not None else await _run()
+        
+        # Concurrent requests with the same content wait on one in-flight validation
+        return await validation_flights.do(cache_key, _validate)
+
+async def aget_chunked_medical_validation(queries: List[str], custom_instructions: str = None, max_concurrency: int = CHUNK_CONCURRENCY) -> str:
+    """
+    Validate the chunks of one long page in parallel and merge them into a single response.
+    
+    Args:
+        queries (List[str]): One formatted validation query per chunk, in page order
+        custom_instructions (str, optional): Custom instructions for the LLM synthesis
+        max_concurrency (int): Maximum number of chunks validated at the same time
+    
+    Returns:
+        str: Merged validation response in JSON format
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    
+    async def _validate_chunk(index: int, chunk_query: str) -> str:
+        async with semaphore:
+            logger.info(f"Validating chunk {index + 1}/{len(queries)} ({len(chunk_query)} chars)")
+            return await aget_medical_validation(chunk_query, custom_instructions=custom_instructions)
+    
+    responses = await asyncio.gather(*[_validate_chunk(i, q) for i, q in enumerate(queries)])
+    merged = merge_validation_results([parse_chunk_response(r) for r in responses])
+    logger.info(f"Merged {len(queries)} chunks into {len(merged['validation_results'])} validation results")
+    return json.dumps(merged)
+
+async def aget_batch_medical_validation(queries: List[Any], custom_instructions: str = None, max_concurrency: int = BATCH_CONCURRENCY, dedup_texts: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Validate many pages at once with de-duplication and a shared concurrency limit.
+    
+    Identical or near-identical pages are validated once and share the result. The remaining
+    pages' queries (a chunked page contributes one query per chunk) are de-duplicated again
+    and scheduled through a single semaphore, so max_concurrency bounds the LLM calls of
+    the whole batch. A page that fails (e.g. the model queue is full) gets an error result
+    and its "error" set; the other pages' results are still returned.
+    
+    Args:
+        queries (List[Any]): Per page, either one formatted query or a list of chunk queries
+        custom_instructions (str, optional): Custom instructions for the LLM synthesis
+        max_concurrency (int): Maximum validations running at the same time
+        dedup_texts (List[str], optional): Page texts used to detect duplicate pages; defaults to the queries
+    
+    Returns:
+        Dict[str, Any]: "results" with per-item result, error (None on success), duplicate_of and
+        elapsed seconds, and aggregate "stats"
+    """
+    started = time.perf_counter()
+    page_queries = [[q] if isinstance(q, str) else list(q) for q in queries]
+    duplicate_of = find_duplicates(dedup_texts if dedup_texts is not None else ["\n".join(q) for q in page_queries])
+    
+    # Identical queries across different pages (e.g. shared chunks) are only validated once
+    unique_queries: Dict[str, asyncio.Future] = {}
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    
+    async def _validate(query: str) -> str:
+        async with semaphore:
+            return await aget_medical_validation(query, custom_instructions=custom_instructions)
+    
+    def _schedule(query: str) -> asyncio.Future:
+        if query not in unique_queries:
+            unique_queries[query] = asyncio.ensure_future(_validate(query))
+        return unique_queries[query]
+    
+    async def _validate_page(index: int) -> Tuple[Dict[str, Any], Optional[str], float]:
+        page_started = time.perf_counter()
+        # A failed chunk fails only its page; shared chunks report the same error to every page using them
+        responses = await asyncio.gather(*[_schedule(q) for q in page_queries[index]], return_exceptions=True)
+        errors = [r for r in responses if isinstance(r, BaseException)]
+        if errors:
+            logger.error(f"Batch item {index} failed: {errors[0]}")
+            result = {"summary": f"Error: {errors[0]}", "validation_results": []}
+            return result, str(errors[0]) or type(errors[0]).__name__, time.perf_counter() - page_started
+        parsed = [parse_chunk_response(r) for r in responses]
+        result = parsed[0] if len(parsed) == 1 else merge_validation_results(parsed)
+        return result, None, time.perf_counter() - page_started
+    
+    unique_indexes = [i for i, dup in enumerate(duplicate_of) if dup is None]
+    try:
+        page_outcomes = dict(zip(unique_indexes, await asyncio.gather(*[_validate_page(i) for i in unique_indexes])))
+    finally:
+        # Only left running if the batch itself was cancelled; reap them so no exception goes unretrieved
+        pending = [future for future in unique_queries.values() if not future.done()]
+        for future in pending:
+            future.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    results = []
+    for index, dup in enumerate(duplicate_of):
+        result, error, elapsed = page_outcomes[dup if dup is not None else index]
+        results.append({"index": index, "result": result, "error": error, "duplicate_of": dup, "elapsed": round(elapsed, 3)})
+    
+    elapsed = time.perf_counter() - started
+    stats = {
+        "items": len(queries),
+        "unique_items": len(unique_indexes),
+        "duplicates": len(queries) - len(unique_indexes),
+        "unique_queries": len(unique_queries),
+        "errors": sum(1 for item in results if item["error"] is not None),
+        "max_concurrency": max_concurrency,
+        "elapsed": round(elapsed, 3),
+        "items_per_second": round(len(queries) / elapsed, 3) if elapsed > 0 else None,
+    }
+    logger.info(f"Batch validation finished: {stats}")
+    return {"results": results, "stats": stats}
+
+def get_batch_medical_validation(queries: List[Any], custom_instructions: str = None, max_concurrency: int = BATCH_CONCURRENCY, dedup_texts: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Synchronous wrapper around aget_batch_medical_validation for scripts and crawlers."""
+    return asyncio.run(aget_batch_medical_validation(queries, custom_instructions, max_concurrency, dedup_texts))
+
+def _replay_events(response: str) -> List[Dict[str, Any]]:
+    """Events for a finished validation, in the order astream_run would have sent them."""
+    result = parse_chunk_response(response)
+    events = [{"event": "validation_result", "item": item} for item in result.get("validation_results", [])]
+    return events + [{"event": "summary", "summary": result.get("summary", "")}, {"event": "done", "result": result}]
+
+async def astream_medical_validation(query: str, custom_instructions: str = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming counterpart of aget_medical_validation; see EnhancedMedicalAgentSystem.astream_run for the events.
+    
+    The validation runs as the content's single flight, like aget_medical_validation: the
+    first caller receives events as they are produced, while concurrent callers for the same
+    content (streaming or not, in this worker or, with shared state, another) wait for that
+    run and get its result replayed. A caller that disconnects does not cancel the run.
+    """
+    cache = get_validation_cache()
+    cache_key = _validation_cache_key(query, custom_instructions)
+    response = await cache.aget(cache_key)
+    if response is not None:
+        logger.info(f"Validation cache hit for {cache_key[:12]}")
+        for event in _replay_events(response):
+            yield event
+        return
+    
+    # Filled only when this caller leads the flight
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def _stream() -> str:
+        with get_agent_pool().lease() as agent:
+            async for event in agent.astream_run(query, custom_instructions=custom_instructions):
+                events.put_nowait(event)
+                if event["event"] == "done":
+                    result = json.dumps(event["result"])
+                    if agent.last_error is None:
+                        await cache.aset(cache_key, result)
+                    return result
+        raise RuntimeError("Validation stream ended without a result")
+    
+    async def _validate() -> str:
+        leases = get_lease_table()
+        if leases is None:
+            return await _stream()
+        async with leases.aflight(cache_key, lambda: cache.peek(cache_key)) as shared:
+            if shared is not None:
+                for event in _replay_events(shared):
+                    events.put_nowait(event)
+                return shared
+            return await _stream()
+    
+    flight = asyncio.ensure_future(validation_flights.do(cache_key, _validate))
+    getter: Optional[asyncio.Future] = None
+    try:
+        while True:
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({getter, flight}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                break
+            event = getter.result()
+            yield event
+            if event["event"] == "done":
+                return
+        # The flight finished: drain what the leader queued, or replay the result a follower joined
+        while not events.empty():
+            event = events.get_nowait()
+            yield event
+            if event["event"] == "done":
+                return
+        for event in _replay_events(flight.result()):
+            yield event
+    finally:
+        if getter is not None and not getter.done():
+            getter.cancel()
+        # The run carries on for other callers; retrieve its outcome so a failure is not reported as unhandled
+        flight.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+async def astream_chunked_medical_validation(queries: List[str], custom_instructions: str = None, max_concurrency: int = CHUNK_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming counterpart of aget_chunked_medical_validation.
+    
+    Chunks are validated in parallel and each chunk's new validation items are emitted as
+    soon as that chunk finishes, followed by a "chunk_complete" event.
+    
+    Args:
+        queries (List[str]): One formatted validation query per chunk, in page order
+        custom_instructions (str, optional): Custom instructions for the LLM synthesis
+        max_concurrency (int): Maximum number of chunks validated at the same time
+    
+    Yields:
+        Dict[str, Any]: Progress events
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    
+    async def _validate_chunk(index: int, chunk_query: str) -> Tuple[int, str]:
+        async with semaphore:
+            return index, await aget_medical_validation(chunk_query, custom_instructions=custom_instructions)
+    
+    tasks = [asyncio.ensure_future(_validate_chunk(i, q)) for i, q in enumerate(queries)]
+    responses: List[Dict[str, Any]] = [{"summary": "", "validation_results": []} for _ in queries]
+    emitted = set()
+    try:
+        for completed, next_done in enumerate(asyncio.as_completed(tasks), start=1):
+            index, response = await next_done
+            responses[index] = parse_chunk_response(response)
+            for item in responses[index].get("validation_results", []):
+                key = normalize_claim(item.get("incorrect_text", "")) if isinstance(item, dict) else ""
+                if key and key not in emitted:
+                    emitted.add(key)
+                    yield {"event": "validation_result", "item": item}
+            yield {"event": "chunk_complete", "chunk": index + 1, "completed": completed, "total": len(queries)}
+    finally:
+        for task in tasks:
+            task.cancel()
+    
+    merged = merge_validation_results(responses)
+    yield {"event": "summary", "summary": merged["summary"]}
+    yield {"event": "done", "result": merged}
+
 
 # Example usage with custom instructions
 if __name__ == "__main__":
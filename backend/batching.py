@@ -0,0 +1,79 @@
+import os
+import re
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from validation_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Batch validation configuration
+BATCH_CONCURRENCY = int(os.getenv("MEDICHECK_BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("MEDICHECK_BATCH_MAX_ITEMS", "100"))
+# Pages whose 64-bit SimHash fingerprints differ in at most this many bits are treated as the same page
+NEAR_DUPLICATE_BITS = int(os.getenv("MEDICHECK_NEAR_DUPLICATE_BITS", "3"))
+
+_WORD = re.compile(r"\w+")
+_SHINGLE_SIZE = 3
+# Fingerprints are split into bands; near-duplicates within NEAR_DUPLICATE_BITS must share at least one band
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a text's word 3-shingles."""
+    words = _WORD.findall(normalize_text(text).lower())
+    shingles = [" ".join(words[i:i + _SHINGLE_SIZE]) for i in range(max(1, len(words) - _SHINGLE_SIZE + 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def find_duplicates(texts: List[str], max_distance: int = NEAR_DUPLICATE_BITS) -> List[Optional[int]]:
+    """
+    Map every text to the index of an earlier identical or near-identical text.
+
+    Args:
+        texts (List[str]): Page texts in batch order
+        max_distance (int): Maximum SimHash Hamming distance for near-duplicates; negative disables them
+
+    Returns:
+        List[Optional[int]]: For each text, the index of the text it duplicates, or None if it is the first of its kind
+    """
+    duplicate_of: List[Optional[int]] = [None] * len(texts)
+    exact: Dict[str, int] = {}
+    fingerprints: Dict[int, int] = {}
+    bands: Dict[tuple, List[int]] = {}
+
+    for index, text in enumerate(texts):
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        if digest in exact:
+            duplicate_of[index] = exact[digest]
+            continue
+        exact[digest] = index
+
+        if max_distance < 0:
+            continue
+        fingerprint = simhash(text)
+        keys = [(band, fingerprint >> (band * _BAND_BITS) & ((1 << _BAND_BITS) - 1)) for band in range(_BANDS)]
+        match = None
+        for key in keys:
+            for candidate in bands.get(key, []):
+                if bin(fingerprint ^ fingerprints[candidate]).count("1") <= max_distance:
+                    match = candidate
+                    break
+            if match is not None:
+                break
+        if match is not None:
+            duplicate_of[index] = match
+            continue
+
+        fingerprints[index] = fingerprint
+        for key in keys:
+            bands.setdefault(key, []).append(index)
+
+    return duplicate_of
@@ -0,0 +1,523 @@
+"""
+Benchmark /summarize and /chat with stubbed LLM and source backends.
+
+Runs the FastAPI app in-process (default) or against a running server, and writes latency
+percentiles, throughput and memory growth per scenario as JSON:
+
+    python benchmark.py run --output results.json
+    python benchmark.py run --concurrency 1 8 32 --page-chars 2000 20000 --history 0 15
+    python benchmark.py run --url http://localhost:8000 --output remote.json
+    python benchmark.py coldstart --repeat 5 --output coldstart.json
+    python benchmark.py workers --workers 1 2 4 --output workers.json
+    python benchmark.py compare baseline.json results.json --threshold 0.1
+
+Unless already set, the stub LLM backend is selected and live Wikipedia lookups are turned
+off, so no network access or API key is needed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("MEDICHECK_LLM_BACKEND", "stub")
+os.environ.setdefault("MEDICHECK_WIKIPEDIA_LIVE", "0")
+
+import httpx
+
+# Building blocks for synthetic pages: claims the content filter keeps, and page furniture it drops
+_CLAIMS = [
+    "Vaccines cause autism in {n}% of children who receive them.",
+    "Drinking lemon water every morning cures cancer within {n} weeks.",
+    "Humans only use {n}% of their brain at any given time.",
+    "Antibiotics are effective against viral infections such as the flu in {n} cases out of 100.",
+    "Taking {n} grams of vitamin C a day prevents the common cold.",
+    "Regular exercise reduces the risk of heart disease by about {n}%.",
+    "Smoking {n} cigarettes a day has no effect on lung health.",
+    "Sleeping fewer than {n} hours a night increases the risk of obesity and diabetes.",
+]
+_FILLER = [
+    "The city council met on Tuesday to discuss the new park.",
+    "Local weather will stay mild through the weekend with light winds.",
+    "The football team announced its new coach after a long search.",
+    "Share on Facebook",
+    "Subscribe to our newsletter",
+    "We use cookies to improve your experience. Accept all",
+    "Related articles",
+]
+
+
+def make_page(chars: int, seed: int) -> Dict[str, Any]:
+    """Build a deterministic page of roughly chars characters with a mix of claims and filler."""
+    rng = random.Random(seed)
+    lines: List[str] = []
+    size = 0
+    while size < chars:
+        template = rng.choice(_CLAIMS) if rng.random() < 0.3 else rng.choice(_FILLER)
+        line = template.format(n=rng.randint(2, 99)) + f" Ref {seed}-{len(lines)}."
+        lines.append(line)
+        size += len(line) + 1
+    return {
+        "title": f"Benchmark page {seed}",
+        "url": f"https://example.com/benchmark/{seed}",
+        "text": "\n".join(lines)[:chars],
+        "metadata": {"description": "Synthetic benchmark page"},
+    }
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, or its peak where the current value is unavailable."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+async def run_load(client: httpx.AsyncClient, requests: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """
+    Send requests with a fixed number of concurrent workers and summarise the latencies.
+
+    Args:
+        client (httpx.AsyncClient): Client bound to the app or server
+        requests (List[Dict[str, Any]]): Each has "path" and "json"
+        concurrency (int): Number of requests kept in flight
+
+    Returns:
+        Dict[str, Any]: Latency percentiles in milliseconds, throughput, error and rejection counts
+    """
+    pending = list(reversed(requests))
+    latencies: List[float] = []
+    errors = 0
+    rejected = 0
+
+    async def worker() -> None:
+        nonlocal errors, rejected
+        while pending:
+            request = pending.pop()
+            started = time.perf_counter()
+            try:
+                response = await client.post(request["path"], json=request["json"])
+                # 429 is the LLM scheduler shedding load, counted apart from failures
+                if response.status_code == 429:
+                    rejected += 1
+                elif response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "rejected": rejected,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(requests) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def prefill_history(client: httpx.AsyncClient, app: Any, session_id: str, turns: int) -> None:
+    """Give a chat session turns entries of history; in-process runs write straight to the store."""
+    if app is not None:
+        from main import conversation_store
+        for turn in range(turns):
+            conversation_store.append(session_id, "user" if turn % 2 == 0 else "bot", f"Earlier message {turn} in {session_id} about vitamin D and sleep.")
+        return
+    for turn in range(turns // 2):
+        await client.post("/chat", json={"message": f"Earlier question {turn} in {session_id} about vitamin D.", "session_id": session_id})
+
+
+async def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    app = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        lifespan = None
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=args.timeout)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+
+    results: List[Dict[str, Any]] = []
+    seed = 0
+    try:
+        for page_chars in args.page_chars:
+            for concurrency in args.concurrency:
+                count = max(args.requests, concurrency)
+                requests = []
+                for index in range(count):
+                    # A repeat_ratio share of requests re-send an earlier page, to exercise the caches
+                    rng = random.Random(seed)
+                    if requests and rng.random() < args.repeat_ratio:
+                        requests.append(requests[rng.randrange(len(requests))])
+                    else:
+                        requests.append({"path": "/summarize", "json": {"content": make_page(page_chars, seed), "session_id": f"bench-{index % concurrency}"}})
+                    seed += 1
+                rss_before = rss_bytes() if app is not None else None
+                outcome = await run_load(client, requests, concurrency)
+                rss_after = rss_bytes() if app is not None else None
+                results.append({
+                    "scenario": f"summarize/page_chars={page_chars}/concurrency={concurrency}",
+                    "endpoint": "/summarize",
+                    "page_chars": page_chars,
+                    "concurrency": concurrency,
+                    **outcome,
+                    "rss_growth_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                })
+                print(f"{results[-1]['scenario']}: p50={outcome['p50_ms']}ms p95={outcome['p95_ms']}ms rps={outcome['rps']}", file=sys.stderr)
+
+        for history in args.history:
+            for concurrency in args.concurrency:
+                sessions = [f"bench-chat-{history}-{concurrency}-{index}" for index in range(concurrency)]
+                for session_id in sessions:
+                    await prefill_history(client, app, session_id, history)
+                count = max(args.requests, concurrency)
+                requests = [
+                    {"path": "/chat", "json": {"message": f"Question {index}: is vitamin D good for sleep?", "session_id": sessions[index % concurrency]}}
+                    for index in range(count)
+                ]
+                rss_before = rss_bytes() if app is not None else None
+                outcome = await run_load(client, requests, concurrency)
+                rss_after = rss_bytes() if app is not None else None
+                results.append({
+                    "scenario": f"chat/history={history}/concurrency={concurrency}",
+                    "endpoint": "/chat",
+                    "history": history,
+                    "concurrency": concurrency,
+                    **outcome,
+                    "rss_growth_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                })
+                print(f"{results[-1]['scenario']}: p50={outcome['p50_ms']}ms p95={outcome['p95_ms']}ms rps={outcome['rps']}", file=sys.stderr)
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.url or "in-process",
+            "llm_backend": os.getenv("MEDICHECK_LLM_BACKEND"),
+            "stub_latency_ms": os.getenv("MEDICHECK_STUB_LATENCY_MS"),
+        },
+        "results": results,
+    }
+
+
+async def measure_cold_start(timeout: float) -> Dict[str, float]:
+    """
+    Time one cold start of the app in this (fresh) process.
+
+    Returns:
+        Dict[str, float]: Milliseconds to import main, to run the startup hooks, for the first
+        /summarize request, and from the start of the import until /ready answers 200
+    """
+    started = time.perf_counter()
+    from main import app
+    imported = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        started_up = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=timeout) as client:
+            async def wait_until_ready() -> float:
+                while (await client.get("/ready")).status_code != 200:
+                    if time.perf_counter() - started > timeout:
+                        raise TimeoutError("App did not become ready")
+                    await asyncio.sleep(0.01)
+                return time.perf_counter()
+
+            # Poll readiness alongside the first request, as a load balancer would while traffic arrives
+            readiness = asyncio.create_task(wait_until_ready())
+            request_started = time.perf_counter()
+            response = await client.post("/summarize", json={"content": make_page(2000, 0), "session_id": "coldstart"})
+            response.raise_for_status()
+            first_request = time.perf_counter() - request_started
+            ready = await readiness
+
+    return {
+        "import_ms": round((imported - started) * 1000, 2),
+        "startup_ms": round((started_up - imported) * 1000, 2),
+        "first_request_ms": round(first_request * 1000, 2),
+        "ready_ms": round((ready - started) * 1000, 2),
+    }
+
+
+def run_cold_starts(args: argparse.Namespace) -> Dict[str, Any]:
+    """Measure args.repeat cold starts, each in a new interpreter, and summarise every phase."""
+    env = dict(os.environ)
+    # Model latency would swamp the first-request figure; it is measured by the run scenarios instead
+    env.setdefault("MEDICHECK_STUB_LATENCY_MS", "0")
+    samples: Dict[str, List[float]] = {}
+    for attempt in range(args.repeat):
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "coldstart-child", "--timeout", str(args.timeout)],
+            capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if child.returncode != 0:
+            raise RuntimeError(f"Cold start {attempt + 1} failed:\n{child.stderr[-2000:]}")
+        timings = json.loads(child.stdout.strip().splitlines()[-1])
+        for phase, value in timings.items():
+            samples.setdefault(phase, []).append(value)
+        print(f"coldstart {attempt + 1}/{args.repeat}: " + " ".join(f"{phase}={value}" for phase, value in timings.items()), file=sys.stderr)
+
+    results = [
+        {
+            "scenario": f"coldstart/{phase[:-3]}",
+            "runs": len(values),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "mean_ms": round(sum(values) / len(values), 2),
+            # Kept so result files share one shape; compare() skips a zero baseline
+            "rps": 0.0,
+        }
+        for phase, values in samples.items()
+    ]
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": "in-process",
+            "llm_backend": env.get("MEDICHECK_LLM_BACKEND"),
+            "stub_latency_ms": env.get("MEDICHECK_STUB_LATENCY_MS"),
+        },
+        "results": results,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+async def check_shared_sessions(client: httpx.AsyncClient, workers: int, turns: int = 3) -> bool:
+    """Chat in one session, then check that repeated /stats calls (spread over the workers) all see every turn."""
+    # A kept-alive connection stays with one worker; closing it after each call lets a different worker answer
+    close = {"Connection": "close"}
+    for turn in range(turns):
+        response = await client.post("/chat", json={"message": f"Continuity question {turn} about vitamin D.", "session_id": "continuity"}, headers=close)
+        response.raise_for_status()
+    for _ in range(workers * 4):
+        conversations = (await client.get("/stats", headers=close)).json()["conversations"]
+        if conversations.get("entries") != turns * 2:
+            return False
+    return True
+
+
+async def load_workers(url: str, args: argparse.Namespace, workers: int, seed: int) -> List[Dict[str, Any]]:
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout) as client:
+        deadline = time.perf_counter() + args.timeout
+        while True:
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"Server with {workers} workers did not become ready")
+            await asyncio.sleep(0.2)
+
+        shared_sessions = await check_shared_sessions(client, workers)
+        results = []
+        for concurrency in args.concurrency:
+            count = max(args.requests, concurrency)
+            scenarios = [
+                ("summarize", [{"path": "/summarize", "json": {"content": make_page(args.page_chars, seed + index), "session_id": f"bench-{index % concurrency}"}}
+                               for index in range(count)]),
+                ("chat", [{"path": "/chat", "json": {"message": f"Question {seed + index}: is vitamin D good for sleep?", "session_id": f"bench-chat-{index % concurrency}"}}
+                          for index in range(count)]),
+            ]
+            seed += count
+            for endpoint, requests in scenarios:
+                outcome = await run_load(client, requests, concurrency)
+                results.append({
+                    "scenario": f"workers/{endpoint}/workers={workers}/concurrency={concurrency}",
+                    "endpoint": f"/{endpoint}",
+                    "workers": workers,
+                    "concurrency": concurrency,
+                    "shared_sessions": shared_sessions,
+                    **outcome,
+                })
+                print(f"{results[-1]['scenario']}: p50={outcome['p50_ms']}ms p95={outcome['p95_ms']}ms rps={outcome['rps']}", file=sys.stderr)
+        return results
+
+
+def run_worker_scaling(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Start uvicorn with each worker count in turn, sharing state through SQLite, and load it.
+
+    Every server gets a fresh state file, so no run is served from an earlier run's cache.
+    Results also record whether all workers saw the same chat session (shared_sessions).
+    """
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    results: List[Dict[str, Any]] = []
+    env = dict(os.environ)
+    # A short model delay keeps the server's own CPU work, which extra workers spread over cores, significant
+    env.setdefault("MEDICHECK_STUB_LATENCY_MS", "50")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as state_dir:
+            port = free_port()
+            server_env = {**env, "MEDICHECK_STATE_BACKEND": "sqlite", "MEDICHECK_STATE_DB": os.path.join(state_dir, "state.db")}
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                 "--workers", str(workers), "--log-level", "warning"],
+                cwd=backend_dir, env=server_env, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL
+            )
+            try:
+                results.extend(asyncio.run(load_workers(f"http://127.0.0.1:{port}", args, workers, seed=workers * 100_000)))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "target": "uvicorn",
+            "state_backend": "sqlite",
+            "llm_backend": env.get("MEDICHECK_LLM_BACKEND"),
+            "stub_latency_ms": env.get("MEDICHECK_STUB_LATENCY_MS"),
+        },
+        "results": results,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> int:
+    """
+    Print per-scenario changes between two result files.
+
+    Returns:
+        int: 1 if any scenario's p95 latency grew, or its throughput fell, by more than threshold; else 0
+    """
+    with open(baseline_path) as baseline_file, open(current_path) as current_file:
+        baseline = {result["scenario"]: result for result in json.load(baseline_file)["results"]}
+        current = {result["scenario"]: result for result in json.load(current_file)["results"]}
+
+    regressions = 0
+    print(f"{'scenario':<50} {'p95 ms':>20} {'rps':>20}")
+    for scenario, result in current.items():
+        before = baseline.get(scenario)
+        if before is None:
+            print(f"{scenario:<50} {'(new)':>20}")
+            continue
+        p95_change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        rps_change = (result["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+        regressed = p95_change > threshold or rps_change < -threshold
+        regressions += regressed
+        print(
+            f"{scenario:<50} {before['p95_ms']:>8} -> {result['p95_ms']:<8} ({p95_change:+.1%})"
+            f" {before['rps']:>8} -> {result['rps']:<8} ({rps_change:+.1%}){'  REGRESSION' if regressed else ''}"
+        )
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark MediCheck's /summarize and /chat endpoints")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmark scenarios")
+    run.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    run.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels")
+    run.add_argument("--page-chars", type=int, nargs="+", default=[2000, 20000], help="Page sizes in characters for /summarize")
+    run.add_argument("--history", type=int, nargs="+", default=[0, 15], help="Chat history lengths for /chat")
+    run.add_argument("--requests", type=int, default=64, help="Requests per scenario (at least the concurrency level)")
+    run.add_argument("--repeat-ratio", type=float, default=0.0, help="Share of /summarize requests that repeat an earlier page")
+    run.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    run.add_argument("--output", help="Write results JSON here instead of stdout")
+    run.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+
+    coldstart = commands.add_parser("coldstart", help="Measure import, startup, first-request and readiness times")
+    coldstart.add_argument("--repeat", type=int, default=5, help="Number of cold starts, each in a new process")
+    coldstart.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for readiness")
+    coldstart.add_argument("--output", help="Write results JSON here instead of stdout")
+
+    scaling = commands.add_parser("workers", help="Measure throughput of uvicorn with several worker counts and shared SQLite state")
+    scaling.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts")
+    scaling.add_argument("--concurrency", type=int, nargs="+", default=[32], help="Concurrency levels")
+    scaling.add_argument("--page-chars", type=int, default=5000, help="Page size in characters for /summarize")
+    scaling.add_argument("--requests", type=int, default=200, help="Requests per scenario (at least the concurrency level)")
+    scaling.add_argument("--timeout", type=float, default=60.0, help="Per-request and server start timeout in seconds")
+    scaling.add_argument("--output", help="Write results JSON here instead of stdout")
+    scaling.add_argument("--verbose", action="store_true", help="Show the servers' warnings and errors")
+
+    # Runs one cold start; spawned by the coldstart command
+    child = commands.add_parser("coldstart-child")
+    child.add_argument("--timeout", type=float, default=60.0)
+
+    comparison = commands.add_parser("compare", help="Compare two result files")
+    comparison.add_argument("baseline")
+    comparison.add_argument("current")
+    comparison.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        sys.exit(compare(args.baseline, args.current, args.threshold))
+
+    if args.command == "coldstart-child":
+        logging.disable(logging.INFO)
+        print(json.dumps(asyncio.run(measure_cold_start(args.timeout))))
+        return
+
+    if args.command == "coldstart":
+        report = run_cold_starts(args)
+    elif args.command == "workers":
+        report = run_worker_scaling(args)
+    else:
+        if not args.verbose:
+            logging.disable(logging.INFO)
+        report = asyncio.run(run_benchmarks(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import re
+import logging
+from typing import Any, Dict, List
+
+from claim_cache import normalize_claim
+from output_parser import parse_validation_response
+
+logger = logging.getLogger(__name__)
+
+# Chunked validation configuration
+CHUNKING_ENABLED = os.getenv("MEDICHECK_CHUNKING", "1") == "1"
+CHUNK_CHARS = int(os.getenv("MEDICHECK_CHUNK_CHARS", "8000"))
+CHUNK_CONCURRENCY = int(os.getenv("MEDICHECK_CHUNK_CONCURRENCY", "4"))
+# Upper bound on page text validated in chunked mode, to keep cost per page bounded
+MAX_CONTENT_CHARS = int(os.getenv("MEDICHECK_MAX_CONTENT_CHARS", "200000"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _split_oversized(paragraph: str, max_chars: int) -> List[str]:
+    """Split a paragraph longer than max_chars on sentence boundaries, hard-cutting only as a last resort."""
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """
+    Split page text into chunks of at most max_chars, keeping paragraphs intact where possible.
+
+    Args:
+        text (str): Page text, paragraphs separated by newlines
+        max_chars (int): Maximum characters per chunk
+
+    Returns:
+        List[str]: Chunks in page order
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_len = 0
+
+    paragraphs = [p.strip() for p in text.splitlines() if p.strip()]
+    for paragraph in paragraphs:
+        for piece in ([paragraph] if len(paragraph) <= max_chars else _split_oversized(paragraph, max_chars)):
+            if current and current_len + 1 + len(piece) > max_chars:
+                chunks.append("\n".join(current))
+                current, current_len = [], 0
+            current.append(piece)
+            current_len += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def merge_validation_results(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-chunk validation responses into one, de-duplicating repeated corrections.
+
+    Args:
+        responses (List[Dict[str, Any]]): Parsed chunk responses in page order
+
+    Returns:
+        Dict[str, Any]: A single response in the summary/validation_results schema
+    """
+    summaries: List[str] = []
+    validation_results: List[Dict[str, str]] = []
+    seen_summaries = set()
+    seen_claims = set()
+
+    for response in responses:
+        summary = (response.get("summary") or "").strip()
+        if summary and summary not in seen_summaries:
+            seen_summaries.add(summary)
+            summaries.append(summary)
+
+        for item in response.get("validation_results", []):
+            if not isinstance(item, dict):
+                continue
+            key = normalize_claim(item.get("incorrect_text", ""))
+            if not key or key in seen_claims:
+                continue
+            seen_claims.add(key)
+            validation_results.append(item)
+
+    return {"summary": " ".join(summaries), "validation_results": validation_results}
+
+
+def parse_chunk_response(response: str) -> Dict[str, Any]:
+    """Parse one chunk's JSON response, returning an empty result if it is unusable."""
+    parsed = parse_validation_response(response) if isinstance(response, str) else None
+    if parsed is not None:
+        return parsed.model_dump()
+    logger.warning("Discarding unparseable chunk validation response")
+    return {"summary": "", "validation_results": []}
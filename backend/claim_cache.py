@@ -0,0 +1,360 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from output_parser import parse_validation_response
+from state_store import shared_db_path
+
+logger = logging.getLogger(__name__)
+
+# Claim cache configuration
+CLAIM_CACHE_ENABLED = os.getenv("MEDICHECK_CLAIM_CACHE", "1") == "1"
+# Optional SQLite file for verdicts; without it verdicts live for the lifetime of the process.
+# Defaults to the shared state file when MEDICHECK_STATE_BACKEND=sqlite
+CLAIM_DB_PATH = os.getenv("MEDICHECK_CLAIM_DB") or shared_db_path()
+CLAIM_CACHE_TTL = float(os.getenv("MEDICHECK_CLAIM_TTL", str(30 * 24 * 60 * 60)))
+# Verdicts kept in memory; older ones are evicted (and re-read from SQLite when persisted)
+CLAIM_CACHE_SIZE = int(os.getenv("MEDICHECK_CLAIM_CACHE_SIZE", "10000"))
+
+# Marker main.py puts in front of the page text; everything before it is page metadata
+CONTENT_MARKER = "Main Content:"
+
+# Shorter fragments (headings, "Read more") are never cached; they stay in the prompt while any claim does
+MIN_CLAIM_WORDS = 2
+# How similar an LLM "incorrect_text" must be to a claim to be attributed to it
+MATCH_THRESHOLD = 0.75
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])(\s+)(?=[\"'(\[]?[A-Z0-9])")
+_NON_WORD = re.compile(r"[^\w\s%]")
+
+
+class ClaimVerdict(BaseModel):
+    claim: str
+    verdict: str  # "correct" or "incorrect"
+    incorrect_text: str = ""
+    correct_text: str = ""
+
+
+class ClaimPlan(BaseModel):
+    """Split of one validation query into claims already judged and claims the LLM must see."""
+    scope: str = ""
+    claims: List[str]
+    cached: Dict[str, ClaimVerdict]
+    missing: List[str]
+    llm_query: str
+
+
+def normalize_claim(claim: str) -> str:
+    """Normalise a claim so trivial differences (case, punctuation, spacing) share a verdict."""
+    claim = unicodedata.normalize("NFKC", claim).lower()
+    claim = _NON_WORD.sub(" ", claim)
+    return " ".join(claim.split())
+
+
+def claim_key(claim: str) -> str:
+    return hashlib.sha1(normalize_claim(claim).encode("utf-8")).hexdigest()
+
+
+def verdict_scope(model: str, custom_instructions: Optional[str]) -> str:
+    """Identify what produced a verdict, so a new model or changed instructions starts with no verdicts."""
+    instructions = " ".join((custom_instructions or "").split())
+    return hashlib.sha1(f"{model}\x00{instructions}".encode("utf-8")).hexdigest()[:16]
+
+
+def _verdict_key(claim: str, scope: str) -> str:
+    return f"{scope}:{claim_key(claim)}" if scope else claim_key(claim)
+
+
+def extract_claims(text: str) -> List[str]:
+    """
+    Split page text into candidate claim sentences.
+
+    Args:
+        text (str): Validation query; only the part after CONTENT_MARKER is used when present
+
+    Returns:
+        List[str]: Unique claim sentences in page order
+    """
+    if CONTENT_MARKER in text:
+        text = text.split(CONTENT_MARKER, 1)[1]
+
+    claims: List[str] = []
+    seen = set()
+    for line in text.splitlines():
+        for sentence in _SENTENCE_SPLIT.split(line.strip())[::2]:
+            sentence = sentence.strip()
+            if len(sentence.split()) < MIN_CLAIM_WORDS:
+                continue
+            key = claim_key(sentence)
+            if key in seen:
+                continue
+            seen.add(key)
+            claims.append(sentence)
+    return claims
+
+
+def _remove_claims(text: str, claims: List[str]) -> str:
+    """Remove the given claim sentences from text, keeping every other line and sentence verbatim."""
+    keys = {claim_key(claim) for claim in claims}
+    lines = []
+    for line in text.split("\n"):
+        # Sentences alternate with the whitespace between them
+        sentences = _SENTENCE_SPLIT.split(line)[::2]
+        kept = [sentence for sentence in sentences if claim_key(sentence.strip()) not in keys]
+        if len(kept) == len(sentences):
+            lines.append(line)
+        elif kept:
+            lines.append(" ".join(sentence.strip() for sentence in kept))
+    return "\n".join(lines)
+
+
+def _is_match(claim: str, incorrect_text: str) -> bool:
+    claim_norm = normalize_claim(claim)
+    incorrect_norm = normalize_claim(incorrect_text)
+    if not claim_norm or not incorrect_norm:
+        return False
+    if incorrect_norm in claim_norm or claim_norm in incorrect_norm:
+        return True
+    return SequenceMatcher(None, claim_norm, incorrect_norm).ratio() >= MATCH_THRESHOLD
+
+
+def _locate_in_claim(claim: str, incorrect_text: str) -> str:
+    """Return the span of the current claim matching a stored incorrect_text, so highlighting still works."""
+    index = claim.lower().find(incorrect_text.lower())
+    if index >= 0:
+        return claim[index:index + len(incorrect_text)]
+    return claim
+
+
+class ClaimStore:
+    """
+    Persistent claim -> (verdict, correction) store with an in-memory LRU front.
+
+    SQLite reads and writes happen under their own lock so in-memory lookups never wait
+    behind disk I/O; async callers should run lookup and store in a thread when the store
+    is persistent.
+    """
+
+    def __init__(self, db_path: Optional[str] = CLAIM_DB_PATH, ttl_seconds: float = CLAIM_CACHE_TTL, max_entries: int = CLAIM_CACHE_SIZE):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._verdicts: "OrderedDict[str, Tuple[ClaimVerdict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stored": 0, "evictions": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS claim_verdicts ("
+                "key TEXT PRIMARY KEY, verdict TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"Claim verdicts persisted to {db_path}")
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def _is_expired(self, updated_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - updated_at > self.ttl_seconds
+
+    def _remember(self, key: str, entry: Tuple[ClaimVerdict, float]) -> None:
+        # Caller must hold the lock
+        self._verdicts[key] = entry
+        self._verdicts.move_to_end(key)
+        while len(self._verdicts) > self.max_entries:
+            self._verdicts.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def lookup(self, claims: List[str], scope: str = "") -> Dict[str, ClaimVerdict]:
+        """Return cached verdicts from scope (see verdict_scope) keyed by claim_key for the claims that have one."""
+        found: Dict[str, ClaimVerdict] = {}
+        entries: Dict[str, Optional[Tuple[ClaimVerdict, float]]] = {}
+        with self._lock:
+            for claim in claims:
+                key = _verdict_key(claim, scope)
+                entry = self._verdicts.get(key)
+                if entry is not None:
+                    self._verdicts.move_to_end(key)
+                entries[key] = entry
+
+        unseen = [key for key, entry in entries.items() if entry is None]
+        if unseen and self._db is not None:
+            with self._db_lock:
+                rows = [
+                    (key, self._db.execute(
+                        "SELECT verdict, updated_at FROM claim_verdicts WHERE key = ?", (key,)
+                    ).fetchone())
+                    for key in unseen
+                ]
+            with self._lock:
+                for key, row in rows:
+                    if row is not None:
+                        entries[key] = (ClaimVerdict(**json.loads(row[0])), row[1])
+                        self._remember(key, entries[key])
+
+        with self._lock:
+            for claim in claims:
+                entry = entries[_verdict_key(claim, scope)]
+                if entry is not None and not self._is_expired(entry[1]):
+                    found[claim_key(claim)] = entry[0]
+                    self._counters["hits"] += 1
+                else:
+                    self._counters["misses"] += 1
+        return found
+
+    def store(self, verdicts: List[ClaimVerdict], scope: str = "") -> None:
+        """Persist freshly judged claims under scope."""
+        updated_at = time.time()
+        with self._lock:
+            for verdict in verdicts:
+                self._remember(_verdict_key(verdict.claim, scope), (verdict, updated_at))
+            self._counters["stored"] += len(verdicts)
+        if self._db is not None and verdicts:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO claim_verdicts (key, verdict, updated_at) VALUES (?, ?, ?)",
+                    [(_verdict_key(verdict.claim, scope), verdict.model_dump_json(), updated_at) for verdict in verdicts]
+                )
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, "size": len(self._verdicts), "max_entries": self.max_entries, "persistent": self._db is not None}
+
+
+def plan_claim_validation(query: str, store: ClaimStore, scope: str = "") -> Optional[ClaimPlan]:
+    """
+    Extract claims from the query and split them into cached and unseen ones.
+
+    Args:
+        query (str): The full validation query
+        store (ClaimStore): Verdict store to consult
+        scope (str): Model and instructions the verdicts must come from, see verdict_scope()
+
+    Returns:
+        Optional[ClaimPlan]: None when no claims could be extracted and the full query should be used
+    """
+    claims = extract_claims(query)
+    if not claims:
+        return None
+
+    cached = store.lookup(claims, scope)
+    missing = [claim for claim in claims if claim_key(claim) not in cached]
+    cached_claims = [claim for claim in claims if claim_key(claim) in cached]
+
+    # Only sentences with a known verdict are taken out; metadata and all other text reach the model as sent
+    if CONTENT_MARKER in query:
+        header, content = query.split(CONTENT_MARKER, 1)
+        llm_query = f"{header}{CONTENT_MARKER}{_remove_claims(content, cached_claims)}"
+    else:
+        llm_query = _remove_claims(query, cached_claims)
+
+    logger.info(f"Claim cache: {len(claims)} claims, {len(cached)} cached, {len(missing)} sent to the LLM")
+    return ClaimPlan(scope=scope, claims=claims, cached=cached, missing=missing, llm_query=llm_query)
+
+
+def cached_validation_results(plan: ClaimPlan) -> List[Dict[str, str]]:
+    """Return validation items for the plan's cached incorrect claims, in page order."""
+    results: List[Dict[str, str]] = []
+    seen = set()
+    for claim in plan.claims:
+        verdict = plan.cached.get(claim_key(claim))
+        if verdict is None or verdict.verdict != "incorrect":
+            continue
+        incorrect_text = _locate_in_claim(claim, verdict.incorrect_text or verdict.claim)
+        if normalize_claim(incorrect_text) in seen:
+            continue
+        seen.add(normalize_claim(incorrect_text))
+        results.append({"incorrect_text": incorrect_text, "correct_text": verdict.correct_text})
+    return results
+
+
+def complete_claim_validation(plan: ClaimPlan, llm_response: Optional[str], store: ClaimStore, store_verdicts: bool = True,
+                              store_correct: bool = True) -> str:
+    """
+    Merge cached verdicts with the LLM's verdicts for unseen claims.
+
+    A claim the model did not flag is only remembered as correct when the model saw the
+    whole page and its response was parsed in full; otherwise only flagged claims are stored.
+
+    Args:
+        plan (ClaimPlan): Plan produced by plan_claim_validation
+        llm_response (str, optional): JSON response for plan.llm_query, or None when every claim was cached
+        store (ClaimStore): Verdict store that receives the fresh verdicts
+        store_verdicts (bool): False when the LLM call failed or returned a partial result
+        store_correct (bool): False when the page content was trimmed from the prompt
+
+    Returns:
+        str: Response JSON in the usual summary/validation_results schema
+    """
+    summary = None
+    fresh_results: List[Dict[str, str]] = []
+    if llm_response is not None:
+        parsed = parse_validation_response(llm_response)
+        if parsed is None:
+            # Unparseable output cannot be merged; hand it back untouched for the caller's fallback
+            logger.warning("Claim cache: LLM response is not valid JSON, skipping merge")
+            return llm_response
+        summary = parsed.summary
+        fresh_results = [item.model_dump() for item in parsed.validation_results]
+        store_verdicts = store_verdicts and not parsed.partial
+
+    if store_verdicts and llm_response is not None:
+        fresh_verdicts = []
+        for claim in plan.missing:
+            match = next((item for item in fresh_results if _is_match(claim, item.get("incorrect_text", ""))), None)
+            if match is not None:
+                fresh_verdicts.append(ClaimVerdict(
+                    claim=claim,
+                    verdict="incorrect",
+                    incorrect_text=match.get("incorrect_text", ""),
+                    correct_text=match.get("correct_text", "")
+                ))
+            elif store_correct:
+                fresh_verdicts.append(ClaimVerdict(claim=claim, verdict="correct"))
+        store.store(fresh_verdicts, plan.scope)
+
+    validation_results = list(fresh_results)
+    seen = {normalize_claim(item.get("incorrect_text", "")) for item in fresh_results}
+    for item in cached_validation_results(plan):
+        if normalize_claim(item["incorrect_text"]) not in seen:
+            validation_results.append(item)
+
+    if summary is None:
+        corrections = len(validation_results)
+        summary = (
+            f"All {len(plan.claims)} statements on this page were checked previously. "
+            f"Inaccurate medical information was found in {corrections} of them." if corrections
+            else f"All {len(plan.claims)} statements on this page were checked previously and no inaccuracies were found."
+        )
+
+    return json.dumps({"summary": summary, "validation_results": validation_results})
+
+
+_claim_store: Optional[ClaimStore] = None
+_claim_store_lock = threading.Lock()
+
+
+def get_claim_store() -> ClaimStore:
+    """Return the process-wide claim verdict store, building it on first use."""
+    global _claim_store
+    with _claim_store_lock:
+        if _claim_store is None:
+            _claim_store = ClaimStore()
+        return _claim_store
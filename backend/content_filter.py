@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from prompt_builder import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Content filter configuration
+CONTENT_FILTER_ENABLED = os.getenv("MEDICHECK_CONTENT_FILTER", "1") == "1"
+# Sentences scoring below this are not forwarded to the LLM; at 1 every sentence with a health term is kept
+CLAIM_MIN_SCORE = int(os.getenv("MEDICHECK_CLAIM_MIN_SCORE", "1"))
+
+# Lines shorter than this without sentence punctuation are treated as navigation, headings or buttons
+MIN_SENTENCE_WORDS = 5
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+_WORD = re.compile(r"[a-z0-9%]+(?:['-][a-z0-9]+)*")
+
+# Lines that are page furniture rather than article text
+_BOILERPLATE = re.compile(
+    r"cookie|accept all|privacy policy|terms of (use|service)|all rights reserved|©|copyright \d{4}"
+    r"|subscribe|newsletter|sign (in|up)|log ?in|create an account|follow us|share (this|on)"
+    r"|advertisement|sponsored|skip to (main )?content|read more|related (articles|stories)"
+    r"|^(reply|report|like|share|menu|search|home|next|previous|back to top)$"
+    r"|^\d+\s+(comments?|replies|likes|shares)$|\b\d+\s+(minutes?|hours?|days?) ago$",
+    re.IGNORECASE
+)
+
+# Word prefixes that mark a sentence as being about health or medicine
+_MEDICAL_PREFIXES = (
+    "abdom", "acne", "addict", "adhd", "alcohol", "allerg", "alzheimer", "anemi", "anesthe", "antibiot",
+    "antibod", "antioxid", "anxiet", "arter", "arthrit", "asthma", "autis", "autoimmun", "bacteri", "bald",
+    "blood", "body", "bodies", "bone", "brain", "breast", "calor", "cancer", "carb", "cardi", "cell", "chemo",
+    "cholester", "chronic", "clinic", "cold", "cough", "covid", "cure", "dementia", "dental", "depress",
+    "detox", "diabet", "diagnos", "diarrh", "diet", "digest", "disease", "disorder", "doctor", "dose",
+    "dosage", "drink", "drug", "eat", "epidem", "eye", "fatigue", "fever", "flu", "food", "gene",
+    "germ", "gluten", "gut", "hair", "headache", "health", "hearing", "heart", "hepat", "herb", "hiv",
+    "hormon", "hospital", "hydrat", "hyperactiv", "hypert", "illness", "immun", "infect", "inflamm",
+    "injur", "insulin", "joint", "kidney", "knuckl", "liver", "lung", "measles", "medic", "memory", "mental",
+    "metabol", "microb", "migraine", "muscle", "nutri", "obes", "organ", "overdose", "pain", "pandem",
+    "patholog", "patient", "pharm", "placebo", "pregnan", "prescri", "probiot", "protein", "psychiat",
+    "remed", "sars", "sick", "sight", "sleep", "skin", "smok", "sodium", "stomach", "stroke", "sugar",
+    "supplement", "surg", "symptom", "syndrome", "teeth", "therap", "tissue", "tooth", "toxi", "transplant",
+    "treat", "tumor", "tumour", "vaccin", "vaping", "virus", "viral", "vision", "vitamin", "weight",
+    "wellness", "wound"
+)
+_MEDICAL_WORD = re.compile(r"^(" + "|".join(_MEDICAL_PREFIXES) + r")")
+
+# Words that turn a statement about health into a checkable claim
+_CLAIM_CUES = frozenset(
+    "cause causes caused causing prevent prevents prevented cure cures cured reduce reduces reduced "
+    "increase increases increased boost boosts risk risks linked link proven prove proves shown shows "
+    "study studies research evidence effective ineffective safe unsafe dangerous harmful harmless "
+    "always never only all every most killed kills kill leads lead protects protect improves improve "
+    "heals heal eliminates eliminate recommended contains".split()
+)
+_NUMBER = re.compile(r"\d")
+
+# Well-known health myths; every one must survive reduce() or it would never be validated
+KNOWN_MYTHS = (
+    "Drinking eight glasses of water a day is a scientific requirement for maintaining good health.",
+    "Eating carrots will give you perfect night vision.",
+    "Cracking your knuckles causes arthritis.",
+    "Sugar makes children hyperactive.",
+    "You lose most of your body heat through your head.",
+    "Shaving makes hair grow back thicker and darker.",
+    "Reading in dim light ruins your eyesight.",
+    "Going out in cold weather gives you a cold.",
+    "Feed a cold, starve a fever.",
+    "Humans only use 10% of their brain.",
+    "Vaccines cause autism.",
+    "Antibiotics are effective against viral infections like the flu.",
+    "You should wait an hour after eating before swimming.",
+)
+
+
+class ContentReduction(BaseModel):
+    """Outcome of reducing one page's text before it is sent to the LLM."""
+    text: str
+    original_chars: int
+    kept_chars: int
+    removed_chars: int
+    removed_tokens: int
+    boilerplate_lines: int
+    duplicate_lines: int
+    dropped_sentences: int
+    kept_sentences: int
+
+
+def score_sentence(sentence: str) -> int:
+    """
+    Score how likely a sentence is to contain a checkable medical claim.
+
+    Args:
+        sentence (str): One sentence of page text
+
+    Returns:
+        int: 0 for sentences without any medical term, otherwise medical terms plus claim cues
+    """
+    words = _WORD.findall(sentence.lower())
+    medical = sum(1 for word in words if _MEDICAL_WORD.match(word))
+    if not medical:
+        return 0
+    cues = sum(1 for word in words if word in _CLAIM_CUES)
+    if "%" in sentence or _NUMBER.search(sentence):
+        cues += 1
+    return medical + cues
+
+
+class ContentFilter:
+    """
+    Strip boilerplate from scraped page text and keep the sentences likely to hold medical claims.
+
+    Repeated lines and page furniture (cookie banners, menus, share buttons, comment counters)
+    are removed first; the remaining sentences are scored with a local lexicon and only those
+    reaching min_score are kept, in page order and verbatim so highlighting still finds them.
+    With the default min_score of 1 that drops only sentences without any health term, so
+    plain-sounding myths are still validated. If no sentence qualifies, the de-boilerplated
+    text is kept rather than sending nothing.
+    """
+
+    def __init__(self, min_score: int = CLAIM_MIN_SCORE):
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._counters = {"pages": 0, "original_chars": 0, "removed_chars": 0, "removed_tokens": 0}
+
+    def reduce(self, text: str) -> ContentReduction:
+        """
+        Reduce page text to its relevant sentences.
+
+        Args:
+            text (str): Page text as scraped by the extension
+
+        Returns:
+            ContentReduction: The reduced text plus what was removed
+        """
+        seen_lines = set()
+        boilerplate_lines = duplicate_lines = 0
+        cleaned_lines: List[str] = []
+        for line in text.splitlines():
+            line = " ".join(line.split())
+            if not line:
+                continue
+            line_key = line.lower()
+            if line_key in seen_lines:
+                duplicate_lines += 1
+                continue
+            seen_lines.add(line_key)
+            if _BOILERPLATE.search(line) and score_sentence(line) < self.min_score:
+                boilerplate_lines += 1
+                continue
+            cleaned_lines.append(line)
+
+        kept_lines: List[str] = []
+        kept_sentences = dropped_sentences = 0
+        for line in cleaned_lines:
+            kept: List[str] = []
+            for sentence in _SENTENCE_SPLIT.split(line):
+                # Headings and menu items must score higher than full sentences to be kept
+                is_fragment = len(sentence.split()) < MIN_SENTENCE_WORDS and not sentence.rstrip().endswith((".", "!", "?"))
+                required = self.min_score + 1 if is_fragment else self.min_score
+                if score_sentence(sentence) >= required:
+                    kept.append(sentence)
+                else:
+                    dropped_sentences += 1
+            if kept:
+                kept_sentences += len(kept)
+                kept_lines.append(" ".join(kept))
+
+        reduced = "\n".join(kept_lines if kept_lines else cleaned_lines)
+        removed_chars = max(0, len(text) - len(reduced))
+        reduction = ContentReduction(
+            text=reduced,
+            original_chars=len(text),
+            kept_chars=len(reduced),
+            removed_chars=removed_chars,
+            removed_tokens=max(0, count_tokens(text) - count_tokens(reduced)),
+            boilerplate_lines=boilerplate_lines,
+            duplicate_lines=duplicate_lines,
+            dropped_sentences=dropped_sentences if kept_lines else 0,
+            kept_sentences=kept_sentences,
+        )
+
+        with self._lock:
+            self._counters["pages"] += 1
+            self._counters["original_chars"] += reduction.original_chars
+            self._counters["removed_chars"] += reduction.removed_chars
+            self._counters["removed_tokens"] += reduction.removed_tokens
+        return reduction
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            original = self._counters["original_chars"]
+            return {
+                **self._counters,
+                "removed_ratio": round(self._counters["removed_chars"] / original, 4) if original else 0.0,
+            }
+
+
+_content_filter: Optional[ContentFilter] = None
+_content_filter_lock = threading.Lock()
+
+
+def get_content_filter() -> ContentFilter:
+    """Return the process-wide content filter, creating it on first use."""
+    global _content_filter
+    with _content_filter_lock:
+        if _content_filter is None:
+            _content_filter = ContentFilter()
+        return _content_filter
+
+
+def check_known_myths(content_filter: Optional[ContentFilter] = None) -> List[str]:
+    """Return the KNOWN_MYTHS a filter would drop; empty when all of them reach the LLM."""
+    content_filter = content_filter or ContentFilter()
+    # Surround each myth with page furniture, as scraped pages do
+    page = "\n".join(["Skip to main content", "Menu", *KNOWN_MYTHS, "Subscribe to our newsletter"])
+    kept = content_filter.reduce(page).text
+    return [myth for myth in KNOWN_MYTHS if myth not in kept]
+
+
+# Check that known myths survive the filter at the configured threshold: python content_filter.py
+if __name__ == "__main__":
+    dropped = check_known_myths()
+    for myth in dropped:
+        print(f"Dropped: {myth}")
+    print(f"{len(KNOWN_MYTHS) - len(dropped)} of {len(KNOWN_MYTHS)} known myths kept")
+    sys.exit(1 if dropped else 0)
@@ -0,0 +1,246 @@
+import io
+import os
+import json
+import zlib
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import zstandard
+
+from metrics import REQUEST_BODY_BYTES
+from state_store import shared_db_path
+from validation_cache import CACHE_TTL_SECONDS, ValidationCache, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Upload and response compression configuration
+MAX_UPLOAD_BYTES = int(os.getenv("MEDICHECK_MAX_UPLOAD_BYTES", str(8 * 1024 * 1024)))
+GZIP_MIN_BYTES = int(os.getenv("MEDICHECK_GZIP_MIN_BYTES", "1000"))
+GZIP_LEVEL = int(os.getenv("MEDICHECK_GZIP_LEVEL", "6"))
+# Whole-page results kept for hash-first requests; the optional SQLite table defaults to the
+# shared state file when MEDICHECK_STATE_BACKEND=sqlite
+CONTENT_HASH_MAX_ENTRIES = int(os.getenv("MEDICHECK_CONTENT_HASH_SIZE", "10000"))
+CONTENT_HASH_DB_PATH = os.getenv("MEDICHECK_CONTENT_HASH_DB") or shared_db_path()
+
+SUPPORTED_ENCODINGS = ("gzip", "zstd")
+
+# Metadata fields format_content() puts in the validation prompt, in hash order
+PROMPT_METADATA_FIELDS = ("description", "keywords", "author", "ogTitle", "ogDescription")
+
+# Paths whose request bodies may arrive compressed
+COMPRESSED_PATHS = ("/summarize",)
+
+
+def content_hash(content: Dict[str, Any]) -> str:
+    """
+    Hash that identifies scraped page content for hash-first /summarize requests.
+
+    It covers every uploaded field that reaches the validation prompt, so pages that
+    differ only in metadata get different hashes. Clients compute the same value as the
+    SHA-256 hex digest of the UTF-8 JSON array [url, title, description, keywords, author,
+    ogTitle, ogDescription, text] as JSON.stringify writes it: no whitespace, and null
+    for a missing field (a missing field and an empty one give different prompts).
+    """
+    metadata = content.get("metadata") or {}
+    fields = [content.get("url"), content.get("title")] + [metadata.get(name) for name in PROMPT_METADATA_FIELDS] + [content.get("text")]
+    payload = json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class UploadError(Exception):
+    """Raised when a compressed request body cannot be accepted."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def decompress_body(body: bytes, encoding: str, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Decode a request body sent with Content-Encoding, refusing anything that inflates past max_bytes.
+
+    Args:
+        body (bytes): Body as received
+        encoding (str): Content-Encoding header value
+        max_bytes (int): Largest decoded body accepted
+
+    Returns:
+        bytes: The decoded body
+
+    Raises:
+        UploadError: 415 for an unsupported encoding, 413 when too large, 400 when the body is corrupt
+    """
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        decoded = body
+    elif encoding not in SUPPORTED_ENCODINGS:
+        raise UploadError(415, f"Unsupported Content-Encoding '{encoding}'; use one of: {', '.join(SUPPORTED_ENCODINGS)}")
+    else:
+        try:
+            if encoding == "gzip":
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                decoded = decompressor.decompress(body, max_bytes + 1)
+            else:
+                with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)) as reader:
+                    chunks = []
+                    size = 0
+                    while size <= max_bytes:
+                        chunk = reader.read(min(max_bytes + 1 - size, 1024 * 1024))
+                        if not chunk:
+                            break
+                        chunks.append(chunk)
+                        size += len(chunk)
+                    decoded = b"".join(chunks)
+        except (zlib.error, ValueError, zstandard.ZstdError) as e:
+            raise UploadError(400, f"Could not decode {encoding} request body: {str(e)}")
+    if len(decoded) > max_bytes:
+        raise UploadError(413, f"Request body exceeds {max_bytes} bytes once decoded")
+    return decoded
+
+
+class RequestDecompressionMiddleware:
+    """
+    ASGI middleware that decodes gzip or zstd request bodies before FastAPI parses them.
+
+    The body is read in full (capped at max_bytes on the wire as well), decoded, and
+    replayed to the app without the Content-Encoding header. Errors are answered
+    directly with 400, 413 or 415; a 415 lists the supported encodings in Accept-Encoding.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES, paths: tuple = COMPRESSED_PATHS):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = headers.get(b"content-encoding", b"").decode("latin-1").strip().lower()
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            body = bytearray()
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.extend(message.get("body", b""))
+                more_body = message.get("more_body", False)
+                if len(body) > self.max_bytes:
+                    raise UploadError(413, f"Request body exceeds {self.max_bytes} bytes")
+            decoded = decompress_body(bytes(body), encoding, self.max_bytes)
+        except UploadError as e:
+            logger.warning(f"Rejected {encoding} upload to {scope['path']}: {e.detail}")
+            await self._reject(send, e)
+            return
+
+        REQUEST_BODY_BYTES.inc(len(body), encoding=encoding, stage="received")
+        REQUEST_BODY_BYTES.inc(len(decoded), encoding=encoding, stage="decoded")
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"] if name not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(decoded)).encode("latin-1"))]
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": decoded, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+    @staticmethod
+    async def _reject(send, error: UploadError) -> None:
+        body = json.dumps({"detail": error.detail}).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("latin-1"))]
+        if error.status_code == 415:
+            headers.append((b"accept-encoding", ", ".join(SUPPORTED_ENCODINGS).encode("latin-1")))
+        await send({"type": "http.response.start", "status": error.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+class ContentHashIndex:
+    """
+    Validation results for whole pages, looked up by content hash.
+
+    Entries live in their own two-tier cache (an LRU of max_entries pages plus, optionally,
+    a content_hashes table in the shared SQLite file), so per-query validations cannot
+    evict them. Keys also cover the model and instructions, and entries share the
+    validation cache TTL. Each entry keeps the page title and URL so a hit can still be
+    recorded in the session's chat memory.
+    """
+
+    def __init__(self, max_entries: int = CONTENT_HASH_MAX_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS, db_path: Optional[str] = CONTENT_HASH_DB_PATH):
+        self.cache = ValidationCache(max_entries=max_entries, ttl_seconds=ttl_seconds, db_path=db_path, table="content_hashes")
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "hits": 0, "misses": 0, "stored": 0}
+
+    @staticmethod
+    def _key(digest: str, instructions: str, model: str) -> str:
+        return make_cache_key(f"content-hash:{digest.lower()}", instructions, model)
+
+    def _count_lookup(self, value: Optional[str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._counters["lookups"] += 1
+            self._counters["hits" if value is not None else "misses"] += 1
+        return json.loads(value) if value is not None else None
+
+    @staticmethod
+    def _entry(content: Dict[str, Any], result: Dict[str, Any]) -> str:
+        return json.dumps({"title": content.get("title", "No title"), "url": content.get("url", "No URL"), "result": result})
+
+    def get(self, digest: str, instructions: str, model: str) -> Optional[Dict[str, Any]]:
+        """Return {"title", "url", "result"} stored for digest, or None."""
+        return self._count_lookup(self.cache.get(self._key(digest, instructions, model)))
+
+    async def aget(self, digest: str, instructions: str, model: str) -> Optional[Dict[str, Any]]:
+        """Async get(); a lookup that reaches SQLite runs in a thread."""
+        return self._count_lookup(await self.cache.aget(self._key(digest, instructions, model)))
+
+    def put(self, digest: str, instructions: str, model: str, content: Dict[str, Any], result: Dict[str, Any]) -> None:
+        self.cache.set(self._key(digest, instructions, model), self._entry(content, result))
+        with self._lock:
+            self._counters["stored"] += 1
+
+    async def aput(self, digest: str, instructions: str, model: str, content: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Async put(); the SQLite write runs in a thread."""
+        await self.cache.aset(self._key(digest, instructions, model), self._entry(content, result))
+        with self._lock:
+            self._counters["stored"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        cache = self.cache.stats()
+        with self._lock:
+            lookups = self._counters["lookups"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "size": cache["size"],
+                "max_entries": cache["max_entries"],
+                "persistent": cache["persistent"],
+                "upload_encodings": list(SUPPORTED_ENCODINGS),
+            }
+
+
+_content_hash_index: Optional[ContentHashIndex] = None
+_content_hash_index_lock = threading.Lock()
+
+
+def get_content_hash_index() -> ContentHashIndex:
+    """Return the process-wide content hash index, creating it on first use."""
+    global _content_hash_index
+    with _content_hash_index_lock:
+        if _content_hash_index is None:
+            _content_hash_index = ContentHashIndex()
+        return _content_hash_index
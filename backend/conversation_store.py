@@ -0,0 +1,403 @@
+import os
+import time
+import json
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from state_store import connect_state_db, shared_db_path, write_transaction
+
+logger = logging.getLogger(__name__)
+
+# Conversation store configuration
+MAX_ENTRIES_PER_SESSION = int(os.getenv("MEDICHECK_SESSION_MAX_ENTRIES", "15"))
+MAX_TOKENS_PER_SESSION = int(os.getenv("MEDICHECK_SESSION_MAX_TOKENS", "6000"))
+MAX_SESSIONS = int(os.getenv("MEDICHECK_MAX_SESSIONS", "1000"))
+SESSION_IDLE_TTL = float(os.getenv("MEDICHECK_SESSION_TTL", str(60 * 60)))
+# Cap on characters held across all sessions, so memory stays bounded under heavy traffic
+MAX_TOTAL_CHARS = int(os.getenv("MEDICHECK_CONVERSATION_MAX_CHARS", str(20_000_000)))
+# Token budget for the rolling summary of turns that fell out of the window
+MAX_SUMMARY_TOKENS = int(os.getenv("MEDICHECK_SESSION_SUMMARY_TOKENS", "500"))
+# Token budget for the history part of a /chat prompt
+CHAT_PROMPT_TOKENS = int(os.getenv("MEDICHECK_CHAT_PROMPT_TOKENS", "3000"))
+
+# Limits applied when condensing text for the digest and the rolling summary
+SUMMARY_LINE_CHARS = 200
+DIGEST_SUMMARY_CHARS = 600
+DIGEST_MAX_CORRECTIONS = 10
+DIGEST_CORRECTION_CHARS = 160
+SUMMARY_HEADING = "Summary of earlier conversation:"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token) that needs no tokenizer."""
+    return len(text) // 4 + 1
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def build_validation_digest(title: str, url: str, result: Dict[str, Any]) -> str:
+    """
+    Condense a validation into the few facts chat needs: page, summary and corrections.
+
+    Args:
+        title (str): Page title
+        url (str): Page URL
+        result (Dict[str, Any]): Validation response in the summary/validation_results schema
+
+    Returns:
+        str: A compact digest, typically a few hundred characters
+    """
+    lines = [f"Validated page \"{_shorten(title, 120)}\" ({url})"]
+    summary = result.get("summary") if isinstance(result, dict) else None
+    if summary:
+        lines.append(f"Summary: {_shorten(summary, DIGEST_SUMMARY_CHARS)}")
+
+    corrections = [item for item in (result.get("validation_results") or []) if isinstance(item, dict)] if isinstance(result, dict) else []
+    if corrections:
+        lines.append("Corrections:")
+        for item in corrections[:DIGEST_MAX_CORRECTIONS]:
+            lines.append(
+                f"- \"{_shorten(item.get('incorrect_text', ''), DIGEST_CORRECTION_CHARS)}\" -> "
+                f"\"{_shorten(item.get('correct_text', ''), DIGEST_CORRECTION_CHARS)}\""
+            )
+        if len(corrections) > DIGEST_MAX_CORRECTIONS:
+            lines.append(f"- ...and {len(corrections) - DIGEST_MAX_CORRECTIONS} more")
+    else:
+        lines.append("Corrections: none, no inaccurate medical claims were found.")
+    return "\n".join(lines)
+
+
+class _Session:
+    __slots__ = ("entries", "tokens", "chars", "summary_lines", "summary_tokens", "last_seen")
+
+    def __init__(self):
+        # (role, message) tuples, oldest first
+        self.entries: Deque[Tuple[str, str]] = deque()
+        self.tokens = 0
+        # Characters held by entries and the rolling summary together
+        self.chars = 0
+        # One condensed line per turn that fell out of the window, oldest first
+        self.summary_lines: Deque[str] = deque()
+        self.summary_tokens = 0
+        self.last_seen = time.monotonic()
+
+
+class ConversationStore:
+    """
+    Session-keyed, bounded conversation history.
+
+    Each session keeps at most max_entries entries and max_tokens estimated tokens. Entries
+    pushed out of that window are condensed into a rolling summary bounded by
+    max_summary_tokens, so older context survives in compact form. Sessions are kept in LRU order; idle sessions expire after
+    idle_ttl seconds, and least recently used sessions are evicted when the session count
+    or the total character budget is exceeded.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES_PER_SESSION, max_tokens: int = MAX_TOKENS_PER_SESSION,
+                 max_sessions: int = MAX_SESSIONS, idle_ttl: float = SESSION_IDLE_TTL, max_total_chars: int = MAX_TOTAL_CHARS,
+                 max_summary_tokens: int = MAX_SUMMARY_TOKENS):
+        self.max_entries = max(1, max_entries)
+        self.max_tokens = max(1, max_tokens)
+        self.max_summary_tokens = max_summary_tokens
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl = idle_ttl
+        self.max_total_chars = max_total_chars
+
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._total_chars = 0
+        self._evicted_sessions = 0
+        self._lock = threading.Lock()
+
+    def _touch(self, session_id: str, create: bool) -> Optional[_Session]:
+        # Caller must hold the lock
+        self._expire_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = _Session()
+            self._sessions[session_id] = session
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _expire_idle(self) -> None:
+        # Sessions are in last-access order, so expired ones are all at the front
+        if self.idle_ttl <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_seen >= cutoff:
+                break
+            self._drop_session(session_id)
+
+    def _drop_session(self, session_id: str, evicted: bool = True) -> None:
+        session = self._sessions.pop(session_id)
+        self._total_chars -= session.chars
+        if evicted:
+            self._evicted_sessions += 1
+
+    def _pop_oldest(self, session: _Session) -> None:
+        role, message = session.entries.popleft()
+        session.tokens -= estimate_tokens(message)
+        session.chars -= len(message)
+        self._fold_into_summary(session, f"{role}: {_shorten(message, SUMMARY_LINE_CHARS)}")
+
+    def _fold_into_summary(self, session: _Session, line: str) -> None:
+        if self.max_summary_tokens <= 0:
+            return
+        session.summary_lines.append(line)
+        session.summary_tokens += estimate_tokens(line)
+        session.chars += len(line)
+        while session.summary_tokens > self.max_summary_tokens and session.summary_lines:
+            dropped = session.summary_lines.popleft()
+            session.summary_tokens -= estimate_tokens(dropped)
+            session.chars -= len(dropped)
+
+    def _add_entry(self, session: _Session, role: str, message: str) -> None:
+        # Appends to the session and trims it to its window; callers account for the change in session.chars
+        # A single oversized message is cut down so it can never exceed the session budget
+        max_chars = self.max_tokens * 4
+        if len(message) > max_chars:
+            message = message[:max_chars]
+        session.entries.append((role, message))
+        session.tokens += estimate_tokens(message)
+        session.chars += len(message)
+        while len(session.entries) > self.max_entries or (session.tokens > self.max_tokens and len(session.entries) > 1):
+            self._pop_oldest(session)
+
+    def append(self, session_id: str, role: str, message: str) -> None:
+        """Add a message to a session, trimming the session and the store to their limits."""
+        with self._lock:
+            session = self._touch(session_id, create=True)
+            chars_before = session.chars
+            self._add_entry(session, role, message)
+            self._total_chars += session.chars - chars_before
+
+            while len(self._sessions) > self.max_sessions or (self._total_chars > self.max_total_chars and len(self._sessions) > 1):
+                oldest_id = next(iter(self._sessions))
+                logger.info(f"Evicting conversation session {oldest_id}")
+                self._drop_session(oldest_id)
+
+    async def aappend(self, session_id: str, role: str, message: str) -> None:
+        """Async append(); the in-memory store runs it inline."""
+        self.append(session_id, role, message)
+
+    async def abuild_context(self, session_id: str, token_budget: int = CHAT_PROMPT_TOKENS) -> str:
+        """Async build_context(); the in-memory store runs it inline."""
+        return self.build_context(session_id, token_budget)
+
+    def get_history(self, session_id: str) -> List[Tuple[str, str]]:
+        """Return a session's (role, message) entries, oldest first."""
+        snapshot = self._snapshot(session_id)
+        return snapshot[0] if snapshot is not None else []
+
+    def get_summary(self, session_id: str) -> str:
+        """Return the rolling summary of turns that fell out of a session's window."""
+        snapshot = self._snapshot(session_id)
+        return "\n".join(snapshot[1]) if snapshot is not None else ""
+
+    def _snapshot(self, session_id: str) -> Optional[Tuple[List[Tuple[str, str]], List[str]]]:
+        # A session's entries and summary lines read together, or None if there is no such session
+        with self._lock:
+            session = self._touch(session_id, create=False)
+            if session is None:
+                return None
+            return list(session.entries), list(session.summary_lines)
+
+    def build_context(self, session_id: str, token_budget: int = CHAT_PROMPT_TOKENS) -> str:
+        """
+        Format a session's history as a conversation transcript for the chat prompt.
+
+        The rolling summary comes first, followed by the most recent entries. Every line is
+        costed, separators and the summary heading included, before it is added, so the
+        result never exceeds token_budget: older entries are left out first, then the oldest
+        summary lines, and the latest turn is shortened if it does not fit on its own.
+
+        Args:
+            session_id (str): Conversation session
+            token_budget (int): Maximum estimated tokens for the returned context
+
+        Returns:
+            str: Transcript ready to prepend to the chat prompt
+        """
+        snapshot = self._snapshot(session_id)
+        if snapshot is None or token_budget <= 0:
+            return ""
+        entries, summary_lines = snapshot
+
+        # Each line is costed with its newline; the per-line estimates add up to at least the whole text's
+        recent: List[str] = []
+        used = 0
+        for role, message in reversed(entries):
+            line = f"{role}: {message}"
+            if not recent and len(line) > token_budget * 4 - 2:
+                # The latest turn is what the reply answers, so it is cut to fit rather than dropped
+                line = line[:max(0, token_budget * 4 - 5)] + "..."
+            cost = estimate_tokens(line + "\n")
+            if used + cost > token_budget:
+                break
+            recent.append(line)
+            used += cost
+        recent.reverse()
+
+        # Whatever budget remains goes to the newest part of the rolling summary
+        summary: List[str] = []
+        header_cost = estimate_tokens(SUMMARY_HEADING + "\n")
+        for line in reversed(summary_lines):
+            cost = estimate_tokens(line + "\n") + (0 if summary else header_cost)
+            if used + cost > token_budget:
+                break
+            summary.append(line)
+            used += cost
+        summary.reverse()
+
+        parts = []
+        if summary:
+            parts.append(SUMMARY_HEADING + "\n" + "\n".join(summary))
+        parts.extend(recent)
+        return "\n".join(parts)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop_session(session_id, evicted=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "entries": sum(len(s.entries) for s in self._sessions.values()),
+                "summary_lines": sum(len(s.summary_lines) for s in self._sessions.values()),
+                "total_chars": self._total_chars,
+                "evicted_sessions": self._evicted_sessions,
+                "shared": False,
+            }
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    ConversationStore kept in a SQLite file, so every worker process on the host sees the same sessions.
+
+    Limits, eviction and the rolling summary behave as in ConversationStore. Each session is
+    one row; appends read, trim and write it back inside a single write transaction, so two
+    workers appending to the same session cannot lose each other's turns. Idle time counts
+    from a session's last append. The async methods run in a thread, so a worker waiting on
+    another worker's write lock does not stall its event loop.
+    """
+
+    def __init__(self, db_path: str, **limits: Any):
+        super().__init__(**limits)
+        self.db_path = db_path
+        self._db = connect_state_db(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, entries INTEGER NOT NULL, "
+            "summary_lines INTEGER NOT NULL, chars INTEGER NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversation_sessions_last_seen ON conversation_sessions (last_seen)")
+        logger.info(f"Conversation history shared through {db_path}")
+
+    @staticmethod
+    def _load(data: str) -> _Session:
+        fields = json.loads(data)
+        session = _Session()
+        session.entries = deque(tuple(entry) for entry in fields["entries"])
+        session.tokens = fields["tokens"]
+        session.chars = fields["chars"]
+        session.summary_lines = deque(fields["summary_lines"])
+        session.summary_tokens = fields["summary_tokens"]
+        return session
+
+    @staticmethod
+    def _dump(session: _Session) -> str:
+        return json.dumps({
+            "entries": list(session.entries),
+            "tokens": session.tokens,
+            "chars": session.chars,
+            "summary_lines": list(session.summary_lines),
+            "summary_tokens": session.summary_tokens,
+        })
+
+    def _expire_idle_rows(self) -> None:
+        # Caller must hold the lock inside a write transaction
+        if self.idle_ttl <= 0:
+            return
+        expired = self._db.execute("DELETE FROM conversation_sessions WHERE last_seen < ?", (time.time() - self.idle_ttl,)).rowcount
+        self._evicted_sessions += max(0, expired)
+
+    def append(self, session_id: str, role: str, message: str) -> None:
+        """Add a message to a session, trimming the session and the store to their limits."""
+        with self._lock, write_transaction(self._db):
+            self._expire_idle_rows()
+            row = self._db.execute("SELECT data FROM conversation_sessions WHERE session_id = ?", (session_id,)).fetchone()
+            session = self._load(row[0]) if row is not None else _Session()
+            self._add_entry(session, role, message)
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversation_sessions (session_id, data, entries, summary_lines, chars, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, self._dump(session), len(session.entries), len(session.summary_lines), session.chars, time.time())
+            )
+
+            sessions, total_chars = self._db.execute("SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM conversation_sessions").fetchone()
+            while sessions > self.max_sessions or (total_chars > self.max_total_chars and sessions > 1):
+                oldest_id, oldest_chars = self._db.execute(
+                    "SELECT session_id, chars FROM conversation_sessions ORDER BY last_seen LIMIT 1"
+                ).fetchone()
+                logger.info(f"Evicting conversation session {oldest_id}")
+                self._db.execute("DELETE FROM conversation_sessions WHERE session_id = ?", (oldest_id,))
+                self._evicted_sessions += 1
+                sessions -= 1
+                total_chars -= oldest_chars
+
+    async def aappend(self, session_id: str, role: str, message: str) -> None:
+        await asyncio.to_thread(self.append, session_id, role, message)
+
+    async def abuild_context(self, session_id: str, token_budget: int = CHAT_PROMPT_TOKENS) -> str:
+        return await asyncio.to_thread(self.build_context, session_id, token_budget)
+
+    def _snapshot(self, session_id: str) -> Optional[Tuple[List[Tuple[str, str]], List[str]]]:
+        cutoff = time.time() - self.idle_ttl if self.idle_ttl > 0 else float("-inf")
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM conversation_sessions WHERE session_id = ? AND last_seen >= ?", (session_id, cutoff)
+            ).fetchone()
+        if row is None:
+            return None
+        session = self._load(row[0])
+        return list(session.entries), list(session.summary_lines)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM conversation_sessions WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions, entries, summary_lines, total_chars = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(entries), 0), COALESCE(SUM(summary_lines), 0), COALESCE(SUM(chars), 0) "
+                "FROM conversation_sessions"
+            ).fetchone()
+            return {
+                "sessions": sessions,
+                "entries": entries,
+                "summary_lines": summary_lines,
+                "total_chars": total_chars,
+                # Counted by this worker only; the other figures cover every worker
+                "evicted_sessions": self._evicted_sessions,
+                "shared": True,
+            }
+
+
+def create_conversation_store() -> ConversationStore:
+    """Build the conversation store for the configured state backend (MEDICHECK_STATE_BACKEND)."""
+    db_path = shared_db_path()
+    if db_path is None:
+        return ConversationStore()
+    return SQLiteConversationStore(db_path)
@@ -0,0 +1,133 @@
+import os
+import re
+import time
+import json
+import random
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+logger = logging.getLogger(__name__)
+
+# LLM backend selection: "gemini" (default) or "stub" for offline load testing and profiling
+LLM_BACKEND = os.getenv("MEDICHECK_LLM_BACKEND", "gemini").lower()
+
+# Stub backend behaviour. Latency is log-normal around the median; a sigma of 0 makes it fixed.
+STUB_LATENCY_MS = float(os.getenv("MEDICHECK_STUB_LATENCY_MS", "800"))
+STUB_LATENCY_SIGMA = float(os.getenv("MEDICHECK_STUB_LATENCY_SIGMA", "0.3"))
+# Number of corrections per response is drawn uniformly from 0..STUB_MAX_ITEMS
+STUB_MAX_ITEMS = int(os.getenv("MEDICHECK_STUB_MAX_ITEMS", "3"))
+# Length of each correction and of the summary is drawn uniformly from this range of characters
+STUB_MIN_CHARS = int(os.getenv("MEDICHECK_STUB_MIN_CHARS", "80"))
+STUB_MAX_CHARS = int(os.getenv("MEDICHECK_STUB_MAX_CHARS", "400"))
+STUB_SEED = os.getenv("MEDICHECK_STUB_SEED", "medicheck")
+
+# Characters per streamed chunk
+STUB_STREAM_CHUNK_CHARS = 24
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_FILLER = (
+    "Current evidence from reliable medical sources does not support this statement. "
+    "Consult peer-reviewed research and public health guidance for accurate information. "
+)
+
+
+class StubLLM:
+    """
+    Deterministic stand-in for a chat model that needs no network or API key.
+
+    The same prompt always produces the same output and latency. Synthesis prompts get a
+    schema-valid JSON result whose corrections quote sentences from the page content, so
+    highlighting and the claim cache behave as they would with a real model; any other
+    prompt gets a short plain-text reply.
+    """
+
+    def __init__(self, model: str = "stub", latency_ms: float = STUB_LATENCY_MS, latency_sigma: float = STUB_LATENCY_SIGMA,
+                 max_items: int = STUB_MAX_ITEMS, min_chars: int = STUB_MIN_CHARS, max_chars: int = STUB_MAX_CHARS,
+                 seed: str = STUB_SEED):
+        self.model = model
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.max_items = max_items
+        self.min_chars = min_chars
+        self.max_chars = max(min_chars, max_chars)
+        self.seed = seed
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _latency(self, rng: random.Random) -> float:
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000
+        return rng.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000
+
+    def _text(self, rng: random.Random) -> str:
+        length = rng.randint(self.min_chars, self.max_chars)
+        return (_FILLER * (length // len(_FILLER) + 1))[:length].rstrip()
+
+    def _respond(self, prompt: str) -> Tuple[float, str]:
+        rng = self._rng(prompt)
+        latency = self._latency(rng)
+        if "JSON RESPONSE:" not in prompt:
+            return latency, self._text(rng)
+
+        content = prompt.split("Main Content:", 1)[1] if "Main Content:" in prompt else ""
+        content = content.split("CUSTOM INSTRUCTIONS:", 1)[0]
+        sentences = [s.strip() for s in _SENTENCE_SPLIT.split(" ".join(content.split())) if len(s.split()) >= 4]
+        count = min(len(sentences), rng.randint(0, self.max_items))
+        chosen = rng.sample(sentences, count) if count else []
+        result = {
+            "summary": self._text(rng),
+            "validation_results": [{"incorrect_text": sentence, "correct_text": self._text(rng)} for sentence in chosen],
+        }
+        return latency, json.dumps(result)
+
+    def invoke(self, prompt: Any, **kwargs) -> AIMessage:
+        latency, text = self._respond(str(prompt))
+        time.sleep(latency)
+        return AIMessage(content=text)
+
+    async def ainvoke(self, prompt: Any, **kwargs) -> AIMessage:
+        latency, text = self._respond(str(prompt))
+        await asyncio.sleep(latency)
+        return AIMessage(content=text)
+
+    async def astream(self, prompt: Any, **kwargs) -> AsyncIterator[AIMessageChunk]:
+        latency, text = self._respond(str(prompt))
+        chunks: List[str] = [text[i:i + STUB_STREAM_CHUNK_CHARS] for i in range(0, len(text), STUB_STREAM_CHUNK_CHARS)] or [""]
+        # Total latency matches invoke(); the first chunk waits longest, like time to first token
+        await asyncio.sleep(latency / 2)
+        for chunk in chunks:
+            await asyncio.sleep(latency / 2 / len(chunks))
+            yield AIMessageChunk(content=chunk)
+
+
+def create_llm(model: str, temperature: float, backend: Optional[str] = None) -> Any:
+    """
+    Create a chat model client for the configured backend.
+
+    Args:
+        model (str): Model name passed to the provider
+        temperature (float): Sampling temperature
+        backend (str, optional): "gemini" or "stub"; defaults to MEDICHECK_LLM_BACKEND
+
+    Returns:
+        Any: A client exposing invoke, ainvoke and astream
+    """
+    backend = (backend or LLM_BACKEND).lower()
+    if backend == "stub":
+        logger.info(f"Using stub LLM backend in place of {model}")
+        return StubLLM(model=model)
+    if backend == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model=model,
+            temperature=temperature,
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            convert_system_message_to_human=True
+        )
+    raise ValueError(f"Unknown LLM backend '{backend}' (expected 'gemini' or 'stub')")
@@ -0,0 +1,260 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from metrics import LLM_ACTIVE_CALLS, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Scheduler configuration: model calls allowed at once, calls allowed to wait, and how long they may wait
+LLM_MAX_CONCURRENCY = int(os.getenv("MEDICHECK_LLM_CONCURRENCY", "8"))
+LLM_QUEUE_SIZE = int(os.getenv("MEDICHECK_LLM_QUEUE_SIZE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("MEDICHECK_LLM_QUEUE_TIMEOUT", "20"))
+
+# Priority classes, highest first: chat replies, single-page validations, batch validations
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_VALIDATION = "validation"
+PRIORITY_BULK = "bulk"
+_PRIORITY_RANK = {PRIORITY_INTERACTIVE: 0, PRIORITY_VALIDATION: 1, PRIORITY_BULK: 2}
+# Share of the wait queue each class may fill, so a validation burst cannot lock chat out
+_QUEUE_SHARE = {PRIORITY_INTERACTIVE: 1.0, PRIORITY_VALIDATION: 0.75, PRIORITY_BULK: 0.5}
+
+# Starting estimate of how long a model call holds its slot, used for Retry-After until calls are observed
+INITIAL_SERVICE_SECONDS = 2.0
+
+_current_priority: ContextVar[str] = ContextVar("medicheck_llm_priority", default=PRIORITY_VALIDATION)
+
+
+class LLMOverloadedError(Exception):
+    """Raised when a model call cannot be admitted; the API answers 429 with Retry-After."""
+
+    def __init__(self, priority: str, reason: str, retry_after: int):
+        super().__init__(f"LLM capacity exhausted for {priority} work ({reason}); retry after {retry_after}s")
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@contextmanager
+def use_priority(priority: str) -> Iterator[None]:
+    """Run model calls made in this context (including tasks and threads that copy it) at priority."""
+    if priority not in _PRIORITY_RANK:
+        raise ValueError(f"Unknown priority '{priority}'")
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+
+class _Waiter:
+    __slots__ = ("priority", "state", "event", "loop", "future")
+
+    def __init__(self, priority: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        # "waiting", then "granted" when a slot is handed over or "abandoned" on timeout/cancellation
+        self.state = "waiting"
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future: Optional["asyncio.Future[None]"] = loop.create_future() if loop is not None else None
+
+
+def _wake(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Admission control and priority scheduling for every model call in the process.
+
+    At most max_concurrency calls run at once. Further calls wait in a priority queue
+    (interactive before validation before bulk, first come first served within a class)
+    that holds at most queue_size calls; each class may only fill its share of the queue,
+    leaving headroom for higher classes. A call that finds its share full, or waits longer
+    than queue_timeout, raises LLMOverloadedError carrying a Retry-After estimate. Sync
+    callers (agent threads) and async callers (request handlers on any event loop) share
+    the same slots.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, queue_size: int = LLM_QUEUE_SIZE,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+
+        self._active = 0
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._waiting = {priority: 0 for priority in _PRIORITY_RANK}
+        self._sequence = itertools.count()
+        self._service_seconds = INITIAL_SERVICE_SECONDS
+        self._lock = threading.Lock()
+        self._counters = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def _queue_limit(self, priority: str) -> int:
+        return int(self.queue_size * _QUEUE_SHARE[priority])
+
+    def _retry_after(self) -> int:
+        # Caller must hold the lock. Time for the calls ahead to drain through the slots.
+        queued = sum(self._waiting.values())
+        return max(1, math.ceil((queued + 1) * self._service_seconds / self.max_concurrency))
+
+    def _reject(self, priority: str, reason: str) -> LLMOverloadedError:
+        # Caller must hold the lock
+        self._counters[f"rejected_{reason}"] += 1
+        LLM_REJECTIONS.inc(priority=priority, reason=reason)
+        error = LLMOverloadedError(priority, reason, self._retry_after())
+        logger.warning(str(error))
+        return error
+
+    def check_admission(self, priority: Optional[str] = None) -> None:
+        """
+        Fail fast, before any search work, when a call at priority would be rejected right now.
+
+        Raises:
+            LLMOverloadedError: If every slot is busy and the class's share of the queue is full
+        """
+        priority = priority or current_priority()
+        with self._lock:
+            if self._active >= self.max_concurrency and self._waiting[priority] >= self._queue_limit(priority):
+                raise self._reject(priority, "queue_full")
+
+    def _enter(self, priority: str, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        # Take a free slot (returns None) or join the queue (returns the waiter to wait on)
+        with self._lock:
+            if self._active < self.max_concurrency and not self._queue:
+                self._active += 1
+                self._counters["admitted"] += 1
+                LLM_ACTIVE_CALLS.set(self._active)
+                LLM_QUEUE_WAIT_SECONDS.observe(0.0, priority=priority)
+                return None
+            if self._waiting[priority] >= self._queue_limit(priority):
+                raise self._reject(priority, "queue_full")
+            waiter = _Waiter(priority, loop)
+            heapq.heappush(self._queue, (_PRIORITY_RANK[priority], next(self._sequence), waiter))
+            self._waiting[priority] += 1
+            self._counters["queued"] += 1
+            LLM_QUEUE_DEPTH.set(self._waiting[priority], priority=priority)
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        # Give up waiting; returns True if a slot was granted meanwhile and now belongs to the caller
+        with self._lock:
+            if waiter.state == "granted":
+                return True
+            waiter.state = "abandoned"
+            self._waiting[waiter.priority] -= 1
+            LLM_QUEUE_DEPTH.set(self._waiting[waiter.priority], priority=waiter.priority)
+            return False
+
+    def _timeout(self, waiter: _Waiter, waited: float) -> LLMOverloadedError:
+        LLM_QUEUE_WAIT_SECONDS.observe(waited, priority=waiter.priority)
+        with self._lock:
+            return self._reject(waiter.priority, "timeout")
+
+    def _release(self, held_for: float) -> None:
+        # Hand the slot to the highest-priority waiter, or free it
+        with self._lock:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_for
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.state != "waiting":
+                    continue
+                waiter.state = "granted"
+                self._waiting[waiter.priority] -= 1
+                self._counters["admitted"] += 1
+                LLM_QUEUE_DEPTH.set(self._waiting[waiter.priority], priority=waiter.priority)
+                if waiter.event is not None:
+                    waiter.event.set()
+                else:
+                    waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+                return
+            self._active -= 1
+            LLM_ACTIVE_CALLS.set(self._active)
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None) -> Iterator[None]:
+        """
+        Hold one model-call slot for the with-block, waiting in the queue if necessary.
+
+        Args:
+            priority (str, optional): Priority class; defaults to the one set with use_priority()
+
+        Raises:
+            LLMOverloadedError: If the queue is full or the wait exceeds queue_timeout
+        """
+        priority = priority or current_priority()
+        queued_at = time.perf_counter()
+        waiter = self._enter(priority, None)
+        if waiter is not None:
+            granted = waiter.event.wait(self.queue_timeout if self.queue_timeout > 0 else None)
+            if not granted and not self._abandon(waiter):
+                raise self._timeout(waiter, time.perf_counter() - queued_at)
+            LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued_at, priority=priority)
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def aslot(self, priority: Optional[str] = None) -> AsyncIterator[None]:
+        """Async counterpart of slot(); waiting does not block the event loop."""
+        priority = priority or current_priority()
+        queued_at = time.perf_counter()
+        waiter = self._enter(priority, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout if self.queue_timeout > 0 else None)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise self._timeout(waiter, time.perf_counter() - queued_at)
+            except asyncio.CancelledError:
+                # The request went away; pass on a slot that was granted in the meantime
+                if self._abandon(waiter):
+                    self._release(0.0)
+                raise
+            LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued_at, priority=priority)
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "active": self._active,
+                "max_concurrency": self.max_concurrency,
+                "queued_by_priority": dict(self._waiting),
+                "queue_size": self.queue_size,
+                "service_seconds": round(self._service_seconds, 3),
+            }
+
+
+_llm_scheduler: Optional[LLMScheduler] = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Return the process-wide model-call scheduler, creating it on first use."""
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMScheduler()
+        return _llm_scheduler
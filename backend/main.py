@@ -1,12 +1,36 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 import os
 from dotenv import load_dotenv
 import json
+import time
+import asyncio
+import hashlib
 import logging
-from agent1 import get_medical_validation
-from google.generativeai import GenerativeModel
+import threading
+from agent1 import DEFAULT_MODEL, LLM_ATTEMPT_TIMEOUT, LLM_DEADLINE, aget_batch_medical_validation, aget_chunked_medical_validation, aget_medical_validation, ahas_cached_validation, astream_chunked_medical_validation, astream_medical_validation, get_agent_pool, validation_flights
+from batching import BATCH_CONCURRENCY, BATCH_MAX_ITEMS
+from content_transfer import GZIP_LEVEL, GZIP_MIN_BYTES, SUPPORTED_ENCODINGS, RequestDecompressionMiddleware, content_hash, get_content_hash_index
+from conversation_store import build_validation_digest, create_conversation_store
+from chunking import CHUNK_CHARS, CHUNKING_ENABLED, MAX_CONTENT_CHARS, split_into_chunks
+from claim_cache import get_claim_store, normalize_claim
+from content_filter import CONTENT_FILTER_ENABLED, get_content_filter
+from llm_backend import create_llm
+from llm_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, LLMOverloadedError, get_llm_scheduler, use_priority
+from metrics import COMPLETION_TOKENS, HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT, LLM_SECONDS, PROMPT_TOKENS, TRUNCATED_PAGES, register_collector, render_metrics, stats_samples
+from output_parser import parse_validation_response
+from page_snapshots import INCREMENTAL_ENABLED, get_page_snapshots
+from prompt_builder import count_tokens
+from reference_index import get_reference_index
+from resilience import CircuitOpenError, dependency_stats, get_dependency
+from singleflight import SingleFlight
+from state_store import get_lease_table
+from tracing import TRACE_HEADER, TRACE_HEADER_ENABLED, get_profiler, span, start_trace
+from validation_cache import get_validation_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -15,14 +39,12 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize Gemini 2.0 Flash model
-gemini_model = GenerativeModel("gemini-2.0-flash")
-
-# Store conversation history including chat and validation responses
-conversation_history = []
-
 app = FastAPI()
 
+# Compress responses for clients that accept gzip, and decode gzip/zstd uploads to /summarize*
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=GZIP_LEVEL)
+app.add_middleware(RequestDecompressionMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -33,46 +55,99 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    """Track in-flight requests and request duration per route"""
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        # Label by route template, not raw URL, so unknown paths cannot blow up the label set
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            path=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Return a per-span timing breakdown when asked to, and profile a sampled share of requests"""
+    want_trace = TRACE_HEADER_ENABLED and request.headers.get(TRACE_HEADER, "").lower() in ("1", "true", "yes")
+    with get_profiler().maybe_profile(request.url.path) as profile_path:
+        if not want_trace:
+            response = await call_next(request)
+        else:
+            with start_trace() as trace:
+                with span(f"{request.method} {request.url.path}"):
+                    response = await call_next(request)
+            # Streaming responses send headers before the body, so their breakdown covers only time to first byte
+            response.headers["Server-Timing"] = trace.server_timing()
+            response.headers["X-MediCheck-Trace"] = json.dumps(trace.breakdown(), separators=(",", ":"))
+    if profile_path is not None and TRACE_HEADER_ENABLED:
+        response.headers["X-MediCheck-Profile"] = os.path.basename(profile_path)
+    return response
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded(request: Request, exc: LLMOverloadedError):
+    """Shed load quickly: tell the client when to come back instead of queueing without bound"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Server is busy, please retry later", "priority": exc.priority, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 class ContentRequest(BaseModel):
-    content: dict
+    # Either the scraped page, or only content_hash to ask for a cached result before uploading the page
+    content: Optional[dict] = None
+    content_hash: Optional[str] = None
+    session_id: Optional[str] = None
+
+class BatchContentRequest(BaseModel):
+    items: List[ContentRequest]
+    max_concurrency: Optional[int] = None
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
 
-# Initialize conversation history
-conversation_history = []
-
-# Initialize Gemini model for chat
-from langchain_google_genai import ChatGoogleGenerativeAI
-gemini_model = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    temperature=0.2,
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-    convert_system_message_to_human=True
-)
-
-@app.post("/summarize")
-async def validate_content(request: ContentRequest):
-    try:
-        logger.info("Received content validation request")
-        content = request.content
-        metadata = content.get("metadata", {})
-
-        title = content.get("title", "No title")
-        url = content.get("url", "No URL")
-        text = content.get("text", "")
-
-        custom_instructions = """
+# Instructions used for every page validation
+VALIDATION_INSTRUCTIONS = """
         Focus on fact-checking the medical claims in the query.
         Present accurate information and clearly correct any misconceptions.
         Use authoritative medical sources and provide links to reliable references.
         Structure your response with clear sections addressing each claim separately.
         """
-    
-
-        logger.info(f"Content info - Title: {title}, URL: {url}, Text length: {len(text)}")
 
-        formatted_text = f"""
+# Conversation history including chat and validation responses, kept per client session
+# in memory or, with MEDICHECK_STATE_BACKEND=sqlite, in a file shared by all workers
+conversation_store = create_conversation_store()
+# A chat message repeated in the same session while it is still being answered shares that turn
+chat_flights = SingleFlight("chat")
+# Retries, hedging and a circuit breaker for chat model calls
+chat_dependency = get_dependency("chat_llm", deadline=LLM_DEADLINE, attempt_timeout=LLM_ATTEMPT_TIMEOUT)
+
+# Chat model from the configured LLM backend (MEDICHECK_LLM_BACKEND), created by the startup warm-up or on first use
+_chat_model: Optional[Any] = None
+_chat_model_lock = threading.Lock()
+
+def get_chat_model() -> Any:
+    """Return the chat model client, creating it on first use."""
+    global _chat_model
+    with _chat_model_lock:
+        if _chat_model is None:
+            _chat_model = create_llm("gemini-1.5-flash", 0.2)
+        return _chat_model
+
+def format_content(title: str, url: str, metadata: dict, text: str) -> str:
+    """Format page content and metadata into the validation query sent to the agent"""
+    return f"""
         Title: {title}
         URL: {url}
 
@@ -84,22 +159,172 @@ async def validate_content(request: ContentRequest):
         - Open Graph Description: {metadata.get("ogDescription", "Not available")}
 
         Main Content:
-        {text[:30000]}
+        {text}
         """
 
-        logger.info(f"Processing Content for Validation - Source: {url}, Length: {len(formatted_text)}")
+def resolve_session_id(http_request: Request, session_id: Optional[str]) -> str:
+    """Pick the conversation session for a request: body field, then X-Session-ID header, then client address"""
+    session_id = session_id or http_request.headers.get("x-session-id")
+    if session_id:
+        return session_id[:128]
+    client_host = http_request.client.host if http_request.client else "unknown"
+    return f"anonymous:{client_host}"
+
+def prepare_validation_queries(content: dict) -> Tuple[str, List[str]]:
+    """
+    Turn scraped page content into validation queries.
+
+    Returns the formatted text of the whole page plus one query per chunk; the chunk list
+    is empty when the page is short enough to validate in a single call.
+    """
+    metadata = content.get("metadata") or {}
+
+    title = content.get("title", "No title")
+    url = content.get("url", "No URL")
+    text = content.get("text", "")
+
+    logger.info(f"Content info - Title: {title}, URL: {url}, Text length: {len(text)}")
+
+    # Drop page furniture and sentences without medical claims before anything reaches the LLM
+    if CONTENT_FILTER_ENABLED and text:
+        reduction = get_content_filter().reduce(text)
+        text = reduction.text
+        logger.info(
+            f"Content reduced - Removed {reduction.removed_chars} of {reduction.original_chars} chars "
+            f"(~{reduction.removed_tokens} tokens), kept {reduction.kept_sentences} sentences"
+        )
+
+    # Long pages are validated chunk by chunk; a single prompt is trimmed to its token budget by the prompt builder
+    if len(text) > MAX_CONTENT_CHARS:
+        TRUNCATED_PAGES.inc(reason="max_content_chars")
+        text = text[:MAX_CONTENT_CHARS]
+    chunks = split_into_chunks(text, CHUNK_CHARS) if CHUNKING_ENABLED and len(text) > CHUNK_CHARS else []
+    formatted_text = format_content(title, url, metadata, text)
+
+    logger.info(f"Processing Content for Validation - Source: {url}, Length: {len(formatted_text)}")
+
+    chunk_queries = [format_content(title, url, metadata, chunk) for chunk in chunks] if len(chunks) > 1 else []
+    return formatted_text, chunk_queries
+
+async def remember_validation(session_id: str, content: dict, validation_result: dict) -> None:
+    """Record a validation in the session's chat memory as a digest rather than the full page text"""
+    digest = build_validation_digest(content.get("title", "No title"), content.get("url", "No URL"), validation_result)
+    await conversation_store.aappend(session_id, "validation", digest)
+
+def require_content(request: ContentRequest) -> dict:
+    if request.content is None:
+        raise HTTPException(status_code=400, detail="Request must include content")
+    return request.content
+
+async def validation_succeeded(queries: List[str]) -> bool:
+    """True when every query's validation finished without error (successful validations are cached)"""
+    for query in queries:
+        if not await ahas_cached_validation(query, VALIDATION_INSTRUCTIONS):
+            return False
+    return True
+
+async def index_validation(content: dict, validation_result: dict, client_hash: Optional[str] = None) -> None:
+    """Make a successful validation available to hash-first /summarize requests"""
+    digest = content_hash(content)
+    if client_hash and client_hash.lower() != digest:
+        logger.warning(f"Client content_hash {client_hash[:12]} does not match the uploaded content ({digest[:12]})")
+    await get_content_hash_index().aput(digest, VALIDATION_INSTRUCTIONS, DEFAULT_MODEL, content, validation_result)
+
+async def lookup_content_hash(request: ContentRequest, session_id: str):
+    """
+    First step of the hash-first protocol: answer from cache, or 404 asking for the upload.
+
+    A hit returns the same payload as a full /summarize. A miss returns 404 with the hash
+    and, in Accept-Encoding, the encodings the page may be uploaded with.
+    """
+    if not request.content_hash:
+        raise HTTPException(status_code=400, detail="Request must include content or content_hash")
+    entry = await get_content_hash_index().aget(request.content_hash, VALIDATION_INSTRUCTIONS, DEFAULT_MODEL)
+    if entry is None:
+        logger.info(f"No cached result for content hash {request.content_hash[:12]}, asking for upload")
+        return JSONResponse(
+            status_code=404,
+            content={"detail": "No cached result for this content; upload it", "content_hash": request.content_hash},
+            headers={"Accept-Encoding": ", ".join(SUPPORTED_ENCODINGS)}
+        )
+    logger.info(f"Answering from cache for content hash {request.content_hash[:12]}")
+    await remember_validation(session_id, entry, entry["result"])
+    return entry["result"]
+
+# Shared clients built by the startup warm-up; /ready answers 503 until every one is available
+WARMUP_COMPONENTS: Dict[str, Callable[[], Any]] = {
+    "agent_pool": get_agent_pool,
+    "chat_model": get_chat_model,
+    "validation_cache": get_validation_cache,
+    "claim_store": get_claim_store,
+    "reference_index": get_reference_index,
+}
+warmup_status: Dict[str, str] = {name: "pending" for name in WARMUP_COMPONENTS}
+
+def warm_components() -> None:
+    """Build each shared client in turn, recording whether it became ready"""
+    for name, factory in WARMUP_COMPONENTS.items():
+        started = time.perf_counter()
+        try:
+            factory()
+            warmup_status[name] = "ready"
+            logger.info(f"Warmed {name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            warmup_status[name] = "failed"
+            logger.error(f"Failed to warm {name}: {str(e)}")
+
+@app.on_event("startup")
+async def start_warmup():
+    """Warm shared clients in a background thread so the server accepts connections straight away"""
+    # Requests that arrive first build whatever they need themselves; the getters are lock-protected
+    app.state.warmup_task = asyncio.create_task(asyncio.to_thread(warm_components))
 
-        logger.info("Calling get_medical_validation function")
-        validation_result = get_medical_validation(formatted_text, custom_instructions=custom_instructions)
+@app.post("/summarize")
+async def validate_content(request: ContentRequest, http_request: Request):
+    session_id = resolve_session_id(http_request, request.session_id)
+    if request.content is None:
+        return await lookup_content_hash(request, session_id)
+    try:
+        logger.info("Received content validation request")
+        get_llm_scheduler().check_admission()
+
+        # A page seen before only needs its changed paragraphs validated
+        plan = None
+        content = request.content
+        if INCREMENTAL_ENABLED and content.get("url") and content.get("text"):
+            snapshots = get_page_snapshots()
+            with span("plan_revalidation"):
+                plan = await snapshots.aplan(content["url"], content["text"], scope=DEFAULT_MODEL)
+            if not plan.changed:
+                logger.info(f"Page unchanged since last validation, reusing results for {len(plan.paragraphs)} paragraphs")
+                validation_result = snapshots.reuse(plan)
+                await index_validation(content, validation_result, request.content_hash)
+                await remember_validation(session_id, content, validation_result)
+                return validation_result
+            if not plan.full:
+                logger.info(f"Revalidating {len(plan.changed)} of {len(plan.paragraphs)} paragraphs")
+                content = {**content, "text": plan.changed_text}
+
+        with span("prepare_content"):
+            formatted_text, chunk_queries = prepare_validation_queries(content)
+
+        if chunk_queries:
+            logger.info(f"Calling aget_chunked_medical_validation with {len(chunk_queries)} chunks")
+            validation_result = await aget_chunked_medical_validation(chunk_queries, custom_instructions=VALIDATION_INSTRUCTIONS)
+        else:
+            logger.info("Calling aget_medical_validation function")
+            validation_result = await aget_medical_validation(formatted_text, custom_instructions=VALIDATION_INSTRUCTIONS)
         
         # Check if validation_result is a string and parse it to JSON if needed
         if isinstance(validation_result, str):
-            try:
-                validation_result = json.loads(validation_result)
+            with span("parse_result"):
+                parsed = parse_validation_response(validation_result)
+            if parsed is not None:
+                validation_result = parsed.model_dump()
                 logger.info("Successfully parsed validation result from string to JSON")
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse validation result as JSON: {str(e)}")
-                # Create a fallback result if parsing fails
+            else:
+                logger.error("Failed to parse validation result as JSON")
+                # Create a fallback result if nothing could be recovered
                 validation_result = {
                     "summary": "Error parsing validation result",
                     "validation_results": []
@@ -110,16 +335,27 @@ async def validate_content(request: ContentRequest):
         if isinstance(validation_result, dict) and "validation_results" in validation_result:
             logger.info(f"Number of validation results: {len(validation_result['validation_results'])}")
 
+        # Only keep validations that succeeded; errors must be retried next time. The agent marks
+        # partial (cut off or salvaged) output as an error, so it is never cached and fails this check
+        if isinstance(validation_result, dict) and await validation_succeeded(chunk_queries or [formatted_text]):
+            if plan is not None:
+                validation_result = await get_page_snapshots().acomplete(plan, validation_result)
+            await index_validation(request.content, validation_result, request.content_hash)
+        elif plan is not None and isinstance(validation_result, dict):
+            # The unchanged paragraphs' results still hold; only the snapshot waits for a successful run
+            validation_result = get_page_snapshots().include_reused(plan, validation_result)
+
         logger.info("Validation completed successfully")
         logger.info("Returning validation results to client")
 
-        # Store request and validation response in conversation history
-        conversation_history.append({"role": "user", "message": f"Validation request: {formatted_text}"})
-        conversation_history.append({"role": "validation", "message": f"Validation result: {json.dumps(validation_result)}"})
+        # Store a compact digest of the validation in conversation history for later chat turns
+        await remember_validation(session_id, request.content, validation_result)
         
         # Return the validation results
         return validation_result
 
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error during content validation: {str(e)}")
         # Create a structured error response
@@ -131,46 +367,257 @@ async def validate_content(request: ContentRequest):
         # This ensures the client gets a properly formatted response even in error cases
         return error_response
 
+@app.post("/summarize/batch")
+async def validate_content_batch(request: BatchContentRequest):
+    """
+    Validate many pages in one call.
+
+    Duplicate and near-duplicate pages are validated once, and all LLM work is scheduled
+    under one concurrency limit. Returns per-item results in request order, each with its
+    elapsed time and the index of the page it duplicates (if any), plus aggregate stats.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {BATCH_MAX_ITEMS} items")
+    if any(item.content is None for item in request.items):
+        raise HTTPException(status_code=400, detail="Every batch item must include content")
+
+    logger.info(f"Received batch validation request with {len(request.items)} items")
+    # Batch work yields model capacity to chat and single-page validations
+    with use_priority(PRIORITY_BULK):
+        get_llm_scheduler().check_admission()
+        queries = []
+        for item in request.items:
+            formatted_text, chunk_queries = prepare_validation_queries(item.content)
+            queries.append(chunk_queries or formatted_text)
+
+        return await aget_batch_medical_validation(
+            queries,
+            custom_instructions=VALIDATION_INSTRUCTIONS,
+            max_concurrency=request.max_concurrency or BATCH_CONCURRENCY,
+            dedup_texts=[item.content.get("text", "") for item in request.items]
+        )
+
+@app.post("/summarize/stream")
+async def validate_content_stream(request: ContentRequest, http_request: Request):
+    """
+    Streaming variant of /summarize.
+
+    Responds with newline-delimited JSON events so the client can highlight corrections
+    as soon as each one is parsed. The last event is {"event": "done", "result": ...}
+    carrying the same payload /summarize returns. A page seen before is handled as in
+    /summarize: when nothing changed the stored result is replayed, otherwise the stored
+    corrections of unchanged paragraphs are sent first and only the changed ones are validated.
+    """
+    logger.info("Received streaming content validation request")
+    # Once streaming starts the status code is sent, so overload must be refused up front
+    get_llm_scheduler().check_admission()
+    session_id = resolve_session_id(http_request, request.session_id)
+    content = require_content(request)
+
+    plan = None
+    snapshots = get_page_snapshots()
+    validated_content = content
+    if INCREMENTAL_ENABLED and content.get("url") and content.get("text"):
+        with span("plan_revalidation"):
+            plan = await snapshots.aplan(content["url"], content["text"], scope=DEFAULT_MODEL)
+        if plan.changed and not plan.full:
+            logger.info(f"Revalidating {len(plan.changed)} of {len(plan.paragraphs)} paragraphs")
+            validated_content = {**content, "text": plan.changed_text}
+    unchanged = plan is not None and not plan.changed
+    formatted_text, chunk_queries = ("", []) if unchanged else prepare_validation_queries(validated_content)
+
+    async def replay(result: dict) -> AsyncIterator[Dict[str, Any]]:
+        for item in result["validation_results"]:
+            yield {"event": "validation_result", "item": item}
+        yield {"event": "summary", "summary": result["summary"]}
+        yield {"event": "done", "result": result}
+
+    async def event_stream() -> AsyncIterator[str]:
+        # Corrections already sent, so merged results do not repeat them
+        emitted = set()
+        try:
+            if unchanged:
+                logger.info(f"Page unchanged since last validation, reusing results for {len(plan.paragraphs)} paragraphs")
+                events = replay(snapshots.reuse(plan))
+            else:
+                for item in snapshots.reused_results(plan) if plan is not None else []:
+                    emitted.add(normalize_claim(item.get("incorrect_text", "")))
+                    yield json.dumps({"event": "validation_result", "item": item}) + "\n"
+                if chunk_queries:
+                    events = astream_chunked_medical_validation(chunk_queries, custom_instructions=VALIDATION_INSTRUCTIONS)
+                else:
+                    events = astream_medical_validation(formatted_text, custom_instructions=VALIDATION_INSTRUCTIONS)
+
+            async for event in events:
+                if event["event"] == "validation_result":
+                    marker = normalize_claim(event["item"].get("incorrect_text", ""))
+                    if marker in emitted:
+                        continue
+                    emitted.add(marker)
+                elif event["event"] == "done":
+                    result = event["result"]
+                    # Only successful validations update the snapshot; errors must be retried next time
+                    if unchanged:
+                        await index_validation(content, result, request.content_hash)
+                    elif await validation_succeeded(chunk_queries or [formatted_text]):
+                        if plan is not None:
+                            result = await snapshots.acomplete(plan, result)
+                            for item in result["validation_results"]:
+                                marker = normalize_claim(item.get("incorrect_text", ""))
+                                if marker not in emitted:
+                                    emitted.add(marker)
+                                    yield json.dumps({"event": "validation_result", "item": item}) + "\n"
+                        await index_validation(content, result, request.content_hash)
+                    elif plan is not None:
+                        # Already streamed, but the final result must cover the unchanged paragraphs too
+                        result = snapshots.include_reused(plan, result)
+                    await remember_validation(session_id, content, result)
+                    event = {"event": "done", "result": result}
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logger.error(f"Error during streaming content validation: {str(e)}")
+            yield json.dumps({"event": "error", "message": str(e)}) + "\n"
+            yield json.dumps({"event": "done", "result": {"summary": f"Error: {str(e)}", "validation_results": []}}) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
+    session_id = resolve_session_id(http_request, request.session_id)
     try:
         user_input = request.message
         if not user_input:
             raise HTTPException(status_code=400, detail="Message cannot be empty")
 
         logger.info(f"Received chat query: {user_input}")
-
-        # Append user message to history
-        conversation_history.append({"role": "user", "message": user_input})
-
-        # Limit history size (e.g., keep only last 15 exchanges)
-        conversation_history[:] = conversation_history[-15:]
-
-        # Format history as direct conversation
-        context = "\n".join([f"{msg['role']}: {msg['message']}" for msg in conversation_history])
-
-        # Generate response using LangChain's invoke method
-        response = gemini_model.invoke(f"{context}\nBot:(Instruction: Keep it short and to the point)")
-        bot_reply = response.content if response else "I'm sorry, I couldn't process your request."
-
-        # Ensure bot responds naturally without third-person narration
-        if "Response:" in bot_reply:
-            bot_reply = bot_reply.split("Response:")[-1].strip()
-
-        # Append bot response to history
-        conversation_history.append({"role": "bot", "message": bot_reply})
+        get_llm_scheduler().check_admission(PRIORITY_INTERACTIVE)
+
+        async def take_turn() -> str:
+            # Append user message to this session's history; the store enforces its size limits
+            await conversation_store.aappend(session_id, "user", user_input)
+
+            # Format history as direct conversation
+            context = await conversation_store.abuild_context(session_id)
+
+            # Generate response using LangChain's async invoke so the event loop stays free
+            prompt = f"{context}\nBot:(Instruction: Keep it short and to the point)"
+            PROMPT_TOKENS.inc(count_tokens(prompt), operation="chat")
+            async with get_llm_scheduler().aslot(PRIORITY_INTERACTIVE):
+                with LLM_SECONDS.time(operation="chat"), span("chat_llm"):
+                    response = await chat_dependency.acall(lambda: get_chat_model().ainvoke(prompt))
+            COMPLETION_TOKENS.inc(count_tokens(str(response.content)), operation="chat")
+            bot_reply = response.content if response else "I'm sorry, I couldn't process your request."
+
+            # Ensure bot responds naturally without third-person narration
+            if "Response:" in bot_reply:
+                bot_reply = bot_reply.split("Response:")[-1].strip()
+
+            # Append bot response to history
+            await conversation_store.aappend(session_id, "bot", bot_reply)
+            return bot_reply
+
+        # The same message sent again in the same session while it is being answered (a double
+        # submit) joins that turn, so the message is stored once and both requests get one reply
+        turn_key = hashlib.sha256(f"{session_id}\x00{user_input}".encode("utf-8")).hexdigest()
+        try:
+            bot_reply = await chat_flights.do(turn_key, take_turn)
+        except CircuitOpenError as e:
+            # Fail fast with a degraded reply; it is not added to the conversation history
+            logger.warning(f"Chat model unavailable: {str(e)}")
+            return {"response": "I'm having trouble reaching the medical assistant right now. Please try again shortly.", "degraded": True}
 
         return {"response": bot_reply}
 
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error in chat route: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+def collect_store_metrics():
+    """Expose cache, store and coalescing counters on /metrics, read from their stats() at scrape time"""
+    cache_events = ["hits", "misses", "memory_hits", "disk_hits", "evictions", "expirations", "stored", "memo_hits"]
+    flight_events = ["leaders", "followers"]
+    validation_cache = get_validation_cache().stats()
+    claim_cache = get_claim_store().stats()
+    reference_index = get_reference_index().stats()
+    conversations = conversation_store.stats()
+    content_filter = get_content_filter().stats()
+    return [
+        ("medicheck_cache_events_total", "counter", "Cache hits, misses and evictions",
+         stats_samples(validation_cache, cache_events, cache="validation")
+         + stats_samples(claim_cache, cache_events, cache="claim")
+         + stats_samples(reference_index, cache_events, cache="reference_index")),
+        ("medicheck_cache_entries", "gauge", "Entries held by each cache",
+         [({"cache": "validation"}, validation_cache["size"]),
+          ({"cache": "claim"}, claim_cache["size"]),
+          ({"cache": "reference_index"}, reference_index["articles"])]),
+        ("medicheck_singleflight_calls_total", "counter", "Calls that led or joined an in-flight computation",
+         stats_samples(validation_flights.stats(), flight_events, flight="validation")
+         + stats_samples(chat_flights.stats(), flight_events, flight="chat")),
+        ("medicheck_conversation_sessions", "gauge", "Chat sessions held in the conversation store",
+         [({}, conversations["sessions"])]),
+        ("medicheck_conversation_chars", "gauge", "Characters held across all chat sessions",
+         [({}, conversations["total_chars"])]),
+        ("medicheck_content_filter_removed_chars_total", "counter", "Characters removed from pages before validation",
+         [({}, content_filter["removed_chars"])]),
+        ("medicheck_content_filter_removed_tokens_total", "counter", "Tokens removed from pages before validation",
+         [({}, content_filter["removed_tokens"])]),
+    ]
+
+register_collector(collect_store_metrics)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    # Collectors read the SQLite-backed stores, so render off the event loop
+    return PlainTextResponse(await asyncio.to_thread(render_metrics), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/stats")
+async def stats():
+    """Cache, store, request-coalescing, model scheduling, circuit breaker, page snapshot and content hash state"""
+    return await asyncio.to_thread(collect_stats)
+
+
+def collect_stats() -> Dict[str, Any]:
+    # Several stores answer from SQLite, so /stats runs this in a thread
+    leases = get_lease_table()
+    return {
+        "validation_cache": get_validation_cache().stats(),
+        "claim_cache": get_claim_store().stats(),
+        "reference_index": get_reference_index().stats(),
+        "conversations": conversation_store.stats(),
+        "content_filter": get_content_filter().stats(),
+        "singleflight": {
+            "validation": validation_flights.stats(),
+            "chat": chat_flights.stats(),
+        },
+        "leases": leases.stats() if leases is not None else None,
+        "llm_scheduler": get_llm_scheduler().stats(),
+        "resilience": dependency_stats(),
+        "page_snapshots": get_page_snapshots().stats(),
+        "content_hash": get_content_hash_index().stats(),
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once every shared client is warm, 503 while warming or after a failure"""
+    ready = all(status == "ready" for status in warmup_status.values())
+    body = {"status": "ready" if ready else "warming", "components": dict(warmup_status)}
+    if "failed" in warmup_status.values():
+        body["status"] = "failed"
+    return JSONResponse(status_code=200 if ready else 503, content=body)
 # 
 if __name__ == "__main__":
     import uvicorn
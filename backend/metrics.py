@@ -0,0 +1,194 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Prometheus text exposition without a client library: metrics are module-level objects
+# updated by the pipeline, and collectors turn existing stats() dicts into samples at scrape time.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally split by labels."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds, tokens) in cumulative buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: bucket counts, sum, count
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * len(self.buckets), [0.0, 0.0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the wall time of the with-block, including when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_samples(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            for key, (counts, totals) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(totals[0])}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {_format_value(totals[1])}")
+        return lines
+
+
+_registry: List[_Metric] = []
+# Each collector returns (name, type, help, samples) families built from live stats at scrape time
+_collectors: List[Callable[[], List[Tuple[str, str, str, List[Sample]]]]] = []
+
+
+def register_collector(collector: Callable[[], List[Tuple[str, str, str, List[Sample]]]]) -> None:
+    """Add a function whose metric families are rendered on every scrape."""
+    _collectors.append(collector)
+
+
+def stats_samples(stats: Dict[str, Any], keys: Sequence[str], **labels: str) -> List[Sample]:
+    """Turn selected numeric entries of a stats() dict into samples labelled with the entry name."""
+    return [({**labels, "event": key}, float(stats[key])) for key in keys if isinstance(stats.get(key), (int, float))]
+
+
+def render_metrics() -> str:
+    """Render every registered metric and collector in the Prometheus text format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, kind, documentation, samples in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+# Pipeline metrics
+SEARCH_SOURCE_SECONDS = Histogram("medicheck_search_source_seconds", "Time per source in comprehensive search", ["source", "status"])
+LLM_SECONDS = Histogram("medicheck_llm_seconds", "Time spent in LLM calls", ["operation"])
+PARSE_SECONDS = Histogram("medicheck_parse_seconds", "Time to extract and validate the JSON result from model output",
+                          buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+PROMPT_TOKENS = Counter("medicheck_prompt_tokens_total", "Prompt tokens sent to the LLM", ["operation"])
+COMPLETION_TOKENS = Counter("medicheck_completion_tokens_total", "Completion tokens received from the LLM", ["operation"])
+TRUNCATED_PAGES = Counter("medicheck_truncated_pages_total", "Pages whose content was cut to fit a limit", ["reason"])
+PARSE_FALLBACKS = Counter("medicheck_parse_fallbacks_total", "Model outputs that needed repair or salvage, or could not be parsed", ["outcome"])
+
+# LLM scheduler metrics
+LLM_ACTIVE_CALLS = Gauge("medicheck_llm_active_calls", "Model calls currently holding a scheduler slot")
+LLM_QUEUE_DEPTH = Gauge("medicheck_llm_queue_depth", "Model calls waiting for a scheduler slot", ["priority"])
+LLM_QUEUE_WAIT_SECONDS = Histogram("medicheck_llm_queue_wait_seconds", "Time model calls waited for a scheduler slot", ["priority"])
+LLM_REJECTIONS = Counter("medicheck_llm_rejections_total", "Model calls rejected because the queue was full or the wait timed out", ["priority", "reason"])
+
+# Resilience metrics
+RESILIENCE_EVENTS = Counter("medicheck_resilience_events_total",
+                            "Retries, timeouts, failures, hedged requests and circuit breaker activity per external dependency", ["dependency", "event"])
+BREAKER_STATE = Gauge("medicheck_circuit_breaker_state", "Circuit breaker state per dependency: 0 closed, 1 half-open, 2 open", ["dependency"])
+
+# HTTP metrics
+HTTP_REQUEST_SECONDS = Histogram("medicheck_http_request_seconds", "HTTP request duration", ["method", "path", "status"])
+HTTP_REQUESTS_IN_FLIGHT = Gauge("medicheck_http_requests_in_flight", "HTTP requests currently being handled")
+REQUEST_BODY_BYTES = Counter("medicheck_request_body_bytes_total", "Compressed request body bytes as received and once decoded", ["encoding", "stage"])
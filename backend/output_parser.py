@@ -0,0 +1,298 @@
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from metrics import PARSE_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+_FENCE = re.compile(r"```(?:json|JSON)?")
+_SUMMARY = re.compile(r'"summary"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+
+class ValidationItem(BaseModel):
+    incorrect_text: str
+    correct_text: str = ""
+
+    @field_validator("incorrect_text", "correct_text", mode="before")
+    @classmethod
+    def _as_text(cls, value: Any) -> str:
+        return "" if value is None else str(value)
+
+
+class ValidationResponse(BaseModel):
+    """Typed form of the summary/validation_results schema the model is asked to return."""
+    summary: str = ""
+    validation_results: List[ValidationItem] = []
+    # Set when the output was cut off or had to be salvaged, so claims may be missing; never serialised.
+    # Callers return such results but must not cache them or derive verdicts from them.
+    partial: bool = Field(default=False, exclude=True)
+
+    @field_validator("summary", mode="before")
+    @classmethod
+    def _summary_as_text(cls, value: Any) -> str:
+        return "" if value is None else str(value)
+
+    @field_validator("validation_results", mode="before")
+    @classmethod
+    def _keep_valid_items(cls, value: Any) -> List[Any]:
+        # One malformed item should not cost the whole response
+        if not isinstance(value, list):
+            return []
+        return [item for item in value if isinstance(item, dict) and str(item.get("incorrect_text") or "").strip()]
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """
+    Find the outermost JSON object in model output, ignoring fences and surrounding prose.
+
+    Args:
+        text (str): Raw model output
+
+    Returns:
+        Optional[str]: The object's text, running to the end of the output if it was cut off, or None
+    """
+    text = _FENCE.sub("", text)
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:]
+
+
+def _scan(fragment: str) -> Tuple[List[str], bool, bool]:
+    # Brackets still open at the end of fragment (as their closers), and whether it ends inside a string
+    closers: List[str] = []
+    in_string = escaped = False
+    for char in fragment:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+    return closers, in_string, escaped
+
+
+def is_truncated(fragment: str) -> bool:
+    """True when a JSON fragment ends inside a string or with objects/arrays still open."""
+    closers, in_string, _ = _scan(fragment.rstrip())
+    return bool(closers) or in_string
+
+
+def strip_trailing_commas(fragment: str) -> str:
+    """Remove commas directly before a closing bracket, leaving string contents untouched."""
+    output: List[str] = []
+    in_string = escaped = False
+    for index, char in enumerate(fragment):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ",":
+            following = index + 1
+            while following < len(fragment) and fragment[following].isspace():
+                following += 1
+            if following < len(fragment) and fragment[following] in "}]":
+                continue
+        output.append(char)
+    return "".join(output)
+
+
+def repair_json(fragment: str) -> str:
+    """
+    Fix the defects models commonly produce: trailing commas, and output cut off
+    mid-string or mid-object (open strings, arrays and objects are closed).
+
+    Args:
+        fragment (str): Text of a JSON object, possibly malformed
+
+    Returns:
+        str: Repaired text; not guaranteed to parse
+    """
+    fragment = fragment.rstrip()
+    closers, in_string, escaped = _scan(fragment)
+
+    if in_string:
+        # Close the cut-off string, dropping a dangling escape character
+        fragment = (fragment[:-1] if escaped else fragment) + '"'
+    # A dangling key or separator cannot be completed, so drop it before closing
+    fragment = re.sub(r'(,\s*"[^"]*"\s*:?\s*|,\s*|:\s*)$', "", fragment) if closers else fragment
+    fragment += "".join(reversed(closers))
+    return strip_trailing_commas(fragment)
+
+
+def parse_validation_response(text: Optional[str]) -> Optional[ValidationResponse]:
+    """
+    Turn model output into a validated response, repairing it locally when needed.
+
+    Tries, in order: the extracted object as is, the repaired object, and finally salvaging
+    whatever complete validation items and summary appear in the text. Output that was cut
+    off keeps only the items whose closing brace arrived, so a correction is never returned
+    with a truncated field; such results, and salvaged ones, are marked partial.
+
+    Args:
+        text (str, optional): Raw model output
+
+    Returns:
+        Optional[ValidationResponse]: The parsed response, or None if nothing usable was found
+    """
+    if not text:
+        return None
+    fragment = extract_json_object(text)
+    if fragment is None:
+        PARSE_FALLBACKS.inc(outcome="failed")
+        return None
+
+    for repaired, candidate in ((False, fragment), (True, repair_json(fragment))):
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            try:
+                response = ValidationResponse.model_validate(parsed)
+            except ValidationError:
+                break
+            if repaired:
+                PARSE_FALLBACKS.inc(outcome="repaired")
+                if is_truncated(fragment):
+                    # The last item may have been cut mid-field; keep only the complete ones
+                    response.validation_results = [
+                        ValidationItem.model_validate(item) for item in IncrementalResultParser().feed(fragment)
+                    ]
+                    response.partial = True
+            return response
+
+    # Salvage complete items and the summary from output that could not be repaired
+    items = IncrementalResultParser().feed(fragment)
+    summary_match = _SUMMARY.search(fragment)
+    if not items and summary_match is None:
+        PARSE_FALLBACKS.inc(outcome="failed")
+        return None
+    PARSE_FALLBACKS.inc(outcome="salvaged")
+    logger.warning(f"Recovered {len(items)} validation items from malformed model output")
+    summary = ""
+    if summary_match is not None:
+        try:
+            summary = json.loads(f'"{summary_match.group(1)}"')
+        except json.JSONDecodeError:
+            summary = summary_match.group(1)
+    return ValidationResponse(summary=summary, validation_results=items, partial=True)
+
+
+class IncrementalResultParser:
+    """
+    Pull complete "validation_results" items out of model output while it is still streaming.
+
+    feed() is called with each new piece of text and returns the items whose closing brace
+    has arrived since the previous call. Scanning resumes where it stopped, so total work is
+    linear in the size of the output.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item_start: Optional[int] = None
+        self._array_closed = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Add streamed text and return newly completed validation items.
+
+        Args:
+            text (str): The next piece of model output
+
+        Returns:
+            List[Dict[str, Any]]: Items completed by this piece, in output order
+        """
+        self.buffer += text
+        items: List[Dict[str, Any]] = []
+
+        if not self._in_array:
+            key_index = self.buffer.find('"validation_results"')
+            if key_index < 0:
+                return items
+            bracket_index = self.buffer.find("[", key_index)
+            if bracket_index < 0:
+                return items
+            self._in_array = True
+            self._pos = bracket_index + 1
+
+        while self._pos < len(self.buffer) and not self._array_closed:
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._item_start = self._pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    item = self._parse_item(self.buffer[self._item_start:self._pos + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._item_start = None
+            elif char == "]" and self._depth == 0:
+                self._array_closed = True
+            self._pos += 1
+
+        return items
+
+    def _parse_item(self, fragment: str) -> Optional[Dict[str, Any]]:
+        for candidate in (fragment, repair_json(fragment)):
+            try:
+                item = ValidationItem.model_validate(json.loads(candidate))
+            except (json.JSONDecodeError, ValidationError):
+                continue
+            if item.incorrect_text.strip():
+                return item.model_dump()
+            return None
+        logger.warning("Skipping malformed validation item in streamed output")
+        return None
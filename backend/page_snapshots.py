@@ -0,0 +1,316 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urldefrag
+
+from pydantic import BaseModel
+
+from claim_cache import normalize_claim
+from state_store import shared_db_path
+from validation_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Incremental revalidation configuration
+INCREMENTAL_ENABLED = os.getenv("MEDICHECK_INCREMENTAL", "1") == "1"
+SNAPSHOT_MAX_PAGES = int(os.getenv("MEDICHECK_SNAPSHOT_MAX_PAGES", "1000"))
+SNAPSHOT_TTL = float(os.getenv("MEDICHECK_SNAPSHOT_TTL", str(6 * 60 * 60)))
+# Above this share of changed paragraphs the page is revalidated in full
+MAX_CHANGED_RATIO = float(os.getenv("MEDICHECK_INCREMENTAL_MAX_CHANGED", "0.5"))
+# Optional SQLite file; defaults to the shared state file when MEDICHECK_STATE_BACKEND=sqlite
+SNAPSHOT_DB_PATH = os.getenv("MEDICHECK_SNAPSHOT_DB") or shared_db_path()
+
+# Share of a correction's words that must appear in a paragraph for it to be attributed there
+ATTRIBUTION_OVERLAP = 0.6
+# Results that match no paragraph are kept page-wide until the next full validation
+PAGE_WIDE = ""
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split page text into non-empty paragraphs (the extension's innerText puts each block on its own line)."""
+    return [paragraph for paragraph in (" ".join(line.split()) for line in text.splitlines()) if paragraph]
+
+
+def fingerprint(paragraph: str) -> str:
+    return hashlib.sha1(normalize_text(paragraph).encode("utf-8")).hexdigest()
+
+
+def snapshot_key(url: str, scope: str) -> str:
+    """Key a page by URL without its fragment, plus anything that changes results (e.g. the model)."""
+    return hashlib.sha256(f"{scope}\x00{urldefrag(url.strip())[0]}".encode("utf-8")).hexdigest()
+
+
+class PageSnapshot(BaseModel):
+    """Paragraph fingerprints of the last validated version of a page, with the results found in each."""
+    summary: str
+    # Summary of the changes validated since the last full validation, if any
+    update_summary: str = ""
+    paragraphs: List[str]
+    results: Dict[str, List[Dict[str, str]]]
+    updated_at: float
+
+
+class RevalidationPlan(BaseModel):
+    """What a request for a previously seen URL needs: the paragraphs to validate and the snapshot to reuse."""
+    key: str
+    paragraphs: List[str]
+    fingerprints: List[str]
+    changed: List[int]
+    previous: Optional[PageSnapshot] = None
+
+    @property
+    def full(self) -> bool:
+        """True when the page must be validated in full: first visit, or too much of it changed."""
+        if self.previous is None or not self.paragraphs:
+            return True
+        return len(self.changed) / len(self.paragraphs) > MAX_CHANGED_RATIO
+
+    @property
+    def changed_text(self) -> str:
+        return "\n".join(self.paragraphs[index] for index in self.changed)
+
+
+def _attribute(items: List[Dict[str, str]], paragraphs: List[str], fingerprints: List[str]) -> Dict[str, List[Dict[str, str]]]:
+    # Assign each correction to the paragraph containing its incorrect_text, or page-wide if none does
+    normalized = [normalize_claim(paragraph) for paragraph in paragraphs]
+    word_sets = [set(paragraph.split()) for paragraph in normalized]
+    attributed: Dict[str, List[Dict[str, str]]] = {}
+    for item in items:
+        text = normalize_claim(item.get("incorrect_text", ""))
+        target = PAGE_WIDE
+        if text:
+            for index, paragraph in enumerate(normalized):
+                if text in paragraph:
+                    target = fingerprints[index]
+                    break
+            else:
+                words = set(text.split())
+                overlaps = [len(words & paragraph_words) / len(words) for paragraph_words in word_sets]
+                if overlaps and max(overlaps) >= ATTRIBUTION_OVERLAP:
+                    target = fingerprints[overlaps.index(max(overlaps))]
+        attributed.setdefault(target, []).append(item)
+    return attributed
+
+
+class PageSnapshotStore:
+    """
+    Per-URL paragraph fingerprints and results, so re-checking an updated page only validates what changed.
+
+    plan() compares the page's paragraphs with the last snapshot for its URL. If nothing
+    changed, reuse() returns the stored result; otherwise the caller validates the changed
+    paragraphs (or the whole page, when too much changed) and complete() merges that result
+    with the results of the unchanged paragraphs and stores the new snapshot. Snapshots live
+    in an in-memory LRU and, optionally, a SQLite file shared by workers; async callers use
+    aplan() and acomplete(), which do the SQLite work in a thread.
+    """
+
+    def __init__(self, max_pages: int = SNAPSHOT_MAX_PAGES, ttl_seconds: float = SNAPSHOT_TTL, db_path: Optional[str] = SNAPSHOT_DB_PATH):
+        self.max_pages = max(1, max_pages)
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+
+        self._snapshots: "OrderedDict[str, PageSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._counters = {
+            "unchanged": 0,
+            "incremental": 0,
+            "full": 0,
+            "paragraphs_reused": 0,
+            "paragraphs_validated": 0,
+        }
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS page_snapshots ("
+                "key TEXT PRIMARY KEY, snapshot TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"Page snapshots persisted to {db_path}")
+
+    def _is_expired(self, snapshot: PageSnapshot) -> bool:
+        return self.ttl_seconds > 0 and time.time() - snapshot.updated_at > self.ttl_seconds
+
+    def _get(self, key: str) -> Optional[PageSnapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+        if snapshot is None and self._db is not None:
+            with self._db_lock:
+                row = self._db.execute("SELECT snapshot FROM page_snapshots WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                snapshot = PageSnapshot.model_validate_json(row[0])
+        if snapshot is None or self._is_expired(snapshot):
+            return None
+        with self._lock:
+            self._remember(key, snapshot)
+        return snapshot
+
+    def _remember(self, key: str, snapshot: PageSnapshot) -> None:
+        # Caller must hold the lock
+        self._snapshots[key] = snapshot
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self.max_pages:
+            self._snapshots.popitem(last=False)
+
+    def plan(self, url: str, text: str, scope: str = "") -> RevalidationPlan:
+        """
+        Compare a page with the last snapshot of its URL.
+
+        Args:
+            url (str): Page URL; the fragment is ignored
+            text (str): Page text as scraped by the extension
+            scope (str): Anything besides the URL that changes results, e.g. the model name
+
+        Returns:
+            RevalidationPlan: The page's paragraphs, which of them changed, and the previous snapshot
+        """
+        key = snapshot_key(url, scope)
+        paragraphs = split_paragraphs(text)
+        fingerprints = [fingerprint(paragraph) for paragraph in paragraphs]
+        previous = self._get(key)
+        known = set(previous.paragraphs) if previous is not None else set()
+        changed = [index for index, value in enumerate(fingerprints) if value not in known]
+        return RevalidationPlan(key=key, paragraphs=paragraphs, fingerprints=fingerprints, changed=changed, previous=previous)
+
+    def _merge(self, snapshot: PageSnapshot, fingerprints: List[str]) -> Dict[str, Any]:
+        # Current paragraphs' results in page order, then page-wide ones, without repeats
+        items: List[Dict[str, str]] = []
+        seen = set()
+        for key in list(dict.fromkeys(fingerprints)) + [PAGE_WIDE]:
+            for item in snapshot.results.get(key, []):
+                marker = normalize_claim(item.get("incorrect_text", ""))
+                if marker not in seen:
+                    seen.add(marker)
+                    items.append(item)
+        summary = snapshot.summary
+        if snapshot.update_summary:
+            summary = f"{summary}\n\nLatest changes: {snapshot.update_summary}"
+        return {"summary": summary, "validation_results": items}
+
+    def reused_results(self, plan: RevalidationPlan) -> List[Dict[str, str]]:
+        """Stored results of a partly changed page's unchanged paragraphs (and page-wide ones), known before any validation."""
+        if plan.full:
+            return []
+        changed = {plan.fingerprints[index] for index in plan.changed}
+        return self._merge(plan.previous, [value for value in plan.fingerprints if value not in changed])["validation_results"]
+
+    def include_reused(self, plan: RevalidationPlan, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add reused_results() to a validation of the changed paragraphs without storing anything.
+
+        Used when that validation failed or is partial: the unchanged paragraphs' results
+        still hold, but the snapshot must not be updated from an incomplete run.
+        """
+        items = self.reused_results(plan)
+        seen = {normalize_claim(item.get("incorrect_text", "")) for item in items}
+        for item in result.get("validation_results", []):
+            if isinstance(item, dict) and normalize_claim(item.get("incorrect_text", "")) not in seen:
+                seen.add(normalize_claim(item.get("incorrect_text", "")))
+                items.append(item)
+        return {**result, "validation_results": items}
+
+    def reuse(self, plan: RevalidationPlan) -> Dict[str, Any]:
+        """Return the stored result for a page none of whose paragraphs changed."""
+        with self._lock:
+            self._counters["unchanged"] += 1
+            self._counters["paragraphs_reused"] += len(plan.paragraphs)
+        return self._merge(plan.previous, plan.fingerprints)
+
+    def complete(self, plan: RevalidationPlan, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Merge the validation of a plan's changed paragraphs (or of the whole page) with the reused results and store it.
+
+        Args:
+            plan (RevalidationPlan): Plan returned by plan()
+            result (Dict[str, Any]): Successful validation result in the summary/validation_results schema
+
+        Returns:
+            Dict[str, Any]: Result for the whole current page in the same schema
+        """
+        items = [item for item in result.get("validation_results", []) if isinstance(item, dict)]
+        summary = str(result.get("summary", ""))
+        if plan.full:
+            snapshot = PageSnapshot(
+                summary=summary,
+                paragraphs=plan.fingerprints,
+                results=_attribute(items, plan.paragraphs, plan.fingerprints),
+                updated_at=time.time(),
+            )
+            validated = len(plan.paragraphs)
+        else:
+            changed = set(plan.changed)
+            current = set(plan.fingerprints)
+            results = {key: value for key, value in plan.previous.results.items() if key in current or key == PAGE_WIDE}
+            new_results = _attribute(
+                items,
+                [plan.paragraphs[index] for index in plan.changed],
+                [plan.fingerprints[index] for index in plan.changed],
+            )
+            for key, value in new_results.items():
+                results[key] = results.get(key, []) + value if key == PAGE_WIDE else value
+            snapshot = PageSnapshot(
+                summary=plan.previous.summary,
+                update_summary=summary,
+                paragraphs=plan.fingerprints,
+                results=results,
+                updated_at=time.time(),
+            )
+            validated = len(changed)
+
+        with self._lock:
+            self._counters["full" if plan.full else "incremental"] += 1
+            self._counters["paragraphs_validated"] += validated
+            self._counters["paragraphs_reused"] += len(plan.paragraphs) - validated
+            self._remember(plan.key, snapshot)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO page_snapshots (key, snapshot, updated_at) VALUES (?, ?, ?)",
+                    (plan.key, snapshot.model_dump_json(), snapshot.updated_at)
+                )
+                self._db.commit()
+        return self._merge(snapshot, plan.fingerprints)
+
+    async def aplan(self, url: str, text: str, scope: str = "") -> RevalidationPlan:
+        """Async plan(); runs in a thread when snapshots are persisted."""
+        if self._db is None:
+            return self.plan(url, text, scope)
+        return await asyncio.to_thread(self.plan, url, text, scope)
+
+    async def acomplete(self, plan: RevalidationPlan, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Async complete(); runs in a thread when snapshots are persisted."""
+        if self._db is None:
+            return self.complete(plan, result)
+        return await asyncio.to_thread(self.complete, plan, result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            paragraphs = self._counters["paragraphs_reused"] + self._counters["paragraphs_validated"]
+            return {
+                **self._counters,
+                "pages": len(self._snapshots),
+                "reuse_ratio": round(self._counters["paragraphs_reused"] / paragraphs, 4) if paragraphs else 0.0,
+                "persistent": self._db is not None,
+            }
+
+
+_page_snapshots: Optional[PageSnapshotStore] = None
+_page_snapshots_lock = threading.Lock()
+
+
+def get_page_snapshots() -> PageSnapshotStore:
+    """Return the process-wide page snapshot store, building it on first use."""
+    global _page_snapshots
+    with _page_snapshots_lock:
+        if _page_snapshots is None:
+            _page_snapshots = PageSnapshotStore()
+        return _page_snapshots
@@ -0,0 +1,228 @@
+import os
+import re
+import logging
+from typing import Dict, List, Tuple
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Prompt token budgets; sections are trimmed to these before the prompt is assembled
+PROMPT_MAX_TOKENS = int(os.getenv("MEDICHECK_PROMPT_MAX_TOKENS", "16000"))
+PROMPT_CONTENT_TOKENS = int(os.getenv("MEDICHECK_PROMPT_CONTENT_TOKENS", "8000"))
+PROMPT_SOURCE_TOKENS = int(os.getenv("MEDICHECK_PROMPT_SOURCE_TOKENS", "4000"))
+PROMPT_INSTRUCTION_TOKENS = int(os.getenv("MEDICHECK_PROMPT_INSTRUCTION_TOKENS", "400"))
+
+# Word pieces and punctuation; long words cost roughly one token per four characters
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?\n])(\s+)")
+TRUNCATION_MARK = " [...]"
+
+# Static sections, assembled once at import instead of on every call
+_QUERY_SECTION = "USER QUERY: {query}\n\nCUSTOM INSTRUCTIONS: {instructions}\n\nSEARCH RESULTS FROM DIFFERENT SOURCES:\n\n"
+_SOURCE_SECTION = "--- {source} ---\n{result}\n\n"
+RESPONSE_INSTRUCTIONS = """Based on the user query and all the search results provided above, please:
+1. Analyze the accuracy of any claims in the query
+2. Provide accurate medical information based on reliable sources
+3. Cite specific sources when possible
+4. Present a well-structured, comprehensive response that directly addresses the query
+5. Follow the custom instructions provided above
+
+IMPORTANT: Your response must be in valid JSON format with this exact structure:
+{
+  "summary": "<summary_of_correct_info>",
+  "validation_results": [
+    {
+      "incorrect_text": "<highlighted_incorrect_text>",
+      "correct_text": "<corrected_or_verified_text>"
+    },
+    ...
+  ]
+}
+
+Where:
+- "summary" is a concise summary of the content with factually correct information
+- "validation_results" is an array of objects, each containing:
+  - "incorrect_text": the specific claim or statement from the query that is incorrect
+  - "correct_text": the factually correct information that should replace it
+
+Only include statements in "validation_results" if they are actually incorrect. If a statement is correct, don't include it in the array.
+Make sure your JSON is properly formatted with no syntax errors.
+
+IMPORTANT: Don't wrap the JSON in a code block or use ```json markers. Just return the raw JSON object.
+
+JSON RESPONSE:
+"""
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with a local, tokenizer-free approximation of the model's subword tokenizer.
+
+    Args:
+        text (str): Any text
+
+    Returns:
+        int: Approximate token count; words up to four characters and punctuation count as one token
+    """
+    return sum(1 + (len(piece) - 1) // 4 for piece in _TOKEN.findall(text))
+
+
+_STATIC_TOKENS = count_tokens(_QUERY_SECTION.format(query="", instructions="")) + count_tokens(RESPONSE_INSTRUCTIONS)
+
+
+def trim_to_tokens(text: str, budget: int) -> Tuple[str, int]:
+    """
+    Cut text to at most budget tokens, ending on a sentence or line boundary where possible.
+
+    Args:
+        text (str): Text to trim
+        budget (int): Maximum tokens to keep
+
+    Returns:
+        Tuple[str, int]: The trimmed text and its token count
+    """
+    tokens = count_tokens(text)
+    if tokens <= budget:
+        return text, tokens
+    if budget <= 0:
+        return "", 0
+
+    budget -= count_tokens(TRUNCATION_MARK)
+    # Odd items are the original separators, so kept text keeps its line breaks
+    pieces = _SENTENCE_END.split(text)
+    kept = ""
+    used = 0
+    for index in range(0, len(pieces), 2):
+        sentence = pieces[index]
+        cost = count_tokens(sentence)
+        if used + cost > budget:
+            if not kept:
+                # A single sentence longer than the budget is cut word by word
+                words: List[str] = []
+                for word in sentence.split(" "):
+                    word_cost = count_tokens(word)
+                    if used + word_cost > budget:
+                        break
+                    words.append(word)
+                    used += word_cost
+                kept = " ".join(words)
+            break
+        kept += (pieces[index - 1] if index else "") + sentence
+        used += cost
+    trimmed = kept.rstrip() + TRUNCATION_MARK
+    return trimmed, count_tokens(trimmed)
+
+
+def _is_low_value(result: str) -> bool:
+    return result.startswith("[TIMED OUT]") or result.startswith("Error searching")
+
+
+def _allocate(sizes: Dict[str, int], budget: int) -> Dict[str, int]:
+    """Share a budget between sections: small sections keep everything, the rest split what remains evenly."""
+    allocation: Dict[str, int] = {}
+    remaining = budget
+    pending = sorted(sizes, key=lambda name: sizes[name])
+    while pending:
+        share = remaining // len(pending)
+        name = pending[0]
+        if sizes[name] > share:
+            for name in pending:
+                allocation[name] = share
+            break
+        allocation[name] = sizes[name]
+        remaining -= sizes[name]
+        pending.pop(0)
+    return allocation
+
+
+class BuiltPrompt(BaseModel):
+    """An assembled prompt with its token accounting."""
+    text: str
+    tokens: int
+    section_tokens: Dict[str, int]
+    trimmed_tokens: Dict[str, int]
+
+
+def build_synthesis_prompt(query: str, search_results: Dict[str, str], custom_instructions: str,
+                           max_tokens: int = PROMPT_MAX_TOKENS, content_tokens: int = PROMPT_CONTENT_TOKENS,
+                           source_tokens: int = PROMPT_SOURCE_TOKENS,
+                           instruction_tokens: int = PROMPT_INSTRUCTION_TOKENS) -> BuiltPrompt:
+    """
+    Assemble the synthesis prompt within per-section token budgets.
+
+    Lowest-value text is trimmed first: failed or timed-out sources, then the longest source
+    results, then the end of the page content. Custom instructions only lose what exceeds
+    their own budget.
+
+    Args:
+        query (str): Validation query (page metadata and content)
+        search_results (Dict[str, str]): Results keyed by source name
+        custom_instructions (str): Instructions for this call
+        max_tokens (int): Budget for the whole prompt
+        content_tokens (int): Budget for the query
+        source_tokens (int): Budget shared by all source results
+        instruction_tokens (int): Budget for the custom instructions
+
+    Returns:
+        BuiltPrompt: Prompt text, total tokens, and tokens used and trimmed per section
+    """
+    trimmed = {"instructions": 0, "sources": 0, "content": 0}
+
+    instructions, instructions_used = trim_to_tokens(custom_instructions.strip(), instruction_tokens)
+    trimmed["instructions"] = count_tokens(custom_instructions) - instructions_used
+
+    # Page content is worth more than source results, so it is budgeted first
+    available = max(0, max_tokens - _STATIC_TOKENS - instructions_used)
+    query_tokens = count_tokens(query)
+    content_budget = min(content_tokens, query_tokens, available)
+    source_budget = min(source_tokens, available - content_budget)
+
+    # Failed sources only get a one-line note; the rest share the source budget
+    sources: Dict[str, str] = {}
+    source_sizes: Dict[str, int] = {}
+    for source, result in search_results.items():
+        result = str(result)
+        if _is_low_value(result):
+            note, _ = trim_to_tokens(result.splitlines()[0] if result else result, 40)
+            trimmed["sources"] += count_tokens(result) - count_tokens(note)
+            result = note
+        sources[source] = result
+        source_sizes[source] = count_tokens(_SOURCE_SECTION.format(source=source, result=result))
+
+    allocation = _allocate(source_sizes, source_budget)
+    source_parts: List[str] = []
+    sources_used = 0
+    for source, result in sources.items():
+        overhead = count_tokens(_SOURCE_SECTION.format(source=source, result=""))
+        if allocation[source] >= source_sizes[source]:
+            kept = result
+        else:
+            kept, _ = trim_to_tokens(result, allocation[source] - overhead)
+            trimmed["sources"] += count_tokens(result) - count_tokens(kept)
+        section = _SOURCE_SECTION.format(source=source, result=kept)
+        source_parts.append(section)
+        sources_used += count_tokens(section)
+
+    content, content_used = trim_to_tokens(query, content_budget)
+    trimmed["content"] = query_tokens - content_used
+
+    text = "".join([
+        _QUERY_SECTION.format(query=content, instructions=instructions),
+        *source_parts,
+        RESPONSE_INSTRUCTIONS,
+    ])
+    prompt = BuiltPrompt(
+        text=text,
+        tokens=count_tokens(text),
+        section_tokens={
+            "static": _STATIC_TOKENS,
+            "instructions": instructions_used,
+            "sources": sources_used,
+            "content": content_used,
+        },
+        trimmed_tokens=trimmed,
+    )
+    if any(trimmed.values()):
+        logger.info(f"Prompt trimmed to {prompt.tokens} tokens - trimmed per section: {trimmed}")
+    return prompt
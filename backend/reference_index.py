@@ -0,0 +1,237 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from validation_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Reference index configuration; without a path the index only lives for the lifetime of the process
+REFERENCE_DB_PATH = os.getenv("MEDICHECK_REFERENCE_DB")
+# Set to 0 to never fall back to the live Wikipedia API (offline deployments, load tests)
+WIKIPEDIA_LIVE_FALLBACK = os.getenv("MEDICHECK_WIKIPEDIA_LIVE", "1") == "1"
+
+# Only the first distinctive terms of a query are used to find candidate articles
+MAX_QUERY_TERMS = 64
+MAX_CANDIDATES = 20
+
+_TERM = re.compile(r"[a-z0-9][a-z0-9-]+")
+_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has his how its may new now "
+    "see two who did get let put say she too use this that with have from they will been were what "
+    "when your said each which their there about would these other into more some than them then "
+    "only also very just over such most like many must should could after before being because "
+    "title url metadata description keywords author open graph available main content medical".split()
+)
+
+
+def _stem(term: str) -> str:
+    # Crude plural folding so "vaccines" in a page matches the article "Vaccine"
+    return term[:-1] if len(term) > 4 and term.endswith("s") and not term.endswith("ss") else term
+
+
+def _query_terms(text: str) -> List[str]:
+    terms: List[str] = []
+    seen = set()
+    for term in _TERM.findall(normalize_text(text).lower()):
+        if term in _STOPWORDS or term in seen:
+            continue
+        seen.add(term)
+        terms.append(term)
+        if len(terms) >= MAX_QUERY_TERMS:
+            break
+    return terms
+
+
+class ReferenceIndex:
+    """
+    On-disk index of medical article summaries backed by SQLite FTS5.
+
+    lookup() returns the best article whose title terms all occur in the query. Repeat
+    queries are answered from a query memo without touching the full-text index.
+    """
+
+    def __init__(self, db_path: Optional[str] = REFERENCE_DB_PATH):
+        self.db_path = db_path or ":memory:"
+        self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "memo_hits": 0}
+
+        with self._lock:
+            if self.db_path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                "id INTEGER PRIMARY KEY, title TEXT UNIQUE NOT NULL, summary TEXT NOT NULL, url TEXT NOT NULL)"
+            )
+            # Full-text index over the same rows, keyed by articles.id
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5("
+                "title, summary, tokenize='porter unicode61')"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_memo ("
+                "query_key TEXT PRIMARY KEY, title TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def _query_key(query: str) -> str:
+        return hashlib.sha1(normalize_text(query).lower().encode("utf-8")).hexdigest()
+
+    def _article_by_title(self, title: str) -> Optional[Dict[str, str]]:
+        row = self._db.execute(
+            "SELECT title, summary, url FROM articles WHERE title = ? LIMIT 1", (title,)
+        ).fetchone()
+        return {"title": row[0], "summary": row[1], "url": row[2]} if row else None
+
+    def lookup(self, query: str) -> Optional[Dict[str, str]]:
+        """
+        Find the indexed article that best matches a query.
+
+        Args:
+            query (str): Free-text query, typically the validation text
+
+        Returns:
+            Optional[Dict[str, str]]: Article with title, summary and url, or None on a miss
+        """
+        query_key = self._query_key(query)
+        with self._lock:
+            memo = self._db.execute("SELECT title FROM query_memo WHERE query_key = ?", (query_key,)).fetchone()
+            if memo is not None:
+                article = self._article_by_title(memo[0])
+                if article is not None:
+                    self._counters["hits"] += 1
+                    self._counters["memo_hits"] += 1
+                    return article
+
+            terms = _query_terms(query)
+            if not terms:
+                self._counters["misses"] += 1
+                return None
+
+            match = " OR ".join(f'"{term}"' for term in terms)
+            rows = self._db.execute(
+                "SELECT a.title, a.summary, a.url FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+                "WHERE articles_fts MATCH ? ORDER BY articles_fts.rank LIMIT ?",
+                (f"title : ({match})", MAX_CANDIDATES)
+            ).fetchall()
+
+            # Only accept articles whose whole title is mentioned in the query; a single shared word is not enough
+            term_set = {_stem(term) for term in _TERM.findall(normalize_text(query).lower())}
+            best = None
+            for title, summary, url in rows:
+                title_terms = [_stem(term) for term in _TERM.findall(title.lower())]
+                if title_terms and all(term in term_set for term in title_terms):
+                    if best is None or len(title_terms) > len(_TERM.findall(best[0].lower())):
+                        best = (title, summary, url)
+
+            if best is None:
+                self._counters["misses"] += 1
+                return None
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_memo (query_key, title, created_at) VALUES (?, ?, ?)",
+                (query_key, best[0], time.time())
+            )
+            self._db.commit()
+            self._counters["hits"] += 1
+            return {"title": best[0], "summary": best[1], "url": best[2]}
+
+    def add(self, title: str, summary: str, url: str, query: Optional[str] = None) -> None:
+        """Insert or replace an article, optionally remembering the query that found it."""
+        with self._lock:
+            self._upsert(title, summary, url)
+            if query is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_memo (query_key, title, created_at) VALUES (?, ?, ?)",
+                    (self._query_key(query), title, time.time())
+                )
+            self._db.commit()
+
+    def load_dump(self, path: str, batch_size: int = 1000) -> int:
+        """
+        Bulk-load articles from a JSON Lines dump with "title", "summary" and "url" fields.
+
+        Args:
+            path (str): Path of the dump file
+            batch_size (int): Rows inserted per transaction
+
+        Returns:
+            int: Number of articles loaded
+        """
+        loaded = 0
+        batch = []
+        with open(path, encoding="utf-8") as dump:
+            for line in dump:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if not record.get("title") or not record.get("summary"):
+                    continue
+                batch.append((record["title"], record["summary"], record.get("url", "")))
+                if len(batch) >= batch_size:
+                    loaded += self._insert_batch(batch)
+                    batch = []
+        if batch:
+            loaded += self._insert_batch(batch)
+        logger.info(f"Loaded {loaded} reference articles from {path}")
+        return loaded
+
+    def _insert_batch(self, batch: List[tuple]) -> int:
+        with self._lock:
+            for title, summary, url in batch:
+                self._upsert(title, summary, url)
+            self._db.commit()
+        return len(batch)
+
+    def _upsert(self, title: str, summary: str, url: str) -> None:
+        # Caller must hold the lock and commit
+        row = self._db.execute("SELECT id FROM articles WHERE title = ?", (title,)).fetchone()
+        if row is not None:
+            article_id = row[0]
+            self._db.execute("UPDATE articles SET summary = ?, url = ? WHERE id = ?", (summary, url, article_id))
+            self._db.execute("DELETE FROM articles_fts WHERE rowid = ?", (article_id,))
+        else:
+            article_id = self._db.execute(
+                "INSERT INTO articles (title, summary, url) VALUES (?, ?, ?)", (title, summary, url)
+            ).lastrowid
+        self._db.execute("INSERT INTO articles_fts (rowid, title, summary) VALUES (?, ?, ?)", (article_id, title, summary))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            articles = self._db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            return {**self._counters, "articles": articles}
+
+
+_reference_index: Optional[ReferenceIndex] = None
+_reference_index_lock = threading.Lock()
+
+
+def get_reference_index() -> ReferenceIndex:
+    """Return the process-wide reference index, opening it on first use."""
+    global _reference_index
+    with _reference_index_lock:
+        if _reference_index is None:
+            _reference_index = ReferenceIndex()
+        return _reference_index
+
+
+# Load a dump into the configured index: python reference_index.py load articles.jsonl
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "load":
+        print("Usage: python reference_index.py load <dump.jsonl>  (target set by MEDICHECK_REFERENCE_DB)")
+        sys.exit(1)
+    if not REFERENCE_DB_PATH:
+        print("Set MEDICHECK_REFERENCE_DB to the index file to load into")
+        sys.exit(1)
+    count = get_reference_index().load_dump(sys.argv[2])
+    print(f"Loaded {count} articles into {REFERENCE_DB_PATH}")
@@ -0,0 +1,362 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import contextlib
+import threading
+import contextvars
+import concurrent.futures
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from metrics import BREAKER_STATE, RESILIENCE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Retries: attempts per call (1 disables retrying) and the backoff before each retry,
+# drawn uniformly from 0 to base * 2^(attempt - 1), capped at RETRY_MAX_DELAY ("full jitter")
+RETRY_ATTEMPTS = int(os.getenv("MEDICHECK_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("MEDICHECK_RETRY_BASE_DELAY", "0.2"))
+RETRY_MAX_DELAY = 2.0
+# Dependencies that get a hedged duplicate request once an attempt runs longer than their recent p95.
+# Hedging a model call doubles its token cost, so only Wikipedia is hedged unless configured otherwise.
+HEDGED_DEPENDENCIES = {name.strip() for name in os.getenv("MEDICHECK_HEDGE", "wikipedia").split(",") if name.strip()}
+# Circuit breakers: consecutive failures that open a breaker, and seconds before it lets a trial call through
+BREAKER_FAILURES = int(os.getenv("MEDICHECK_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("MEDICHECK_BREAKER_RESET", "30"))
+
+# Latencies kept per dependency for the hedge delay, and how many are needed before hedging starts
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_QUANTILE = 0.95
+
+# Threads per dependency for sync attempts, which run in a pool so they can be bounded by a deadline
+# and hedged. Each dependency has its own pool, so attempts left running against a slow dependency
+# cannot starve the others
+ATTEMPT_WORKERS = int(os.getenv("MEDICHECK_ATTEMPT_WORKERS", "32"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} is unavailable (circuit open); retry in {retry_after:.0f}s")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+def default_retryable(error: BaseException) -> bool:
+    """Transient failures (timeouts, connection and server errors) are retried; programming and input errors are not."""
+    return isinstance(error, Exception) and not isinstance(error, (CircuitOpenError, ValueError, TypeError, KeyError, AttributeError))
+
+
+class CircuitBreaker:
+    """
+    Stop calling a dependency that keeps failing.
+
+    Closed: calls go through, and failure_threshold consecutive failures open the breaker.
+    Open: calls fail fast with CircuitOpenError until reset_timeout has passed. Half-open:
+    one trial call goes through; its success closes the breaker, its failure reopens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.set(0, dependency=name)
+
+    def _set_state(self, state: str) -> None:
+        # Caller must hold the lock
+        if state != self.state:
+            logger.warning(f"Circuit breaker for {self.name}: {self.state} -> {state}")
+            if state == self.OPEN:
+                RESILIENCE_EVENTS.inc(dependency=self.name, event="breaker_opened")
+        self.state = state
+        BREAKER_STATE.set(self._STATE_VALUES[state], dependency=self.name)
+
+    def allow(self) -> None:
+        """Return if a call may go ahead, otherwise raise CircuitOpenError."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self._trial_running):
+                self._trial_running = self.state == self.HALF_OPEN
+                return
+            RESILIENCE_EVENTS.inc(dependency=self.name, event="short_circuit")
+            raise CircuitOpenError(self.name, max(0.0, self._opened_at + self.reset_timeout - time.monotonic()))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+            self._trial_running = False
+
+    def release(self) -> None:
+        """Give up an allowed call without an outcome (e.g. it was cancelled), so the next caller can run the trial."""
+        with self._lock:
+            self._trial_running = False
+
+
+class Dependency:
+    """
+    Resilient calls to one external dependency: retries with jittered backoff inside a
+    deadline, optional hedged requests, and a circuit breaker.
+
+    Each attempt is bounded by attempt_timeout and by what is left of the call's deadline;
+    a retry is only started if its backoff ends before the deadline. With hedging on, an
+    attempt still running after the dependency's recent p95 latency gets a duplicate
+    request, and whichever answers first wins (a sync loser runs to completion in the
+    background; an async loser is cancelled). The breaker is consulted once per call and
+    a call whose retries all fail counts as one failure; exceptions that retryable()
+    rejects mean the dependency answered and are passed straight through. Calls that cannot
+    be retried, such as a streamed response, are guarded by the breaker alone via guard().
+    """
+
+    def __init__(self, name: str, deadline: float, attempt_timeout: Optional[float] = None, attempts: int = RETRY_ATTEMPTS,
+                 hedge: Optional[bool] = None, retryable: Callable[[BaseException], bool] = default_retryable,
+                 base_delay: float = RETRY_BASE_DELAY, breaker: Optional[CircuitBreaker] = None, max_workers: int = ATTEMPT_WORKERS):
+        self.name = name
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout or deadline
+        self.attempts = max(1, attempts)
+        self.hedge = name in HEDGED_DEPENDENCIES if hedge is None else hedge
+        self.retryable = retryable
+        self.base_delay = base_delay
+        self.breaker = breaker or CircuitBreaker(name)
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=f"medicheck-{name}")
+
+    def _observe(self, elapsed: float) -> None:
+        with self._lock:
+            self._latencies.append(elapsed)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Recent p95 latency, after which an attempt is hedged; None when hedging is off or there is too little data."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * HEDGE_QUANTILE))]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(RETRY_MAX_DELAY, self.base_delay * 2 ** (attempt - 1)))
+
+    def _after_failure(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        # Returns the delay before retrying, or None to give up; the breaker only hears about the call once it gives up
+        if not self.retryable(error):
+            # The dependency answered (e.g. "no such page"), so it counts as up
+            self._record_outcome(error)
+            return None
+        delay = self._backoff(attempt)
+        if attempt >= self.attempts or time.monotonic() + delay >= deadline or self.breaker.state == CircuitBreaker.OPEN:
+            self._record_outcome(error)
+            return None
+        RESILIENCE_EVENTS.inc(dependency=self.name, event="timeout" if isinstance(error, TimeoutError) else "failure")
+        RESILIENCE_EVENTS.inc(dependency=self.name, event="retry")
+        logger.warning(f"{self.name} attempt {attempt} failed ({type(error).__name__}: {error}); retrying in {delay:.2f}s")
+        return delay
+
+    def _record_outcome(self, error: Exception) -> None:
+        # Records a failed call that is not retried
+        if not self.retryable(error):
+            self.breaker.record_success()
+            return
+        self.breaker.record_failure()
+        RESILIENCE_EVENTS.inc(dependency=self.name, event="timeout" if isinstance(error, TimeoutError) else "failure")
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Guard one call that cannot be retried or hedged (e.g. a streamed response) with the circuit breaker.
+
+        Raises:
+            CircuitOpenError: On entry, if the breaker is open
+        """
+        self.breaker.allow()
+        try:
+            yield
+        except Exception as e:
+            self._record_outcome(e)
+            raise
+        except BaseException:
+            # Cancelled or closed early: no verdict on the dependency
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Call a blocking function with retries, hedging and the circuit breaker.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, so callers can return a degraded result
+            Exception: The last attempt's error once retries or the deadline run out
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        self.breaker.allow()
+        try:
+            while True:
+                attempt += 1
+                try:
+                    result = self._attempt(func, args, kwargs, min(self.attempt_timeout, deadline - time.monotonic()))
+                except Exception as e:
+                    delay = self._after_failure(e, attempt, deadline)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return result
+        except Exception:
+            raise
+        except BaseException:
+            # Cancelled: no verdict on the dependency
+            self.breaker.release()
+            raise
+
+    def _attempt(self, func: Callable[..., T], args: tuple, kwargs: Dict[str, Any], timeout: float) -> T:
+        started = time.monotonic()
+        ends = started + max(0.0, timeout)
+        # Each submission gets its own copy of the context, so trace spans nest under the caller
+        primary = self._executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+        pending = {primary}
+        hedge_delay = self.hedge_delay()
+        if hedge_delay is not None and started + hedge_delay < ends:
+            done, _ = concurrent.futures.wait(pending, timeout=hedge_delay)
+            if not done:
+                RESILIENCE_EVENTS.inc(dependency=self.name, event="hedge")
+                pending.add(self._executor.submit(contextvars.copy_context().run, func, *args, **kwargs))
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=max(0.0, ends - time.monotonic()),
+                                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"{self.name} did not answer within {timeout:.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        RESILIENCE_EVENTS.inc(dependency=self.name, event="hedge_won")
+                    self._observe(time.monotonic() - started)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """Async counterpart of call(); factory() starts one attempt and is called again for retries and hedges."""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        self.breaker.allow()
+        try:
+            while True:
+                attempt += 1
+                try:
+                    result = await self._aattempt(factory, min(self.attempt_timeout, deadline - time.monotonic()))
+                except Exception as e:
+                    delay = self._after_failure(e, attempt, deadline)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return result
+        except Exception:
+            raise
+        except BaseException:
+            # Cancelled: no verdict on the dependency
+            self.breaker.release()
+            raise
+
+    async def _aattempt(self, factory: Callable[[], Awaitable[T]], timeout: float) -> T:
+        started = time.monotonic()
+        ends = started + max(0.0, timeout)
+        primary = asyncio.ensure_future(factory())
+        pending = {primary}
+        try:
+            hedge_delay = self.hedge_delay()
+            if hedge_delay is not None and started + hedge_delay < ends:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    RESILIENCE_EVENTS.inc(dependency=self.name, event="hedge")
+                    pending.add(asyncio.ensure_future(factory()))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, ends - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{self.name} did not answer within {timeout:.1f}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            RESILIENCE_EVENTS.inc(dependency=self.name, event="hedge_won")
+                        self._observe(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        hedge_delay = self.hedge_delay()
+        with self._lock:
+            samples = len(self._latencies)
+        return {
+            "breaker": self.breaker.state,
+            "hedging": self.hedge,
+            "hedge_delay_s": round(hedge_delay, 3) if hedge_delay is not None else None,
+            "latency_samples": samples,
+        }
+
+
+_dependencies: Dict[str, Dependency] = {}
+_dependencies_lock = threading.Lock()
+
+
+def get_dependency(name: str, **settings: Any) -> Dependency:
+    """
+    Return the process-wide Dependency for name, creating it with settings on first use.
+
+    Args:
+        name (str): Dependency name used in metrics, logs and MEDICHECK_HEDGE
+        **settings: Dependency constructor arguments; deadline is required on first use
+
+    Returns:
+        Dependency: Shared by every caller, so they share one breaker and latency history
+    """
+    with _dependencies_lock:
+        dependency = _dependencies.get(name)
+        if dependency is None:
+            dependency = Dependency(name, **settings)
+            _dependencies[name] = dependency
+        return dependency
+
+
+def dependency_stats() -> Dict[str, Dict[str, Any]]:
+    with _dependencies_lock:
+        dependencies: List[Dependency] = list(_dependencies.values())
+    return {dependency.name: dependency.stats() for dependency in dependencies}
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight computation.
+
+    The first caller for a key (the leader) starts the work; callers arriving while it is
+    running (followers) wait for the same result instead of repeating it. The work runs as
+    its own task, so a caller that goes away does not cancel it for everyone else.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._async_calls: Dict[Tuple[int, str], "asyncio.Future[Any]"] = {}
+        self._sync_calls: Dict[str, Tuple[threading.Event, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run factory() for key unless an identical call is already in flight, then share its result.
+
+        Args:
+            key (str): Identity of the computation
+            factory (Callable[[], Awaitable[T]]): Starts the computation; only called by the leader
+
+        Returns:
+            T: The computation's result (exceptions propagate to every waiting caller)
+        """
+        # Futures belong to an event loop, so calls are only coalesced within the same loop
+        flight_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._async_calls.get(flight_key)
+            if task is None:
+                task = asyncio.ensure_future(factory())
+                self._async_calls[flight_key] = task
+                task.add_done_callback(lambda _: self._forget(flight_key, task))
+                self._counters["leaders"] += 1
+            else:
+                self._counters["followers"] += 1
+                logger.info(f"{self.name}: joining in-flight call {key[:12]}")
+        return await asyncio.shield(task)
+
+    def _forget(self, flight_key: Tuple[int, str], task: "asyncio.Future[Any]") -> None:
+        with self._lock:
+            if self._async_calls.get(flight_key) is task:
+                del self._async_calls[flight_key]
+
+    def do_sync(self, key: str, func: Callable[[], T]) -> T:
+        """Thread-based counterpart of do() for synchronous callers."""
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = (threading.Event(), {})
+                self._sync_calls[key] = call
+                self._counters["leaders"] += 1
+            else:
+                self._counters["followers"] += 1
+        done, outcome = call
+
+        if leader:
+            try:
+                outcome["result"] = func()
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                with self._lock:
+                    del self._sync_calls[key]
+                done.set()
+        else:
+            logger.info(f"{self.name}: joining in-flight call {key[:12]}")
+            done.wait()
+
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self._counters["leaders"] + self._counters["followers"]
+            return {
+                **self._counters,
+                "in_flight": len(self._async_calls) + len(self._sync_calls),
+                "coalesced_ratio": round(self._counters["followers"] / calls, 4) if calls else 0.0,
+            }
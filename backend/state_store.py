@@ -0,0 +1,181 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Where state shared between requests lives: "memory" (one worker process) or "sqlite"
+# (a file every worker on the host opens, so uvicorn --workers N keeps chat continuity)
+STATE_BACKEND = os.getenv("MEDICHECK_STATE_BACKEND", "memory").lower()
+STATE_DB_PATH = os.getenv("MEDICHECK_STATE_DB", "medicheck_state.db")
+# How long a worker's claim on an in-flight validation lasts before another worker may take it over
+LEASE_TTL = float(os.getenv("MEDICHECK_LEASE_TTL", "120"))
+
+# Seconds between checks while another worker finishes a validation
+LEASE_POLL_INTERVAL = 0.05
+
+
+def shared_db_path() -> Optional[str]:
+    """Return the shared state file when the sqlite backend is selected, else None."""
+    if STATE_BACKEND == "memory":
+        return None
+    if STATE_BACKEND == "sqlite":
+        return STATE_DB_PATH
+    raise ValueError(f"Unknown state backend '{STATE_BACKEND}' (expected 'memory' or 'sqlite')")
+
+
+def connect_state_db(db_path: str) -> sqlite3.Connection:
+    """
+    Open a SQLite file for state shared by several worker processes.
+
+    The connection runs in autocommit mode so callers control transactions with
+    write_transaction(); WAL lets readers proceed while another worker writes.
+    """
+    db = sqlite3.connect(db_path, timeout=10, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+@contextmanager
+def write_transaction(db: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run a read-modify-write as one transaction that holds the file's write lock throughout."""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
+
+class LeaseTable:
+    """
+    Cross-process claims on in-flight work, stored in the shared state file.
+
+    SingleFlight coalesces identical calls inside one worker; a lease extends that across
+    workers. The worker holding the lease for a key computes the result and publishes it
+    (for validations, to the shared cache); other workers wait for it to appear. A lease
+    not released within ttl_seconds, e.g. because its worker died, can be taken over.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = LEASE_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._db = connect_state_db(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS inflight_leases ("
+            "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._counters = {"acquired": 0, "waited": 0, "shared_results": 0, "takeovers": 0}
+
+    def acquire(self, key: str) -> bool:
+        """Claim key for this worker; False while another worker holds an unexpired lease on it."""
+        now = time.time()
+        with self._lock, write_transaction(self._db):
+            row = self._db.execute("SELECT owner, expires_at FROM inflight_leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                return False
+            if row is not None:
+                self._counters["takeovers"] += 1
+                logger.warning(f"Taking over expired lease on {key[:12]} from worker {row[0]}")
+            self._db.execute(
+                "INSERT OR REPLACE INTO inflight_leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, self._owner, now + self.ttl_seconds)
+            )
+            self._counters["acquired"] += 1
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM inflight_leases WHERE key = ? AND owner = ?", (key, self._owner))
+
+    def _try(self, key: str, lookup: Callable[[], Optional[Any]]) -> Optional[Dict[str, Any]]:
+        # One step of waiting: the published result, the lease, or None to keep waiting
+        result = lookup()
+        if result is None and self.acquire(key):
+            # The previous holder may have published and released between the lookup and the acquire
+            result = lookup()
+            if result is None:
+                return {"leader": True, "result": None}
+            self.release(key)
+        if result is not None:
+            with self._lock:
+                self._counters["shared_results"] += 1
+            return {"leader": False, "result": result}
+        return None
+
+    @contextmanager
+    def flight(self, key: str, lookup: Callable[[], Optional[Any]]) -> Iterator[Optional[Any]]:
+        """
+        Hold the lease on key for the with-block, or yield the result another worker published.
+
+        Args:
+            key (str): Identity of the computation, e.g. a validation cache key
+            lookup (Callable[[], Optional[Any]]): Reads the published result, None if not there yet
+
+        Yields:
+            Optional[Any]: The other worker's result, or None when this worker should compute it
+        """
+        outcome = self._try(key, lookup)
+        if outcome is None:
+            with self._lock:
+                self._counters["waited"] += 1
+            logger.info(f"Waiting for another worker to finish {key[:12]}")
+        while outcome is None:
+            time.sleep(LEASE_POLL_INTERVAL)
+            outcome = self._try(key, lookup)
+        if not outcome["leader"]:
+            yield outcome["result"]
+            return
+        try:
+            yield None
+        finally:
+            self.release(key)
+
+    @asynccontextmanager
+    async def aflight(self, key: str, lookup: Callable[[], Optional[Any]]) -> AsyncIterator[Optional[Any]]:
+        """Async counterpart of flight(); SQLite calls run in a thread so the event loop keeps serving."""
+        outcome = await asyncio.to_thread(self._try, key, lookup)
+        if outcome is None:
+            with self._lock:
+                self._counters["waited"] += 1
+            logger.info(f"Waiting for another worker to finish {key[:12]}")
+        while outcome is None:
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+            outcome = await asyncio.to_thread(self._try, key, lookup)
+        if not outcome["leader"]:
+            yield outcome["result"]
+            return
+        try:
+            yield None
+        finally:
+            await asyncio.to_thread(self.release, key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            held = self._db.execute("SELECT COUNT(*) FROM inflight_leases WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+            return {**self._counters, "held": held}
+
+
+_lease_table: Optional[LeaseTable] = None
+_lease_table_lock = threading.Lock()
+
+
+def get_lease_table() -> Optional[LeaseTable]:
+    """Return the process-wide lease table, or None when state is not shared between workers."""
+    global _lease_table
+    db_path = shared_db_path()
+    if db_path is None:
+        return None
+    with _lease_table_lock:
+        if _lease_table is None:
+            _lease_table = LeaseTable(db_path)
+        return _lease_table
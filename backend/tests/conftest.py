@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The backend is a flat set of modules run from backend/, so make them importable as they are there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep tests offline and in memory regardless of the developer's environment
+os.environ.setdefault("MEDICHECK_LLM_BACKEND", "stub")
+os.environ.setdefault("MEDICHECK_STUB_LATENCY_MS", "0")
+os.environ.setdefault("MEDICHECK_WIKIPEDIA_LIVE", "0")
+os.environ["MEDICHECK_STATE_BACKEND"] = "memory"
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import agent1
+from batching import find_duplicates
+from llm_scheduler import LLMOverloadedError
+
+
+def fake_validation(failing: set, calls: list):
+    async def validate(query, custom_instructions=None):
+        calls.append(query)
+        await asyncio.sleep(0)
+        if query in failing:
+            raise LLMOverloadedError("bulk", "queue full", 3)
+        return json.dumps({"summary": f"Checked {query}", "validation_results": []})
+    return validate
+
+
+def test_one_failing_page_does_not_abort_the_batch(monkeypatch):
+    calls = []
+    monkeypatch.setattr(agent1, "aget_medical_validation", fake_validation({"page b"}, calls))
+
+    outcome = asyncio.run(agent1.aget_batch_medical_validation(["page a", "page b", "page c"], dedup_texts=["alpha one", "beta two", "gamma three"]))
+    results = outcome["results"]
+
+    assert [item["error"] is None for item in results] == [True, False, True]
+    assert "capacity exhausted" in results[1]["error"]
+    assert results[1]["result"]["validation_results"] == []
+    assert results[0]["result"]["summary"] == "Checked page a"
+    assert results[2]["result"]["summary"] == "Checked page c"
+    assert outcome["stats"]["errors"] == 1
+
+
+def test_failed_chunk_fails_only_its_pages(monkeypatch):
+    calls = []
+    monkeypatch.setattr(agent1, "aget_medical_validation", fake_validation({"shared"}, calls))
+
+    outcome = asyncio.run(agent1.aget_batch_medical_validation(
+        [["intro a", "shared"], ["intro b", "shared"], "page c"],
+        dedup_texts=["first page text", "second page here", "third one entirely"]
+    ))
+
+    assert [item["error"] is not None for item in outcome["results"]] == [True, True, False]
+    # The shared chunk is validated once even though it failed for both pages
+    assert calls.count("shared") == 1
+
+
+def test_duplicates_share_the_first_page_result(monkeypatch):
+    calls = []
+    monkeypatch.setattr(agent1, "aget_medical_validation", fake_validation(set(), calls))
+
+    outcome = asyncio.run(agent1.aget_batch_medical_validation(["page a", "page a copy"], dedup_texts=["Same text here.", "same  text here."]))
+
+    assert [item["duplicate_of"] for item in outcome["results"]] == [None, 0]
+    assert outcome["results"][1]["result"] == outcome["results"][0]["result"]
+    assert calls == ["page a"]
+
+
+def test_find_duplicates_detects_near_duplicates():
+    base = " ".join(f"word{i}" for i in range(200))
+    texts = [base, base + " extra", "something else entirely different from the rest"]
+
+    assert find_duplicates(texts) == [None, 0, None]
+    assert find_duplicates(texts, max_distance=-1) == [None, None, None]
@@ -0,0 +1,69 @@
+import json
+
+from claim_cache import CONTENT_MARKER, ClaimStore, ClaimVerdict, complete_claim_validation, extract_claims, plan_claim_validation
+
+SHORT_MYTH = "Vaccines cause autism."
+KNUCKLES = "Cracking your knuckles causes arthritis."
+LONG_SENTENCE = "Drinking " + " ".join(["plenty of fresh water"] * 25) + " cures every kind of cancer."
+
+
+def make_query(text: str) -> str:
+    return f"Title: Health myths\nURL: https://example.com\n\n{CONTENT_MARKER}\n{text}\n"
+
+
+def test_short_and_long_sentences_reach_the_llm_on_a_cold_cache():
+    text = "\n".join(["Health", f"{SHORT_MYTH} {KNUCKLES}", LONG_SENTENCE, "Menu"])
+    plan = plan_claim_validation(make_query(text), ClaimStore(db_path=None))
+
+    assert plan is not None
+    assert not plan.cached
+    assert plan.llm_query == make_query(text)
+    for sentence in (SHORT_MYTH, KNUCKLES, LONG_SENTENCE):
+        assert sentence in plan.claims
+        assert sentence in plan.llm_query
+
+
+def test_only_cached_sentences_are_removed():
+    store = ClaimStore(db_path=None)
+    cached_claim = "Antibiotics are effective against viral infections like the flu."
+    store.store([ClaimVerdict(claim=cached_claim, verdict="incorrect", incorrect_text=cached_claim, correct_text="They are not.")])
+
+    text = "\n".join(["Health", f"{SHORT_MYTH} {cached_claim} {KNUCKLES}", "Menu"])
+    plan = plan_claim_validation(make_query(text), store)
+
+    assert list(plan.cached) and plan.missing == [SHORT_MYTH, KNUCKLES]
+    assert cached_claim not in plan.llm_query
+    assert plan.llm_query == make_query("\n".join(["Health", f"{SHORT_MYTH} {KNUCKLES}", "Menu"]))
+
+
+def test_fully_cached_page_merges_stored_verdicts():
+    store = ClaimStore(db_path=None)
+    store.store([
+        ClaimVerdict(claim=SHORT_MYTH, verdict="incorrect", incorrect_text=SHORT_MYTH, correct_text="They do not."),
+        ClaimVerdict(claim=KNUCKLES, verdict="correct"),
+    ])
+
+    plan = plan_claim_validation(make_query(f"{SHORT_MYTH} {KNUCKLES}"), store)
+    assert not plan.missing
+
+    result = json.loads(complete_claim_validation(plan, None, store))
+    assert result["validation_results"] == [{"incorrect_text": SHORT_MYTH, "correct_text": "They do not."}]
+
+
+def test_verdicts_are_scoped_by_model_and_instructions():
+    store = ClaimStore(db_path=None)
+    store.store([ClaimVerdict(claim=SHORT_MYTH, verdict="correct")], scope="model-a")
+
+    assert store.lookup([SHORT_MYTH], scope="model-a")
+    assert not store.lookup([SHORT_MYTH], scope="model-b")
+
+
+def test_fresh_verdicts_are_stored_from_the_llm_response():
+    store = ClaimStore(db_path=None)
+    plan = plan_claim_validation(make_query(f"{SHORT_MYTH} {KNUCKLES}"), store)
+    response = json.dumps({"summary": "One myth.", "validation_results": [{"incorrect_text": SHORT_MYTH, "correct_text": "They do not."}]})
+
+    complete_claim_validation(plan, response, store)
+
+    verdicts = {verdict.claim: verdict.verdict for verdict in store.lookup(extract_claims(plan.llm_query)).values()}
+    assert verdicts == {SHORT_MYTH: "incorrect", KNUCKLES: "correct"}
@@ -0,0 +1,96 @@
+import gzip
+import json
+
+import pytest
+import zstandard
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from content_transfer import RequestDecompressionMiddleware, UploadError, content_hash, decompress_body
+
+LIMIT = 64 * 1024
+
+
+def test_gzip_and_zstd_round_trip():
+    body = json.dumps({"text": "Vitamin C does not cure colds. " * 100}).encode("utf-8")
+
+    assert decompress_body(gzip.compress(body), "gzip", LIMIT) == body
+    assert decompress_body(zstandard.ZstdCompressor().compress(body), " ZSTD ", LIMIT) == body
+    assert decompress_body(body, "identity", LIMIT) == body
+
+
+@pytest.mark.parametrize("compress, encoding", [
+    (gzip.compress, "gzip"),
+    (zstandard.ZstdCompressor().compress, "zstd"),
+])
+def test_compression_bomb_is_refused(compress, encoding):
+    # A few hundred bytes on the wire that inflate far past the limit
+    bomb = compress(b"\0" * (LIMIT * 64))
+    assert len(bomb) < LIMIT
+
+    with pytest.raises(UploadError) as error:
+        decompress_body(bomb, encoding, LIMIT)
+    assert error.value.status_code == 413
+
+
+def test_body_at_the_limit_is_accepted():
+    body = b"a" * LIMIT
+    assert decompress_body(gzip.compress(body), "gzip", LIMIT) == body
+    with pytest.raises(UploadError) as error:
+        decompress_body(gzip.compress(body + b"a"), "gzip", LIMIT)
+    assert error.value.status_code == 413
+
+
+def test_identity_body_over_the_limit_is_refused():
+    with pytest.raises(UploadError) as error:
+        decompress_body(b"a" * (LIMIT + 1), "", LIMIT)
+    assert error.value.status_code == 413
+
+
+def test_unsupported_encoding_is_415():
+    with pytest.raises(UploadError) as error:
+        decompress_body(b"data", "br", LIMIT)
+    assert error.value.status_code == 415
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_corrupt_body_is_400(encoding):
+    with pytest.raises(UploadError) as error:
+        decompress_body(b"definitely not compressed", encoding, LIMIT)
+    assert error.value.status_code == 400
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(RequestDecompressionMiddleware, max_bytes=LIMIT, paths=("/upload",))
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_middleware_decodes_and_rejects():
+    client = make_client()
+    body = b"x" * 1000
+
+    response = client.post("/upload", content=gzip.compress(body), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.json() == {"size": len(body)}
+
+    response = client.post("/upload", content=gzip.compress(b"\0" * (LIMIT * 64)), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 413
+
+    response = client.post("/upload", content=b"data", headers={"Content-Encoding": "br"})
+    assert response.status_code == 415
+    assert response.headers["accept-encoding"] == "gzip, zstd"
+
+
+def test_content_hash_covers_prompt_metadata():
+    page = {"url": "https://example.org", "title": "Flu", "text": "Rest and fluids.", "metadata": {"description": "About flu"}}
+    edited = dict(page, metadata={"description": "About colds"})
+
+    assert content_hash(page) == content_hash(dict(page))
+    assert content_hash(page) != content_hash(edited)
+    assert content_hash(page) != content_hash(dict(page, metadata={"description": "About flu", "author": ""}))
@@ -0,0 +1,52 @@
+from conversation_store import SUMMARY_HEADING, ConversationStore, estimate_tokens
+
+
+def make_store(**kwargs) -> ConversationStore:
+    # max_entries=2 pushes older turns into the rolling summary
+    options = {"max_entries": 2, "max_tokens": 10_000, "max_summary_tokens": 10_000}
+    options.update(kwargs)
+    return ConversationStore(**options)
+
+
+def fill(store: ConversationStore, session_id: str, turns: int, size: int = 40) -> None:
+    for i in range(turns):
+        store.append(session_id, "user", f"question {i} " + "x" * size)
+
+
+def test_context_with_summary_stays_within_budget():
+    store = make_store()
+    fill(store, "s", 12)
+    assert store.get_summary("s")
+
+    for budget in (5, 20, 30, 45, 80, 200):
+        context = store.build_context("s", token_budget=budget)
+        assert estimate_tokens(context) <= budget, budget
+
+
+def test_oldest_summary_lines_are_trimmed_first():
+    store = make_store()
+    fill(store, "s", 12)
+    summary_lines = store.get_summary("s").split("\n")
+
+    full = store.build_context("s", token_budget=10_000)
+    trimmed = store.build_context("s", token_budget=estimate_tokens(full) - 10)
+
+    assert trimmed.startswith(SUMMARY_HEADING)
+    kept = trimmed.split("\n")[1:-2]
+    assert kept and kept == summary_lines[-len(kept):]
+    assert trimmed.split("\n")[-2:] == full.split("\n")[-2:]
+
+
+def test_latest_turn_is_shortened_to_fit():
+    store = make_store()
+    store.append("s", "user", "short question")
+    store.append("s", "user", "y" * 1000)
+
+    context = store.build_context("s", token_budget=50)
+
+    assert estimate_tokens(context) <= 50
+    assert context.startswith("user: yyy") and context.endswith("...")
+
+
+def test_unknown_session_has_no_context():
+    assert make_store().build_context("missing") == ""
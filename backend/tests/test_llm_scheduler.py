@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_VALIDATION, LLMOverloadedError, LLMScheduler
+
+
+def test_waiting_calls_run_in_priority_order():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, queue_size=10, queue_timeout=5)
+        order = []
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.aslot(PRIORITY_BULK):
+                await release.wait()
+
+        async def call(name, priority):
+            async with scheduler.aslot(priority):
+                order.append(name)
+
+        running = asyncio.ensure_future(holder())
+        await asyncio.sleep(0)
+        waiting = [asyncio.ensure_future(call(name, priority)) for name, priority in (
+            ("bulk", PRIORITY_BULK), ("validation", PRIORITY_VALIDATION), ("chat", PRIORITY_INTERACTIVE))]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(running, *waiting)
+        return order
+
+    assert asyncio.run(scenario()) == ["chat", "validation", "bulk"]
+
+
+def test_full_share_of_the_queue_is_rejected():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, queue_size=2, queue_timeout=5)
+        release = asyncio.Event()
+
+        async def call(priority):
+            async with scheduler.aslot(priority):
+                await release.wait()
+
+        running = [asyncio.ensure_future(call(PRIORITY_BULK)), asyncio.ensure_future(call(PRIORITY_BULK))]
+        await asyncio.sleep(0)
+
+        # Bulk may fill half of a two-place queue; chat still gets in
+        with pytest.raises(LLMOverloadedError) as error:
+            scheduler.check_admission(PRIORITY_BULK)
+        assert error.value.retry_after >= 1
+        scheduler.check_admission(PRIORITY_INTERACTIVE)
+
+        release.set()
+        await asyncio.gather(*running)
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_raises_overloaded():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, queue_size=4, queue_timeout=0.05)
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.aslot(PRIORITY_BULK):
+                await release.wait()
+
+        running = asyncio.ensure_future(holder())
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloadedError):
+            async with scheduler.aslot(PRIORITY_INTERACTIVE):
+                pass
+        release.set()
+        await running
+        assert scheduler.stats()["rejected_timeout"] == 1
+
+    asyncio.run(scenario())
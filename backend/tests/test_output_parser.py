@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+
+import agent1
+from llm_backend import StubLLM
+from output_parser import IncrementalResultParser, is_truncated, parse_validation_response, repair_json
+
+COMPLETE = {
+    "summary": "Two claims are wrong.",
+    "validation_results": [
+        {"incorrect_text": "Vaccines cause autism", "correct_text": "They do not, see WHO, CDC."},
+        {"incorrect_text": "Garlic cures cancer", "correct_text": "There is no evidence, per NIH."},
+    ],
+}
+
+
+def test_trailing_commas_are_removed_outside_strings_only():
+    text = '{"summary": "a, b,", "validation_results": [{"incorrect_text": "x,]", "correct_text": "y",},],}'
+    parsed = json.loads(repair_json(text))
+
+    assert parsed["summary"] == "a, b,"
+    assert parsed["validation_results"] == [{"incorrect_text": "x,]", "correct_text": "y"}]
+
+
+def test_complete_output_is_not_partial():
+    parsed = parse_validation_response("Here you go:\n" + json.dumps(COMPLETE))
+
+    assert not parsed.partial
+    assert len(parsed.validation_results) == 2
+
+
+def test_truncated_output_keeps_only_complete_items():
+    text = json.dumps(COMPLETE)
+    cut = text[:text.index("There is no")]
+    assert is_truncated(cut)
+
+    parsed = parse_validation_response(cut)
+
+    assert parsed.partial
+    assert [item.incorrect_text for item in parsed.validation_results] == ["Vaccines cause autism"]
+
+
+def test_partial_flag_is_not_serialised():
+    parsed = parse_validation_response(json.dumps(COMPLETE)[:-20])
+
+    assert parsed.partial
+    assert "partial" not in parsed.model_dump()
+
+
+def test_incremental_parser_handles_arbitrary_chunk_boundaries():
+    text = json.dumps(COMPLETE)
+    for size in (1, 3, 7, 50):
+        parser = IncrementalResultParser()
+        items = []
+        for start in range(0, len(text), size):
+            items.extend(parser.feed(text[start:start + size]))
+        assert items == COMPLETE["validation_results"]
+
+
+def test_partial_validation_is_not_cached(monkeypatch):
+    truncated = json.dumps(COMPLETE)[:-30]
+
+    async def ainvoke(self, prompt, **kwargs):
+        return AIMessage(content=truncated)
+
+    monkeypatch.setattr(StubLLM, "ainvoke", ainvoke)
+    query = "Title: Partial\nURL: https://example.com/partial\n\nMain Content:\nVaccines cause autism. Garlic cures cancer."
+
+    result = json.loads(asyncio.run(agent1.aget_medical_validation(query, "partial-test")))
+
+    assert [item["incorrect_text"] for item in result["validation_results"]] == ["Vaccines cause autism"]
+    assert not agent1.has_cached_validation(query, "partial-test")
+
+
+def test_cache_lookup_does_not_build_the_agent_pool(monkeypatch):
+    monkeypatch.setattr(agent1, "_agent_pool", None)
+    monkeypatch.setattr(agent1, "AgentPool", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("pool built")))
+
+    assert agent1.has_cached_validation("A page that was never validated") is False
+    assert asyncio.run(agent1.ahas_cached_validation("A page that was never validated")) is False
@@ -0,0 +1,87 @@
+from page_snapshots import PageSnapshotStore, split_paragraphs
+
+URL = "https://example.com/article"
+PARAGRAPHS = [
+    "Vitamin C cures the common cold within a day.",
+    "Regular exercise lowers blood pressure in most adults.",
+    "Antibiotics are effective against viral infections.",
+    "Sleep helps the body recover after illness.",
+]
+FIRST_RESULT = {
+    "summary": "Two inaccurate claims.",
+    "validation_results": [
+        {"incorrect_text": "Vitamin C cures the common cold", "correct_text": "It may shorten colds slightly."},
+        {"incorrect_text": "Antibiotics are effective against viral infections", "correct_text": "They only treat bacteria."},
+    ],
+}
+
+
+def validated_store():
+    store = PageSnapshotStore(db_path=None)
+    plan = store.plan(URL, "\n".join(PARAGRAPHS))
+    assert plan.full
+    store.complete(plan, FIRST_RESULT)
+    return store
+
+
+def edited_text(index: int, paragraph: str) -> str:
+    paragraphs = list(PARAGRAPHS)
+    paragraphs[index] = paragraph
+    return "\n".join(paragraphs)
+
+
+def test_unchanged_page_reuses_the_stored_result():
+    store = validated_store()
+    plan = store.plan(URL + "#section", "\n\n".join(PARAGRAPHS))
+
+    assert not plan.changed
+    assert store.reuse(plan)["validation_results"] == FIRST_RESULT["validation_results"]
+
+
+def test_changed_paragraph_is_revalidated_alone_and_merged():
+    store = validated_store()
+    plan = store.plan(URL, edited_text(3, "Garlic cures cancer in a week."))
+
+    assert not plan.full and plan.changed == [3]
+    assert plan.changed_text == "Garlic cures cancer in a week."
+
+    merged = store.complete(plan, {
+        "summary": "One new inaccurate claim.",
+        "validation_results": [{"incorrect_text": "Garlic cures cancer", "correct_text": "It does not."}],
+    })
+    assert [item["incorrect_text"] for item in merged["validation_results"]] == [
+        "Vitamin C cures the common cold", "Antibiotics are effective against viral infections", "Garlic cures cancer",
+    ]
+    assert "Latest changes: One new inaccurate claim." in merged["summary"]
+
+
+def test_edited_paragraph_drops_its_old_result():
+    store = validated_store()
+    plan = store.plan(URL, edited_text(0, "Vitamin C supports normal immune function."))
+
+    assert [item["incorrect_text"] for item in store.reused_results(plan)] == ["Antibiotics are effective against viral infections"]
+
+
+def test_failed_revalidation_keeps_reused_results_without_storing():
+    store = validated_store()
+    text = edited_text(3, "Garlic cures cancer in a week.")
+    plan = store.plan(URL, text)
+
+    result = store.include_reused(plan, {"summary": "Error: model unavailable", "validation_results": []})
+
+    assert result["summary"] == "Error: model unavailable"
+    assert len(result["validation_results"]) == 2
+    # Nothing was stored, so the edited paragraph still counts as changed
+    assert store.plan(URL, text).changed == [3]
+
+
+def test_too_many_changes_revalidate_the_whole_page():
+    store = validated_store()
+    plan = store.plan(URL, "\n".join(["New paragraph one here.", "New paragraph two here.", "New paragraph three.", PARAGRAPHS[3]]))
+
+    assert plan.full
+    assert store.reused_results(plan) == []
+
+
+def test_split_paragraphs_ignores_blank_lines_and_spacing():
+    assert split_paragraphs("  First   line \n\n\tSecond line\n") == ["First line", "Second line"]
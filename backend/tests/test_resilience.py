@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, Dependency
+
+
+def flaky(failures: int, calls: list):
+    def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise ConnectionError("connection reset")
+        return "ok"
+    return call
+
+
+def make_dependency(breaker: CircuitBreaker, attempts: int = 3) -> Dependency:
+    return Dependency("test", deadline=5.0, attempts=attempts, hedge=False, base_delay=0.0, breaker=breaker, max_workers=2)
+
+
+def test_retries_of_one_call_count_as_one_failure():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    dependency = make_dependency(breaker)
+    calls = []
+
+    with pytest.raises(ConnectionError):
+        dependency.call(flaky(3, calls))
+
+    assert len(calls) == 3
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_after_threshold_failed_calls():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    dependency = make_dependency(breaker)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            dependency.call(flaky(3, []))
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        dependency.call(flaky(0, []))
+
+
+def test_call_that_recovers_on_retry_counts_as_success():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    dependency = make_dependency(breaker)
+    calls = []
+
+    assert dependency.call(flaky(2, calls)) == "ok"
+    assert len(calls) == 3
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_trial_may_retry():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    dependency = make_dependency(breaker)
+    with pytest.raises(ConnectionError):
+        dependency.call(flaky(3, []))
+
+    # reset_timeout=0: the next call is the half-open trial, and its own retries must not be refused
+    assert dependency.call(flaky(1, [])) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_async_retries_count_as_one_failure():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    dependency = make_dependency(breaker)
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise ConnectionError("connection reset")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(dependency.acall(attempt))
+
+    assert len(calls) == 3
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_retryable_error_is_not_retried_or_counted():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    dependency = make_dependency(breaker)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise ValueError("no such page")
+
+    with pytest.raises(ValueError):
+        dependency.call(call)
+
+    assert len(calls) == 1
+    assert breaker.state == CircuitBreaker.CLOSED
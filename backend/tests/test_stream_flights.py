@@ -0,0 +1,66 @@
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+
+import agent1
+from llm_backend import StubLLM
+
+QUERY = "Title: Flights\nURL: https://example.com/flights\n\nMain Content:\nAspirin cures cancer in most adults within weeks."
+
+
+def counting_stream(monkeypatch):
+    calls = []
+
+    async def astream(self, prompt, **kwargs):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        yield AIMessageChunk(content='{"summary": "One myth.", "validation_results": [{"incorrect_text": "Aspirin cures cancer", ')
+        await asyncio.sleep(0.05)
+        yield AIMessageChunk(content='"correct_text": "It does not."}]}')
+
+    monkeypatch.setattr(StubLLM, "astream", astream)
+    return calls
+
+
+async def collect(instructions: str, stop_after: int = 0):
+    events = []
+    stream = agent1.astream_medical_validation(QUERY, instructions)
+    async for event in stream:
+        events.append(event)
+        if stop_after and len(events) == stop_after:
+            await stream.aclose()
+            break
+    return events
+
+
+def test_concurrent_streams_share_one_run(monkeypatch):
+    calls = counting_stream(monkeypatch)
+
+    async def run():
+        return await asyncio.gather(*[collect("flights-shared") for _ in range(4)])
+
+    outcomes = asyncio.run(run())
+
+    assert len(calls) == 1
+    results = [events[-1] for events in outcomes]
+    assert all(event["event"] == "done" for event in results)
+    assert all(event["result"] == results[0]["result"] for event in results)
+    assert results[0]["result"]["validation_results"] == [{"incorrect_text": "Aspirin cures cancer", "correct_text": "It does not."}]
+
+
+def test_leader_disconnect_does_not_cancel_the_run(monkeypatch):
+    calls = counting_stream(monkeypatch)
+
+    async def run():
+        leader = asyncio.ensure_future(collect("flights-disconnect", stop_after=1))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(collect("flights-disconnect"))
+        return await leader, await follower
+
+    leader_events, follower_events = asyncio.run(run())
+
+    assert len(leader_events) == 1
+    assert follower_events[-1]["event"] == "done"
+    assert follower_events[-1]["result"]["validation_results"]
+    assert len(calls) == 1
+    assert agent1.has_cached_validation(QUERY, "flights-disconnect")
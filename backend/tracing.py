@@ -0,0 +1,179 @@
+import os
+import time
+import random
+import inspect
+import logging
+import cProfile
+import functools
+import threading
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tracing configuration; when enabled, a request carrying TRACE_HEADER gets its span breakdown back in
+# response headers, and profiled requests name their dump. Off by default: timings are internal detail
+TRACE_HEADER_ENABLED = os.getenv("MEDICHECK_TRACE_HEADER", "0") == "1"
+TRACE_HEADER = "x-medicheck-debug"
+# Fraction of requests (0.0 - 1.0) profiled with cProfile and dumped to PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.getenv("MEDICHECK_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("MEDICHECK_PROFILE_DIR", "profiles")
+
+_span_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("id", "parent_id", "name", "attributes", "start", "end")
+
+    def __init__(self, name: str, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.id = next(_span_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+
+class Trace:
+    """Spans recorded for one request, from any task or thread that inherited its context."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """Finished spans in start order, with times in milliseconds relative to the trace start."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return [
+            {
+                "id": span.id,
+                "parent": span.parent_id,
+                "name": span.name,
+                "start_ms": round((span.start - self.started) * 1000, 2),
+                "duration_ms": round(((span.end or time.perf_counter()) - span.start) * 1000, 2),
+                **({"attributes": span.attributes} if span.attributes else {}),
+            }
+            for span in spans
+        ]
+
+    def server_timing(self) -> str:
+        """Total time per span name in the Server-Timing header format, shown by browser dev tools."""
+        totals: Dict[str, float] = {}
+        for span in self.breakdown():
+            key = "".join(char if char.isalnum() or char in "-_." else "_" for char in span["name"])
+            totals[key] = totals.get(key, 0.0) + span["duration_ms"]
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in totals.items())
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("medicheck_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("medicheck_span", default=None)
+
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    """Record spans opened in this context (and tasks or threads that copy it) into a new trace."""
+    trace = Trace()
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a span nested under the current one; does nothing outside a trace.
+
+    Args:
+        name (str): Span name, e.g. "comprehensive_search" or "search.Wikipedia"
+        **attributes: Extra details recorded with the span
+
+    Yields:
+        Optional[Span]: The span, so callers can add attributes, or None when not tracing
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.id if parent is not None else None, attributes)
+    trace.add(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def traced(name: str) -> Callable:
+    """Decorator that runs a sync or async function inside a span of the given name."""
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RequestProfiler:
+    """
+    Profile a sampled fraction of requests with cProfile and dump each to a .prof file.
+
+    cProfile sees only the event loop thread, and everything that runs on it while the
+    sampled request is in progress; work offloaded to threads is not included. Only one
+    request is profiled at a time. Dumps open in snakeviz or convert to flame graphs with
+    flameprof.
+    """
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, output_dir: str = PROFILE_DIR):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._active = threading.Lock()
+
+    @contextmanager
+    def maybe_profile(self, label: str) -> Iterator[Optional[str]]:
+        """Profile the block if this request is sampled; yields the dump path, or None."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate or not self._active.acquire(blocking=False):
+            yield None
+            return
+        safe_label = "".join(char if char.isalnum() else "_" for char in label).strip("_") or "request"
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{next(_span_ids)}.prof")
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield path
+            finally:
+                profiler.disable()
+            os.makedirs(self.output_dir, exist_ok=True)
+            profiler.dump_stats(path)
+            logger.info(f"Wrote request profile to {path}")
+        finally:
+            self._active.release()
+
+
+_profiler = RequestProfiler()
+
+
+def get_profiler() -> RequestProfiler:
+    return _profiler
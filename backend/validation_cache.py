@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from state_store import shared_db_path
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+CACHE_MAX_ENTRIES = int(os.getenv("MEDICHECK_CACHE_SIZE", "512"))
+CACHE_TTL_SECONDS = float(os.getenv("MEDICHECK_CACHE_TTL", str(24 * 60 * 60)))
+# Optional SQLite file so cached validations survive restarts and are shared by workers on one host;
+# defaults to the shared state file when MEDICHECK_STATE_BACKEND=sqlite
+CACHE_DB_PATH = os.getenv("MEDICHECK_CACHE_DB") or shared_db_path()
+
+
+def normalize_text(text: str) -> str:
+    """Normalise text so cosmetic differences (unicode forms, whitespace) hash the same."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split())
+
+
+def make_cache_key(formatted_text: str, custom_instructions: Optional[str], model: str) -> str:
+    """
+    Build a content-addressed cache key.
+
+    Args:
+        formatted_text (str): The text sent for validation
+        custom_instructions (str, optional): Instructions used for synthesis
+        model (str): Name of the model producing the validation
+
+    Returns:
+        str: Hex SHA-256 digest identifying the validation
+    """
+    digest = hashlib.sha256()
+    for part in (model, normalize_text(custom_instructions or ""), normalize_text(formatted_text)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ValidationCache:
+    """
+    Two-tier cache of validation responses.
+
+    The first tier is an in-memory LRU bounded by max_entries. The optional second tier
+    is a SQLite file; entries found there are promoted into memory. Both tiers honour
+    the same TTL. The async methods answer memory hits on the event loop and run SQLite
+    reads and writes in a thread, so a busy database file never stalls the loop. Caches
+    sharing one file keep their entries in separate tables.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS, db_path: Optional[str] = CACHE_DB_PATH,
+                 table: str = "validation_cache"):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.table = table
+
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Guards the SQLite connection separately, so memory lookups never wait on disk I/O
+        self._db_lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"Cache table {table} persisted to {db_path}")
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None on a miss."""
+        return self._get(key, count=True)
+
+    def peek(self, key: str) -> Optional[str]:
+        """Like get(), without counting a hit or miss; used while polling for another worker's result."""
+        return self._get(key, count=False)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Async get(); only a lookup that reaches the SQLite tier runs in a thread."""
+        value = self._get_memory(key, count=True)
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key, True)
+        return value
+
+    async def apeek(self, key: str) -> Optional[str]:
+        """Async peek()."""
+        value = self._get_memory(key, count=False)
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key, False)
+        return value
+
+    def _get(self, key: str, count: bool) -> Optional[str]:
+        value = self._get_memory(key, count)
+        if value is None and self._db is not None:
+            value = self._get_disk(key, count)
+        return value
+
+    def _get_memory(self, key: str, count: bool) -> Optional[str]:
+        # Misses are counted here only when there is no SQLite tier to fall back to
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._is_expired(created_at):
+                    self._entries.move_to_end(key)
+                    if count:
+                        self._counters["hits"] += 1
+                        self._counters["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._counters["expirations"] += 1
+            if count and self._db is None:
+                self._counters["misses"] += 1
+            return None
+
+    def _get_disk(self, key: str, count: bool) -> Optional[str]:
+        with self._db_lock:
+            row = self._db.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            expired = row is not None and self._is_expired(row[1])
+            if expired:
+                self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._db.commit()
+
+        with self._lock:
+            if row is not None and not expired:
+                value, created_at = row
+                self._store_in_memory(key, value, created_at)
+                if count:
+                    self._counters["hits"] += 1
+                    self._counters["disk_hits"] += 1
+                return value
+            if expired:
+                self._counters["expirations"] += 1
+            if count:
+                self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store value under key in every configured tier."""
+        created_at = time.time()
+        with self._lock:
+            self._store_in_memory(key, value, created_at)
+        if self._db is not None:
+            self._store_on_disk(key, value, created_at)
+
+    async def aset(self, key: str, value: str) -> None:
+        """Async set(); the SQLite write runs in a thread."""
+        created_at = time.time()
+        with self._lock:
+            self._store_in_memory(key, value, created_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._store_on_disk, key, value, created_at)
+
+    def _store_on_disk(self, key: str, value: str, created_at: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, created_at)
+            )
+            self._db.commit()
+
+    def _store_in_memory(self, key: str, value: str, created_at: float) -> None:
+        # Caller must hold the lock
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        """Drop every cached entry from all tiers."""
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+
+_validation_cache: Optional[ValidationCache] = None
+_validation_cache_lock = threading.Lock()
+
+
+def get_validation_cache() -> ValidationCache:
+    """Return the process-wide validation cache, building it on first use."""
+    global _validation_cache
+    with _validation_cache_lock:
+        if _validation_cache is None:
+            _validation_cache = ValidationCache()
+        return _validation_cache
@@ -62,6 +62,125 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   }
 
+  /**
+   * Returns this browser's conversation session id, creating one on first use
+   * @returns {Promise<string>} Session id sent with backend requests
+   */
+  async function getSessionId() {
+    const { sessionId } = await chrome.storage.local.get(["sessionId"]);
+    if (sessionId) return sessionId;
+
+    const newSessionId = crypto.randomUUID();
+    await chrome.storage.local.set({ sessionId: newSessionId });
+    return newSessionId;
+  }
+
+  /**
+   * Sends the phrases found so far to the content script for highlighting
+   * @param {Object} tab - The current browser tab
+   * @param {string[]} phrases - Incorrect phrases to highlight
+   * @param {string[]} corrections - Corrections matching each phrase
+   */
+  function sendHighlight(tab, phrases, corrections) {
+    console.log(`Popup sending highlight command for ${phrases.length} phrases`);
+    chrome.tabs
+      .sendMessage(tab.id, {
+        action: "highlight",
+        phrases: [...phrases],
+        corrections: [...corrections],
+      })
+      .catch((error) => {
+        console.error("Error applying highlighting from popup:", error);
+      });
+  }
+
+  /**
+   * Hashes page content the way the backend does for hash-first requests
+   * @param {Object} content - Scraped page content
+   * @returns {Promise<string>} SHA-256 hex digest of every field that reaches the validation prompt
+   */
+  async function hashContent(content) {
+    // Missing fields become null in the array, matching the backend's content_hash()
+    const metadata = content.metadata || {};
+    const payload = JSON.stringify([
+      content.url,
+      content.title,
+      metadata.description,
+      metadata.keywords,
+      metadata.author,
+      metadata.ogTitle,
+      metadata.ogDescription,
+      content.text,
+    ]);
+    const digest = await crypto.subtle.digest("SHA-256", new TextEncoder().encode(payload));
+    return Array.from(new Uint8Array(digest))
+      .map((byte) => byte.toString(16).padStart(2, "0"))
+      .join("");
+  }
+
+  /**
+   * Asks the backend for a cached result by content hash, without uploading the page
+   * @param {string} contentHash - Hash from hashContent
+   * @param {string} sessionId - Conversation session id
+   * @returns {Promise<Object|null>} The validation result, or null if the page must be uploaded
+   */
+  async function fetchCachedValidation(contentHash, sessionId) {
+    try {
+      const response = await fetch("http://localhost:8000/summarize", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({ content_hash: contentHash, session_id: sessionId }),
+      });
+      return response.ok ? await response.json() : null;
+    } catch (error) {
+      console.log("Cached result lookup failed, uploading the page instead:", error);
+      return null;
+    }
+  }
+
+  /**
+   * Serialises a request body as JSON, gzip-compressed when the browser supports it
+   * @param {Object} payload - Request body
+   * @returns {Promise<{body: (string|Blob), headers: Object}>} Body and the headers to send with it
+   */
+  async function buildRequestBody(payload) {
+    const json = JSON.stringify(payload);
+    const headers = { "Content-Type": "application/json" };
+    if (typeof CompressionStream === "undefined") {
+      return { body: json, headers };
+    }
+    const stream = new Blob([json]).stream().pipeThrough(new CompressionStream("gzip"));
+    const body = await new Response(stream).blob();
+    return { body, headers: { ...headers, "Content-Encoding": "gzip" } };
+  }
+
+  /**
+   * Reads a newline-delimited JSON response, calling onEvent for each event
+   * @param {Response} response - Streaming fetch response
+   * @param {Function} onEvent - Callback receiving each parsed event
+   */
+  async function readValidationStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let newlineIndex;
+      while ((newlineIndex = buffer.indexOf("\n")) >= 0) {
+        const line = buffer.slice(0, newlineIndex).trim();
+        buffer = buffer.slice(newlineIndex + 1);
+        if (line) onEvent(JSON.parse(line));
+      }
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+  }
+
   summarizeBtn.addEventListener("click", async () => {
     // Prevent multiple clicks
     if (isProcessing) {
@@ -101,72 +220,78 @@ document.addEventListener('DOMContentLoaded', function() {
         throw new Error("No content received from content script");
       }
 
-      statusDiv.textContent = "Validating content...";
-
-      // Send the content to the backend
-      const validationResponse = await fetch(
-        "http://localhost:8000/summarize",
-        {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-          },
-          body: JSON.stringify({ content: response.content }),
-        }
-      );
+      const sessionId = await getSessionId();
+      const contentHash = await hashContent(response.content);
 
-      if (!validationResponse.ok) {
-        throw new Error(`HTTP error! status: ${validationResponse.status}`);
-      }
+      // Ask for a cached result first; the page is only uploaded if the backend has not seen it
+      statusDiv.textContent = "Checking for earlier results...";
+      let validationData = await fetchCachedValidation(contentHash, sessionId);
 
-      const validationData = await validationResponse.json();
+      if (validationData) {
+        const cachedResults = (validationData.validation_results || []).filter(
+          (result) => result.incorrect_text && result.incorrect_text.trim()
+        );
+        if (cachedResults.length) {
+          sendHighlight(
+            tab,
+            cachedResults.map((result) => result.incorrect_text.trim()),
+            cachedResults.map((result) => result.correct_text || "No correction available")
+          );
+        }
+      } else {
+        statusDiv.textContent = "Validating content...";
 
-      // Store the validation result in chrome.storage
-      await chrome.storage.local.set({
-        validationData,
-        scrapedContent: response.content,
-        activeTab: "medical-tab", // Ensure medical tab is active
-        lastUpdate: Date.now(), // Add timestamp for freshness check
-      });
+        // Send the content to the backend and read validation events as they stream in
+        const request = await buildRequestBody({
+          content: response.content,
+          content_hash: contentHash,
+          session_id: sessionId,
+        });
+        const validationResponse = await fetch(
+          "http://localhost:8000/summarize/stream",
+          {
+            method: "POST",
+            headers: request.headers,
+            body: request.body,
+          }
+        );
+
+        if (!validationResponse.ok) {
+          throw new Error(`HTTP error! status: ${validationResponse.status}`);
+        }
 
-      // Send highlight command directly to content script before opening side panel
-      try {
-        // Extract incorrect statements for highlighting
         const incorrectPhrases = [];
         const correctTexts = [];
 
-        if (
-          validationData.validation_results &&
-          validationData.validation_results.length > 0
-        ) {
-          validationData.validation_results.forEach((result) => {
+        await readValidationStream(validationResponse, (event) => {
+          if (event.event === "search_complete") {
+            statusDiv.textContent = "Sources checked, analysing claims...";
+          } else if (event.event === "validation_result") {
+            const result = event.item || {};
             if (result.incorrect_text && result.incorrect_text.trim()) {
               incorrectPhrases.push(result.incorrect_text.trim());
-              correctTexts.push(
-                result.correct_text || "No correction available"
-              );
+              correctTexts.push(result.correct_text || "No correction available");
+              statusDiv.textContent = `Found ${incorrectPhrases.length} issue(s), still validating...`;
+              sendHighlight(tab, incorrectPhrases, correctTexts);
             }
-          });
-        }
+          } else if (event.event === "done") {
+            validationData = event.result;
+          }
+        });
+      }
 
-        if (incorrectPhrases.length > 0) {
-          console.log(
-            `Popup sending highlight command for ${incorrectPhrases.length} phrases`
-          );
-          chrome.tabs
-            .sendMessage(tab.id, {
-              action: "highlight",
-              phrases: incorrectPhrases,
-              corrections: correctTexts,
-            })
-            .catch((error) => {
-              console.error("Error applying highlighting from popup:", error);
-            });
-        }
-      } catch (error) {
-        console.error("Exception sending highlight command from popup:", error);
+      if (!validationData) {
+        throw new Error("Validation stream ended without a result");
       }
 
+      // Store the validation result in chrome.storage
+      await chrome.storage.local.set({
+        validationData,
+        scrapedContent: response.content,
+        activeTab: "medical-tab", // Ensure medical tab is active
+        lastUpdate: Date.now(), // Add timestamp for freshness check
+      });
+
       // Open the side panel
       await openSidePanel(tab);
     } catch (error) {
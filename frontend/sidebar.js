@@ -414,6 +414,19 @@ document.addEventListener("DOMContentLoaded", function () {
     chrome.storage.local.set({ chatHistory: messages });
   }
 
+  /**
+   * Returns this browser's conversation session id, creating one on first use
+   * @returns {Promise<string>} Session id sent with backend requests
+   */
+  async function getSessionId() {
+    const { sessionId } = await chrome.storage.local.get(["sessionId"]);
+    if (sessionId) return sessionId;
+
+    const newSessionId = crypto.randomUUID();
+    await chrome.storage.local.set({ sessionId: newSessionId });
+    return newSessionId;
+  }
+
   /**
    * Sends user message to backend and handles response
    */
@@ -442,7 +455,10 @@ document.addEventListener("DOMContentLoaded", function () {
           headers: {
             "Content-Type": "application/json",
           },
-          body: JSON.stringify({ message: message }),
+          body: JSON.stringify({
+            message: message,
+            session_id: await getSessionId(),
+          }),
         });
 
         // Remove typing indicator
@@ -611,8 +627,8 @@ document.addEventListener("DOMContentLoaded", function () {
       "Hello! I'm your medical content assistant. You can ask me questions about the validated content, request explanations for medical terms, or get more information about any highlighted inaccuracies."
     );
 
-    // Clear chat history in storage
-    chrome.storage.local.remove(["chatHistory"], function () {
+    // Clear chat history in storage; dropping the session id starts a fresh server-side conversation
+    chrome.storage.local.remove(["chatHistory", "sessionId"], function () {
       console.log("Chat history cleared");
     });
 